@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from datetime import datetime, timedelta, timezone
 from jose import JWTError, jwt
@@ -6,11 +6,21 @@ from passlib.context import CryptContext
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 from typing import Optional
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import math
 import os
+import threading
+import time
 
 from models.usermodel import Users
 from core.database import SessionLocal
-from core.config import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from core.config import (
+    SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES, PASSWORD_HASH_WORKERS, PASSWORD_HASH_QUEUE,
+    LOGIN_RATE_LIMIT_PER_USER, LOGIN_RATE_LIMIT_PER_IP, LOGIN_RATE_WINDOW,
+)
+from core import metrics
 
 router = APIRouter(tags=["Authentication"])
 
@@ -58,11 +68,11 @@ def get_password_hash(password):
 def get_user(db: Session, username: str):
     return db.query(Users).filter(Users.Username == username).first()
 
-def authenticate_user(db: Session, username: str, password: str):
+async def authenticate_user(db: Session, username: str, password: str):
     user = get_user(db, username)
     if not user:
         return False
-    if not verify_password(password, user.HashPassword):
+    if not await run_password_job(verify_password, password, user.HashPassword):
         return False
     return user
 
@@ -76,9 +86,149 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+# ------------------------------
+# Password hashing pool and sign-in rate limits
+# ------------------------------
+# bcrypt is deliberately slow (a few hundred ms per call) and must not run on the event
+# loop or the shared thread pool that serves extraction. It gets a small dedicated pool;
+# once PASSWORD_HASH_QUEUE calls are waiting, further sign-ins are refused with a 503
+# instead of queueing without bound.
+_password_pool = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password")
+_password_pending = 0
+_password_lock = threading.Lock()
+
+def _password_job_done(_):
+    global _password_pending
+    with _password_lock:
+        _password_pending -= 1
+    metrics.PASSWORD_JOBS_PENDING.dec()
+
+async def run_password_job(fn, *args):
+    """Run a bcrypt hash/verify on the password pool, refusing work beyond the queue limit."""
+    global _password_pending
+    with _password_lock:
+        if _password_pending >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE:
+            metrics.AUTH_REJECTED.inc(reason="overloaded")
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many sign-ins in progress, please retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        _password_pending += 1
+    metrics.PASSWORD_JOBS_PENDING.inc()
+    future = _password_pool.submit(fn, *args)
+    # Released when the job finishes, even if the client disconnects while it is queued
+    future.add_done_callback(_password_job_done)
+    return await asyncio.wrap_future(future)
+
+class RateLimiter:
+    """Sliding-window limit of `limit` attempts per `window` seconds for each key (0 = unlimited)."""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._attempts = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key):
+        """Record an attempt; returns 0 if allowed, else the seconds until the next one is."""
+        if not self.limit:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            attempts = self._attempts.setdefault(key, deque())
+            while attempts and attempts[0] <= now - self.window:
+                attempts.popleft()
+            if len(attempts) >= self.limit:
+                return attempts[0] + self.window - now
+            attempts.append(now)
+            if len(self._attempts) > 10000:
+                self._attempts = {k: v for k, v in self._attempts.items() if v and v[-1] > now - self.window}
+            return 0
+
+_ip_limiter = RateLimiter(LOGIN_RATE_LIMIT_PER_IP, LOGIN_RATE_WINDOW)
+_user_limiter = RateLimiter(LOGIN_RATE_LIMIT_PER_USER, LOGIN_RATE_WINDOW)
+
+def check_rate_limit(request: Request, username: Optional[str] = None):
+    """Raise 429 once the client IP, or the account being signed in to, has used up its attempts."""
+    checks = [(_ip_limiter, request.client.host if request.client else "unknown")]
+    if username:
+        checks.append((_user_limiter, username.lower()))
+    for limiter, key in checks:
+        retry_after = limiter.hit(key)
+        if retry_after:
+            metrics.AUTH_REJECTED.inc(reason="rate_limited")
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many attempts, please try again later",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+# ------------------------------
+# Verified token cache
+# ------------------------------
+# Claims of tokens whose signature has already been checked, kept until the token's exp
+# (capped at TOKEN_CACHE_TTL) so repeated requests with the same bearer token skip the
+# HMAC verification. Bounded LRU: the least recently used token is dropped first.
+TOKEN_CACHE_SIZE = 1024
+TOKEN_CACHE_TTL = 300  # seconds
+_verified = OrderedDict()  # token -> (claims, expires_at)
+_verified_lock = threading.Lock()
+
+def decode_token(token: str) -> dict:
+    """Verified claims of a JWT; raises JWTError like jwt.decode."""
+    now = time.time()
+    with _verified_lock:
+        entry = _verified.get(token)
+        if entry and entry[1] > now:
+            _verified.move_to_end(token)
+            metrics.cache_lookup("jwt_claims", True)
+            return entry[0]
+        if entry:
+            del _verified[token]
+    metrics.cache_lookup("jwt_claims", False)
+
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    expires_at = now + TOKEN_CACHE_TTL
+    if payload.get("exp") is not None:
+        expires_at = min(expires_at, float(payload["exp"]))
+    with _verified_lock:
+        _verified[token] = (payload, expires_at)
+        while len(_verified) > TOKEN_CACHE_SIZE:
+            _verified.popitem(last=False)
+    return payload
+
+def user_from_token(token: str) -> dict:
+    """{username, role, email} of a valid token; raises HTTPException 401 otherwise."""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    try:
+        payload = decode_token(token)
+    except JWTError:
+        raise credentials_exception
+    username: Optional[str] = payload.get("sub")
+    if username is None:
+        raise credentials_exception
+    return {"username": username, "role": payload.get("role"), "email": payload.get("email")}
+
+async def get_current_user(request: Request, token: str = Depends(oauth2_scheme)) -> dict:
+    """
+    Shared auth dependency. The user is also kept on request.state, so other code
+    handling the same request can reuse it without decoding the token again.
+    """
+    user = getattr(request.state, "user", None)
+    if user is None:
+        user = user_from_token(token)
+        request.state.user = user
+    return user
+
 # Routes
 @router.post("/register", status_code=status.HTTP_201_CREATED)
-async def register(user: UserCreate, db: Session = Depends(get_db)):
+async def register(request: Request, user: UserCreate, db: Session = Depends(get_db)):
+    check_rate_limit(request)
     # Check if user exists
     db_user = get_user(db, user.username)
     if db_user:
@@ -88,7 +238,7 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
         )
     
     # Create new user
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await run_password_job(get_password_hash, user.password)
     db_user = Users(
         Username=user.username,
         HashPassword=hashed_password,
@@ -103,8 +253,9 @@ async def register(user: UserCreate, db: Session = Depends(get_db)):
 
 # New login endpoint
 @router.post("/login", response_model=Token)
-async def login(user_data: UserLogin, db: Session = Depends(get_db)):
-    user = authenticate_user(db, user_data.username, user_data.password)
+async def login(request: Request, user_data: UserLogin, db: Session = Depends(get_db)):
+    check_rate_limit(request, user_data.username)
+    user = await authenticate_user(db, user_data.username, user_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -127,10 +278,12 @@ async def login(user_data: UserLogin, db: Session = Depends(get_db)):
 # Existing token endpoint (kept for OAuth2 compatibility)
 @router.post("/token", response_model=Token)
 async def login_for_access_token(
+    request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: Session = Depends(get_db)
 ):
-    user = authenticate_user(db, form_data.username, form_data.password)
+    check_rate_limit(request, form_data.username)
+    user = await authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -165,7 +318,8 @@ async def forgot_password(email: str, db: Session = Depends(get_db)):
     return {"message": "Password reset link sent", "token": reset_token}
 
 @router.post("/reset-password")
-async def reset_password(token: str, new_password: str, db: Session = Depends(get_db)):
+async def reset_password(request: Request, token: str, new_password: str, db: Session = Depends(get_db)):
+    check_rate_limit(request)
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username = payload.get("sub")
@@ -180,7 +334,7 @@ async def reset_password(token: str, new_password: str, db: Session = Depends(ge
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
-        hashed_password = get_password_hash(new_password)
+        hashed_password = await run_password_job(get_password_hash, new_password)
         user.HashPassword = hashed_password
         db.commit()
         return {"message": "Password updated successfully"}
@@ -191,21 +345,11 @@ async def reset_password(token: str, new_password: str, db: Session = Depends(ge
         )
 
 @router.get("/verify-token")
-async def verify_token(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: Optional[str] = payload.get("sub")
-        role: Optional[str] = payload.get("role")
-        if role is None:
-            raise credentials_exception
-        email: Optional[str] = payload.get("email")
-        if username is None:
-            raise credentials_exception
-        return {"username": username, "role": role, "email": email}
-    except JWTError:
-        raise credentials_exception
\ No newline at end of file
+async def verify_token(user: dict = Depends(get_current_user)):
+    if user["role"] is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
\ No newline at end of file
@@ -1,6 +1,6 @@
 import sys
-from fastapi import APIRouter, UploadFile, Path, File,UploadFile, Form, HTTPException, Depends, Body, Query
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import APIRouter, UploadFile, Path, File,UploadFile, Form, HTTPException, Depends, Body, Query, Request
+from fastapi.responses import JSONResponse, FileResponse, Response
 from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import TypeDecorator
 import shutil, os, uuid, json, datetime
@@ -13,20 +13,20 @@ from core.database import SessionLocal
 from core.config import UPLOADS_DIR
 from fastapi.middleware.cors import CORSMiddleware
 from crud import invoice_crud
-from core import pdf_reader, template_loader
-from core.pdf_reader import extract_text, convert_pdf_to_images
+from core import pdf_reader, template_loader, timing, metrics, upload_store, raster_cache, http_cache, ocr_cache, retention, search_index, analytics, fingerprints, streaming, rebuild_gate
+from core.pdf_reader import extract_text, extract_pages, convert_pdf_to_images
 import importlib
-from datetime import datetime
+from datetime import date, datetime
 import decimal, json
 from decimal import Decimal, InvalidOperation
-from dateutil import parser
 import shutil
 import subprocess
 import zipfile
 import io
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment
+import base64
 from starlette.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
 
 if sys.platform == "win32":
     _orig_popen = subprocess.Popen
@@ -36,7 +36,9 @@ if sys.platform == "win32":
     subprocess.Popen = _no_window_popen
 
 import os
-import ocrmypdf
+
+# Heavy optional dependencies (ocrmypdf, openpyxl, dateutil) are imported where they are
+# used so that importing the API stays fast; see benchmarks/import_time.py
 
 # from main import app
 # import vendor_parsers.ocr_parser.surekha_goldocr as surekha_goldocr
@@ -51,7 +53,19 @@ def get_db():
     finally:
         db.close()
 
+def hold_rebuilds():
+    """
+    Dependency of the routes that save or delete corrections / advanced bills: no rebuild of
+    the rollups, fingerprints or search index runs until the request is done (core/rebuild_gate.py).
+    """
+    try:
+        with rebuild_gate.saving():
+            yield
+    except rebuild_gate.RebuildInProgress as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(rebuild_gate.SAVE_WAIT)})
+
 def parse_date(date_str):
+    from dateutil import parser
     try:
         # Fix common typos
         date_str = date_str.replace('Nowember', 'November')
@@ -103,6 +117,7 @@ def get_latest_correction(
             "CorrectedBy": correction.CorrectedBy,
             "Status": correction.Status,
             "Notes": correction.Notes,
+            "Version": correction.Version,
             "TemplateStyle": json.loads(correction.TemplateStyle) if isinstance(correction.TemplateStyle, str) and correction.TemplateStyle else (correction.TemplateStyle if correction.TemplateStyle else {})
         }
         
@@ -157,43 +172,79 @@ def load_vendor_parser(vendor_name, mode, advanced):
         except ModuleNotFoundError:
             return None
 
-def process_with_pdfplumber(path, mode, advanced):
+def process_with_pdfplumber(path, mode, advanced, timer=None):
     if not path.lower().endswith(".pdf"):
         raise ValueError("[ERROR] Input is not a PDF. Cannot process with pdfplumber.")
             
     print("[INFO] Proccessing a pdf Extraction on given Text Pdf .")
-
-    text = extract_text(path)
+    timer = timer or timing.ExtractionTimer()
+
+    with timer.stage("extract_text"):
+        pages = pdf_reader.analyze_pages(path)
+    timer.page_count = len(pages)
+
+    # Mixed documents: OCR only the pages without a usable text layer
+    scanned = [p["page"] for p in pages if p["scanned"]]
+    if scanned:
+        print(f"[INFO] Pages without a text layer: {scanned} of {len(pages)}, running OCR on those only.")
+        path = ocr_scanned_pages(path, scanned, timer)
+        with timer.stage("extract_text"):
+            text = "\n".join(extract_pages(path))
+    else:
+        text = "\n".join(p["text"] for p in pages)
     if not text.strip():
-        raise ValueError("[ERROR] No text found in PDF. It's likely scanned. Use OCR mode.")
+        raise ValueError("[ERROR] No text found in PDF, and no scanned pages to OCR.")
 
     print("[INFO] Extracted text using pdfplumber:\n")
     print(text[:])  # Preview
 
     # Detect template
-    templates = template_loader.load_templates()
-    matched_template = template_loader.detect_template(text, templates)
+    with timer.stage("load_templates"):
+        templates = template_loader.load_templates()
+    with timer.stage("detect_template"):
+        matched_template = template_loader.detect_template(text, templates)
 
     if not matched_template:
         raise ValueError("[ERROR] No matching template found in YAML for this text-based PDF.")
 
     vendor = matched_template["vendor"]
+    timer.vendor = vendor
     print(f"[INFO] Detected vendor: {vendor}")
 
     # Dynamically import the correct vendor parser
-    vendor_module = load_vendor_parser(vendor, mode, advanced)
+    with timer.stage("load_vendor_parser"):
+        vendor_module = load_vendor_parser(vendor, mode, advanced)
 
     if not vendor_module:
         raise ValueError(f"[ERROR] No parser found for vendor '{vendor}' in plumber mode.")
 
-    return vendor_module.process_invoice(text,path)
+    with timer.stage("process_invoice"):
+        return vendor_module.process_invoice(text,path)
+
+def ocr_scanned_pages(path, pages, timer):
+    """
+    OCR the given 1-based pages of a PDF into its _textpdf sidecar. Pages that already have
+    a text layer are copied through untouched, so their native text is kept.
+    """
+    output_pdf_path = path.rsplit('.', 1)[0] + '_textpdf.pdf'
+    settings = {"pages": ",".join(str(p) for p in pages), "force_ocr": True, "deskew": True, "image_dpi": 300}
+
+    def run(source, output):
+        import ocrmypdf
+        ocrmypdf.ocr(source, output, **settings)
+        metrics.OCR_PAGES.inc(len(pages), engine="ocrmypdf")
 
-def process_with_ocr(path, mode, advanced):
+    with timer.stage("ocr"):
+        ocr_cache.cached_pdf(path, output_pdf_path, "ocrmypdf", run, **settings)
+    return output_pdf_path
+
+def process_with_ocr(path, mode, advanced, timer=None):
     filepath = path
     fmode = "plumber" if mode.lower() == "ocr" else "plumber"  # Seems redundant, but assuming future logic
+    timer = timer or timing.ExtractionTimer()
 
     if path.lower().endswith(".pdf"):
-        return process_with_pdfplumber(filepath, fmode,advanced)
+        return process_with_pdfplumber(filepath, fmode,advanced, timer=timer)
 
     elif path.lower().endswith((".jpg", ".jpeg", ".png")):
         # Convert image to temporary PDF first
@@ -205,15 +256,23 @@ def process_with_ocr(path, mode, advanced):
         # Output OCR'd PDF path
         output_pdf_path = path.rsplit('.', 1)[0] + '_textpdf.pdf'
 
-        # Only run OCR if OCR'd version doesn't exist
-        if not os.path.exists(output_pdf_path):
-            ocrmypdf.ocr(path, output_pdf_path, deskew=True, image_dpi=300)
+        # OCR output is cached per image content and settings, so renamed or re-uploaded
+        # scans are not OCR'd again
+        settings = {"deskew": True, "image_dpi": 300}
+
+        def run(source, output):
+            import ocrmypdf
+            ocrmypdf.ocr(source, output, **settings)
+            metrics.OCR_PAGES.inc(engine="ocrmypdf")
+
+        with timer.stage("ocr"):
+            ocr_cache.cached_pdf(path, output_pdf_path, "ocrmypdf", run, **settings)
 
         # Clean up temp PDF if needed
         # if os.path.exists(temp_pdf_path):
         #     os.remove(temp_pdf_path)
 
-        return process_with_pdfplumber(output_pdf_path, fmode,advanced)
+        return process_with_pdfplumber(output_pdf_path, fmode,advanced, timer=timer)
 
     else:
         raise ValueError("[ERROR] Unsupported file type for OCR processing.")
@@ -254,49 +313,206 @@ def process_with_ocr(path, mode, advanced):
 @router.post('/upload-doc')
 async def upload_doc(file: UploadFile = File(...)):
     try:
-        os.makedirs(UPLOADS_DIR, exist_ok=True)
-        
         if not file.filename:
             raise HTTPException(status_code=400, detail="No filename provided")
-        # file_ext = os.path.splitext(file.filename)[1]
-        # unique_filename = f"{uuid.uuid4()}{file_ext}"
-        unique_filename = file.filename.strip().replace(" ", "_").replace("/", "_").replace("\\", "_")
-        file_path = os.path.join(UPLOADS_DIR, unique_filename)
-        
-        with open(file_path, 'wb') as buffer:
-            shutil.copyfileobj(file.file, buffer)
-
-        return JSONResponse({
-            "status": "success",
-            "filename": unique_filename,
-            "original_filename": file.filename,  # Include original filename
-            "size": os.path.getsize(file_path)
-        })
+        # Hash and store off the event loop; identical documents are kept only once
+        stored = await run_in_threadpool(upload_store.put, file.file, file.filename)
+        metrics.UPLOAD_BYTES.inc(stored["size"])
+        return _upload_response(stored, await run_in_threadpool(_saved_copies, stored["hash"]))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error uploading file: {str(e)}")
 
+def _saved_copies(digest):
+    """Saved invoices already extracted from the document with this SHA-256."""
+    db = SessionLocal()
+    try:
+        return fingerprints.find(db, {"file": digest})[0]
+    except Exception as e:
+        print(f"[WARN] Duplicate check failed: {e}")
+        return []
+    finally:
+        db.close()
+
+def _upload_response(stored, duplicates=()):
+    return JSONResponse({
+        "status": "success",
+        "filename": stored["name"],
+        "original_filename": stored["original_name"],  # Include original filename
+        "size": stored["size"],
+        "hash": stored["hash"],
+        "deduplicated": stored["deduplicated"],
+        "duplicate_of": list(duplicates)
+    })
+
+# ------------------------------
+# Resumable uploads for large scans:
+#   POST /uploads {filename, size, sha256?}      -> upload_id, offset
+#   PUT  /uploads/{id} (Upload-Offset header)    -> raw chunk body, returns the new offset
+#   GET  /uploads/{id}                           -> current offset, to resume after a failure
+#   POST /uploads/{id}/finalize {sha256?}        -> verifies and stores like /upload-doc
+# ------------------------------
+def _offset_conflict(e):
+    return HTTPException(status_code=409, detail={"message": str(e), "offset": e.offset},
+                         headers={"Upload-Offset": str(e.offset)})
+
+@router.post('/uploads', status_code=201)
+async def init_upload(payload: dict = Body(...)):
+    try:
+        size = int(payload.get("size", -1))
+        state = await run_in_threadpool(upload_store.begin_upload, payload.get("filename"), size, payload.get("sha256"))
+    except (TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return JSONResponse(state, status_code=201, headers={"Upload-Offset": str(state["offset"])})
+
+@router.get('/uploads/{upload_id}')
+async def get_upload(upload_id: str):
+    try:
+        state = await run_in_threadpool(upload_store.upload_state, upload_id)
+    except upload_store.UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    return JSONResponse(state, headers={"Upload-Offset": str(state["offset"])})
+
+_CHUNK_FLUSH = 1024 * 1024
+
+async def _write_chunk(writer, pending):
+    if pending:
+        await run_in_threadpool(writer.write, bytes(pending))
+        metrics.UPLOAD_BYTES.inc(len(pending))
+        pending.clear()
+
+@router.put('/uploads/{upload_id}')
+async def upload_chunk(upload_id: str, request: Request):
+    try:
+        offset = int(request.headers.get("Upload-Offset", ""))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Upload-Offset header is required")
+    try:
+        # The body is streamed to the partial file in slices of up to _CHUNK_FLUSH bytes; the
+        # sqlite lookups and the file writes run in the threadpool, off the event loop
+        chunk = upload_store.open_chunk(upload_id, offset)
+        writer = await run_in_threadpool(chunk.__enter__)
+        try:
+            pending = bytearray()
+            async for data in request.stream():
+                pending += data
+                if len(pending) >= _CHUNK_FLUSH:
+                    await _write_chunk(writer, pending)
+            await _write_chunk(writer, pending)
+        except BaseException as e:
+            if not await run_in_threadpool(chunk.__exit__, type(e), e, e.__traceback__):
+                raise
+        else:
+            await run_in_threadpool(chunk.__exit__, None, None, None)
+    except upload_store.UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    except upload_store.OffsetMismatch as e:
+        raise _offset_conflict(e)
+    except ClientDisconnect:
+        # Whatever arrived is kept; the client resumes from GET /uploads/{id}
+        return JSONResponse({"detail": "Client disconnected"}, status_code=400)
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    state = await run_in_threadpool(upload_store.upload_state, upload_id)
+    return JSONResponse(state, headers={"Upload-Offset": str(state["offset"])})
+
+@router.post('/uploads/{upload_id}/finalize')
+async def finalize_upload(upload_id: str, payload: Optional[dict] = Body(None)):
+    try:
+        stored = await run_in_threadpool(upload_store.finish_upload, upload_id, (payload or {}).get("sha256"))
+    except upload_store.UploadNotFound:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    except upload_store.OffsetMismatch as e:
+        raise _offset_conflict(e)
+    except upload_store.ChecksumMismatch as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error finalizing upload: {str(e)}")
+    return _upload_response(stored, await run_in_threadpool(_saved_copies, stored["hash"]))
+
+@router.delete('/uploads/{upload_id}')
+async def abort_upload(upload_id: str):
+    try:
+        found = await run_in_threadpool(upload_store.abort_upload, upload_id)
+    except upload_store.UploadNotFound:
+        found = False
+    if not found:
+        raise HTTPException(status_code=404, detail="Upload not found or expired")
+    return {"status": "success", "upload_id": upload_id}
+
 @router.get('/list-docs')
-async def list_documents():
+async def list_documents(
+    page: Optional[int] = Query(None, ge=1),
+    per_page: int = Query(50, ge=1, le=500),
+    file_type: Optional[str] = Query(None, alias="type", description="pdf, images or documents"),
+    status: Optional[str] = Query(None, description="uploaded, extracted or failed"),
+    q: Optional[str] = Query(None, description="Substring of the stored or original filename"),
+    uploaded_from: Optional[datetime] = Query(None),
+    uploaded_to: Optional[datetime] = Query(None),
+    sort: str = Query("uploadedOn"),
+    order: str = Query("desc")
+):
+    """
+    List uploads from the upload catalog. Filtering, sorting and paging run against the
+    catalog indexes; without `page` the full (filtered) list is returned as before.
+    """
     try:
-        if not os.path.exists(UPLOADS_DIR):
-            return []
-            
-        files = []
-        for filename in os.listdir(UPLOADS_DIR):
-            file_path = os.path.join(UPLOADS_DIR, filename)
-            if os.path.isfile(file_path):
-                # Store both unique and original filenames
-                files.append({
-                    "name": filename,
-                    "originalName": filename,  # You might want to store original names in a database
-                    "size": os.path.getsize(file_path),
-                    "uploadedOn": datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat()
-                })
-                
-        files.sort(key=lambda x: x["uploadedOn"], reverse=True)
-        return files
+        extensions = upload_store.FILE_TYPES.get(file_type.lower()) if file_type and file_type.lower() != "all" else None
+        files, total = await run_in_threadpool(
+            upload_store.list_uploads, page=page, per_page=per_page, extensions=extensions,
+            status=status, search=q, uploaded_from=uploaded_from, uploaded_to=uploaded_to,
+            sort=sort, order=order
+        )
+        if page is None:
+            return files
+
+        headers = {
+            "X-Total-Count": str(total),
+            "X-Page": str(page),
+            "X-Per-Page": str(per_page),
+            "X-Total-Pages": str((total + per_page - 1) // per_page)
+        }
+        return JSONResponse(content=files, headers=headers)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error listing documents: {str(e)}")
+
+
+@router.get('/page-image')
+async def get_page_image(
+    request: Request,
+    filename: str,
+    page: int = Query(1, ge=1),
+    width: int = Query(300, ge=32, le=2400),
+    format: str = Query("webp", pattern="^(webp|png)$"),
+    v: Optional[str] = None
+):
+    """
+    Thumbnail / preview image of one page of an upload, served from the page raster cache.
+    Rasters are keyed by content hash, so the ETag never changes for a given document and
+    passing that hash as `v` makes the response immutable.
+    """
+    if not filename or any(c in filename for c in ['..', '/', '\\']):
+        raise HTTPException(status_code=400, detail="Invalid filename")
+    file_path = UPLOADS_DIR / filename
+    if not file_path.exists():
+        raise HTTPException(status_code=404, detail="File not found")
+
+    try:
+        image_path, digest = await run_in_threadpool(raster_cache.thumbnail, file_path, page, width, format)
+    except IndexError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error rendering page: {str(e)}")
+
+    headers = {
+        "ETag": f'"{digest}-p{page}-w{width}.{format}"',
+        "Cache-Control": http_cache.CACHE_IMMUTABLE if v == digest else http_cache.CACHE_PRIVATE_DAY,
+    }
+    if http_cache.not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(image_path, media_type=f"image/{format}", headers=headers)
 #delete multi documents
 
 @router.delete('/delete-docs')
@@ -314,7 +530,9 @@ async def delete_documents(filenames: dict):
                 continue
                 
             try:
-                if os.path.exists(file_path):
+                if upload_store.release(filename):
+                    deleted_files.append(filename)
+                elif os.path.exists(file_path):
                     os.remove(file_path)
                     deleted_files.append(filename)
                 else:
@@ -338,10 +556,12 @@ async def process_invoice(
     filename: str = Form(...),
     mode: str = Form(...),
     advanced: str = Form(...),
+    allow_duplicate: str = Form('false'),
     db: Session = Depends(get_db)
 ):
     """
     Process an already uploaded file (PDF or image) for invoice extraction.
+    A file that was already saved as an invoice is refused with 409 unless allow_duplicate is 'true'.
     """
     # Convert advanced string to boolean
     advanced_bool = str(advanced).lower() == 'true'
@@ -359,9 +579,19 @@ async def process_invoice(
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="File not found")
 
+    # Flag documents that were already saved before the extraction runs
+    if str(allow_duplicate).lower() != 'true':
+        duplicates, _ = fingerprints.find(db, {"file": fingerprints.file_hash(filename)})
+        if duplicates:
+            raise HTTPException(status_code=409, detail={"message": fingerprints.describe(duplicates),
+                                                         "duplicate_of": duplicates})
+
+    # Per-stage timings are returned with the result and as a Server-Timing header
+    timer = timing.ExtractionTimer(mode=mode.lower())
+    upload_status = "failed"
     try:
         # Process the invoice based on user given mode
-        result = process_with_pdfplumber(path=file_path, mode="plumber", advanced=advanced_bool) if mode == "text" else process_with_ocr(path=file_path, mode="ocr", advanced=advanced)
+        result = process_with_pdfplumber(path=file_path, mode="plumber", advanced=advanced_bool, timer=timer) if mode == "text" else process_with_ocr(path=file_path, mode="ocr", advanced=advanced, timer=timer)
 
         if not result:
             raise HTTPException(status_code=400, detail="No data extracted from the invoice")
@@ -370,50 +600,178 @@ async def process_invoice(
             invoice_data = result.get("invoice_data")
             items = result.get("items")
             response = result
-            return JSONResponse(content=response)
+            response["timings"] = timer.as_dict()
+            upload_status = "extracted"
+            return JSONResponse(content=response, headers={"Server-Timing": timer.server_timing()})
         
         else:
             invoice_data = result.get("invoice_data")
             items = result.get("items")
             invoice_number = result.get("invoice_number")
 
-            invoice_crud.insert_invoice_orm(db, invoice_data)
-            invoice_crud.insert_items_orm(db, invoice_number, items)
+            with timer.stage("db_save"):
+                invoice_crud.insert_invoice_orm(db, invoice_data)
+                invoice_crud.insert_items_orm(db, invoice_number, items)
 
-            # Fetch the saved invoice and items from DB
-            saved_invoice = invoice_crud.get_invoice_by_invoice_no_orm(db, invoice_number)
-            saved_items = invoice_crud.get_items_by_invoice_no_orm(db, invoice_number)
+                # Fetch the saved invoice and items from DB
+                saved_invoice = invoice_crud.get_invoice_by_invoice_no_orm(db, invoice_number)
+                saved_items = invoice_crud.get_items_by_invoice_no_orm(db, invoice_number)
 
             response = {
                 "invoice_number": invoice_number,
                 "invoice_data": saved_invoice.as_dict() if saved_invoice else {},
-                "items": [item.as_dict() for item in saved_items]
+                "items": [item.as_dict() for item in saved_items],
+                "timings": timer.as_dict()
             }
-            return JSONResponse(content=response)
+            upload_status = "extracted"
+            return JSONResponse(content=response, headers={"Server-Timing": timer.server_timing()})
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"[FATAL] {str(e)}")
+    finally:
+        timing.record(timer)
+        try:
+            upload_store.set_status(filename, upload_status)
+        except Exception as e:
+            print(f"[WARN] Could not update upload status for {filename}: {e}")
+
+# Aggregated extraction stage timings per vendor and page count
+@router.get("/extraction-timings")
+def get_extraction_timings():
+    return timing.snapshot()
+
+# Storage retention: GET reports what the policies would remove, POST applies them
+@router.get("/storage/retention")
+async def get_retention_report():
+    report = await run_in_threadpool(retention.run, True)
+    report["last_run"] = retention.last_report
+    return report
+
+@router.post("/storage/retention")
+async def run_retention(dry_run: bool = Query(False)):
+    return await run_in_threadpool(retention.run, dry_run)
+
+@router.get("/search")
+def search_invoices(
+    q: str = Query(..., min_length=1, max_length=200),
+    kind: Optional[str] = Query(None, pattern="^(correction|advanced)$"),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+    Ranked full-text search over saved invoices (corrections and advanced bills) by invoice
+    number, vendor, GSTIN, item description or HSN; terms match as prefixes. See
+    core/search_index.py for the SQLite FTS5 / SQL Server full-text backends.
+    """
+    try:
+        total, hits, backend = search_index.search(db, q, kind, page, per_page)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
+    headers = {
+        "X-Total-Count": str(total),
+        "X-Page": str(page),
+        "X-Per-Page": str(per_page),
+        "X-Total-Pages": str((total + per_page - 1) // per_page),
+        "X-Search-Backend": backend,
+    }
+    return JSONResponse(content=hits, headers=headers)
+
+@router.get("/analytics")
+def get_analytics(
+    group_by: str = Query("month,vendor", description="Comma-separated: source, month, vendor, hsn, tax_rate"),
+    month_from: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    month_to: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    vendor: Optional[str] = None,
+    source: Optional[str] = Query(None, pattern="^(correction|advanced)$"),
+    limit: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    """
+    Totals from the analytics rollup tables (core/analytics.py), e.g. monthly totals by
+    vendor and GST rate with group_by=month,vendor,tax_rate.
+    """
+    dimensions = [d.strip() for d in group_by.split(",") if d.strip()]
+    unknown = [d for d in dimensions if d not in analytics.DIMENSIONS]
+    if not dimensions or unknown or len(set(dimensions)) != len(dimensions):
+        raise HTTPException(status_code=400, detail=f"group_by must list distinct values of {', '.join(analytics.DIMENSIONS)}")
+    try:
+        return analytics.summary(db, dimensions, month_from, month_to, vendor, source, limit)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching analytics: {str(e)}")
+
+@router.post("/analytics/rebuild")
+def rebuild_analytics(db: Session = Depends(get_db)):
+    try:
+        return {"status": "success", "rows": analytics.rebuild(db)}
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Error rebuilding analytics: {str(e)}")
+
+def _invoice_response(inv):
+    return InvoiceResponse(
+        InvoiceNo=inv.InvoiceNo,
+        FromAddress=inv.FromAddress,
+        ToAddress=inv.ToAddress,
+        GSTNo=inv.GSTNo,
+        InvoiceDate=inv.InvoiceDate,
+        TotalAmount=inv.Total,
+        Taxes=inv.Taxes,
+        TotalQuantity=inv.TotalQuantity,
+        Items=[]  # empty list
+    )
+
+def _invoice_json(inv):
+    return _invoice_response(inv).model_dump(mode="json")
+
+def _cursor_page(rows, limit, key):
+    """A page read with limit + 1 rows: (the page, headers with X-Next-Cursor if more follow)."""
+    headers = {"X-Per-Page": str(limit)}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = streaming.encode_cursor(rows[-1][key])
+    return rows, headers
 
 @router.get("/invoices", response_model=List[InvoiceResponse])
-def get_all_invoices(db: Session = Depends(get_db)):
-    invoices = db.query(Invoices).all()
-    return [
-        InvoiceResponse(
-            InvoiceNo=inv.InvoiceNo,
-            FromAddress=inv.FromAddress,
-            ToAddress=inv.ToAddress,
-            GSTNo=inv.GSTNo,
-            InvoiceDate=inv.InvoiceDate,
-            TotalAmount=inv.Total,
-            Taxes=inv.Taxes,
-            TotalQuantity=inv.TotalQuantity,
-            Items=[]  # empty list
-        )
-        for inv in invoices
-    ]
+def get_all_invoices(
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (pages in InvoiceNo order)"),
+    stream: Optional[str] = Query(None, pattern="^ndjson$"),
+):
+    """
+    Invoices in InvoiceNo order. Without arguments the whole list is streamed as one JSON
+    array; `limit` / `cursor` return a page with X-Next-Cursor while more follow, and
+    stream=ndjson streams the invoices after `cursor` one per line.
+    """
+    try:
+        after = streaming.decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if stream:
+        rows = streaming.rows(invoice_crud.get_all_invoices_orm, _invoice_json, after, limit)
+        return StreamingResponse(streaming.ndjson(rows), media_type=streaming.NDJSON)
+    if cursor is None and limit is None:
+        rows = streaming.rows(invoice_crud.get_all_invoices_orm, _invoice_json)
+        return StreamingResponse(streaming.json_array(rows), media_type="application/json")
+
+    limit = limit or 100
+    invoices = list(streaming.rows(invoice_crud.get_all_invoices_orm, _invoice_json, after, limit + 1))
+    invoices, headers = _cursor_page(invoices, limit, "InvoiceNo")
+    return JSONResponse(content=invoices, headers=headers)
+
+def _list_headers(total, page, per_page, etag):
+    return {
+        "X-Total-Count": str(total),
+        "X-Page": str(page),
+        "X-Per-Page": str(per_page),
+        "X-Total-Pages": str((total + per_page - 1) // per_page),
+        "ETag": etag,
+        "Cache-Control": http_cache.CACHE_REVALIDATE,
+    }
 
 @router.get("/invoices/completed")
 async def get_completed_invoices(
+    request: Request,
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=100),
     db: Session = Depends(get_db)
@@ -422,7 +780,11 @@ async def get_completed_invoices(
         # Get all invoices that are marked as completed
         query = db.query(CorrectedInvoices)
         
-        total = query.count()
+        total, version = invoice_crud.corrections_version(db)
+        headers = _list_headers(total, page, per_page, http_cache.etag_for("completed", version, total, page, per_page))
+        if http_cache.not_modified(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
         invoices = query.order_by(CorrectedInvoices.CorrectionDate.desc()).offset((page - 1) * per_page).limit(per_page).all()
         
         result = []
@@ -458,14 +820,6 @@ async def get_completed_invoices(
             }
             result.append(invoice_data)
         
-        # Create response headers
-        headers = {
-            "X-Total-Count": str(total),
-            "X-Page": str(page),
-            "X-Per-Page": str(per_page),
-            "X-Total-Pages": str((total + per_page - 1) // per_page)
-        }
-        
         return JSONResponse(content=result, headers=headers)
         
     except Exception as e:
@@ -477,12 +831,20 @@ async def get_completed_invoices(
 # def get_invoice_items(invoice_no: str = Path(...), db: Session = Depends(get_db)):
 #     return invoice_crud.get_items_by_invoice_no_orm(db, invoice_no)
 @router.get("/corrections/{correction_id}/items")
-def get_correction_items(correction_id: int, db: Session = Depends(get_db)):
+def get_correction_items(correction_id: int, request: Request, db: Session = Depends(get_db)):
+    version = invoice_crud.correction_items_version(db, correction_id)
+    headers = {
+        "ETag": http_cache.etag_for("correction-items", correction_id, version),
+        "Cache-Control": http_cache.CACHE_REVALIDATE,
+    }
+    if http_cache.not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
     items = db.query(CorrectedItems)\
         .filter(CorrectedItems.CorrectionID == correction_id)\
         .all()
     
-    return [{
+    return JSONResponse(headers=headers, content=[{
         "Description": item.Description,
         "Quantity": float(item.Quantity) if item.Quantity is not None else 0.0,
         "Rate": float(item.Rate) if item.Rate is not None else 0.0,
@@ -490,26 +852,107 @@ def get_correction_items(correction_id: int, db: Session = Depends(get_db)):
         "Amount": float(item.Amount) if item.Amount is not None else 0.0,
         "HSN": item.HSN,
         "OriginalItemID": item.OriginalItemID
-    } for item in items]
+    } for item in items])
+
+# ------------------------------
+# Invoice history from the change log (core/change_log.py). Declared before
+# /invoices/{invoice_no:path}, which would otherwise take these paths.
+#   GET /invoices/history                          -> all changes, filterable
+#   GET /invoices/{invoice_no}/history             -> changes of one invoice
+#   GET /invoices/{invoice_no}/history/{change_id} -> the invoice as it was after that change
+# ------------------------------
+def _history_response(total, entries, page, per_page):
+    headers = {
+        "X-Total-Count": str(total),
+        "X-Page": str(page),
+        "X-Per-Page": str(per_page),
+        "X-Total-Pages": str((total + per_page - 1) // per_page),
+    }
+    # Lets a client continue by cursor after the first page
+    if entries and page * per_page < total:
+        headers["X-Next-Cursor"] = streaming.encode_cursor(entries[-1]["change_id"])
+    return JSONResponse(content=entries, headers=headers)
+
+# returns all invoice history
+@router.get("/invoices/history")
+def get_all_invoice_history(
+    invoice_no: Optional[str] = Query(None),
+    entity: Optional[str] = Query(None, pattern="^(invoice|item)$"),
+    field: Optional[str] = Query(None, description="Only changes to this column, e.g. Total"),
+    action: Optional[str] = Query(None, pattern="^(insert|update|delete)$"),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page (instead of page)"),
+    stream: Optional[str] = Query(None, pattern="^ndjson$"),
+    db: Session = Depends(get_db)
+):
+    """
+    Change log entries, newest first. `page` pages count the total; `cursor` pages seek past
+    the previous page's last entry without counting, and stream=ndjson streams every
+    matching entry (after `cursor`) one per line.
+    """
+    filters = dict(invoice_no=invoice_no, entity=entity, field=field, action=action, since=since, until=until)
+    try:
+        before = streaming.decode_cursor(cursor, int) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if stream:
+        rows = streaming.rows(invoice_crud.iter_invoice_history, dict, before, **filters)
+        return StreamingResponse(streaming.ndjson(rows), media_type=streaming.NDJSON)
+    if cursor:
+        entries = list(invoice_crud.iter_invoice_history(db, before, per_page + 1, **filters))
+        entries, headers = _cursor_page(entries, per_page, "change_id")
+        return JSONResponse(content=entries, headers=headers)
+
+    total, entries = invoice_crud.get_all_invoice_history(db, page, per_page, **filters)
+    return _history_response(total, entries, page, per_page)
+
+# returns inbvoice history for a specific invoice
+@router.get("/invoices/{invoice_no:path}/history")
+def get_invoice_history_route(
+    invoice_no: str,
+    entity: Optional[str] = Query(None, pattern="^(invoice|item)$"),
+    field: Optional[str] = Query(None),
+    action: Optional[str] = Query(None, pattern="^(insert|update|delete)$"),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    page: int = Query(1, ge=1),
+    per_page: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    total, entries = invoice_crud.get_invoice_history(
+        db, invoice_no, page, per_page, entity=entity, field=field, action=action, since=since, until=until)
+    if not total:
+        raise HTTPException(status_code=404, detail="No history found for this invoice")
+    return _history_response(total, entries, page, per_page)
+
+# the invoice and its items as they were right after one change
+@router.get("/invoices/{invoice_no:path}/history/{change_id}")
+def get_invoice_version_route(invoice_no: str, change_id: int, db: Session = Depends(get_db)):
+    version = invoice_crud.get_invoice_version(db, invoice_no, change_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail=f"Invoice {invoice_no} did not exist after change {change_id}")
+    return version
 
 # get a specific invoice by invoice number
 @router.get("/invoices/{invoice_no:path}", response_model=InvoiceResponse)
-def get_invoice(invoice_no: str = Path(...), db: Session = Depends(get_db)):
+def get_invoice(request: Request, response: Response, invoice_no: str = Path(...), db: Session = Depends(get_db)):
     inv = db.query(Invoices).filter(Invoices.InvoiceNo == invoice_no).first()
     if not inv:
         raise HTTPException(status_code=404, detail="Invoice not found")
 
-    return InvoiceResponse(
-        InvoiceNo=inv.InvoiceNo,
-        FromAddress=inv.FromAddress,
-        ToAddress=inv.ToAddress,
-        GSTNo=inv.GSTNo,
-        InvoiceDate=inv.InvoiceDate,
-        TotalAmount=inv.Total,
-        Taxes=inv.Taxes,
-        TotalQuantity=inv.TotalQuantity,
-        Items=[]
-    )
+    # A single row: its own columns are the version (skips serialising the response on a 304)
+    headers = {
+        "ETag": http_cache.etag_for("invoice", *(str(v) for v in inv.as_dict().values())),
+        "Cache-Control": http_cache.CACHE_REVALIDATE,
+    }
+    if http_cache.not_modified(request, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+
+    return _invoice_response(inv)
 
 @router.post("/invoices/update-invoice")
 def update_invoice_main(data: dict, db: Session = Depends(get_db)):
@@ -541,38 +984,112 @@ def delete_invoice(invoice_no: str, db: Session = Depends(get_db)):
     return {"detail": f"Invoice {invoice_no} deleted"}
 
 
-# returns inbvoice history for a specific invoice
-@router.get("/invoices/{invoice_no}/history")
-def get_invoice_history_route(invoice_no: str, db: Session = Depends(get_db)):
-    history = invoice_crud.get_invoice_history(db, invoice_no)
-    if not history:
-        raise HTTPException(status_code=404, detail="No history found for this invoice")
-    return history
+# Request item fields -> CorrectedItems columns
+CORRECTION_ITEM_FIELDS = {
+    'original_item_id': ('OriginalItemID', lambda value: value),
+    'description': ('Description', lambda value: value or ''),
+    'quantity': ('Quantity', safe_decimal),
+    'price_per_unit': ('Rate', safe_decimal),
+    'gst': ('Tax', safe_decimal),
+    'amount': ('Amount', safe_decimal),
+    'hsn': ('HSN', lambda value: value or ''),
+}
+
+def _correction_item_values(item, partial=False):
+    """Column values of an editor item; with partial=True only the fields the item carries."""
+    return {column: convert(item.get(field)) for field, (column, convert) in CORRECTION_ITEM_FIELDS.items()
+            if not partial or field in item}
+
+def _assign(row, values):
+    """Set only the columns whose value differs, so the flush updates just those (True if any did)."""
+    changed = False
+    for column, value in values.items():
+        current = getattr(row, column)
+        # A DATE column (InvoiceDate on SQL Server) loads as a date; parse_date gives 'YYYY-MM-DD'
+        if isinstance(current, date) and isinstance(value, str):
+            current = current.strftime('%Y-%m-%d')
+        if current != value:
+            setattr(row, column, value)
+            changed = True
+    return changed
+
+def _item_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail=f"Invalid correction_item_id: {value!r}")
 
-# returns all invoice history
-@router.get("/invoices/history")
-def get_all_invoice_history(db: Session = Depends(get_db)):
-    history = invoice_crud.get_all_invoice_history(db)
-    if not history:
-        raise HTTPException(status_code=404, detail="No invoice history found")
-    return history
+def _diff_items(rows, items):
+    """
+    Turn a full item list (editors that do not send a diff) into (added, changed, removed, ids).
+    Items without a correction_item_id take over the remaining stored rows in order, so
+    resaving an unchanged list writes nothing. `ids` has the stored row of each item in
+    order, None for the added ones.
+    """
+    named = {_item_id(item['correction_item_id']) for item in items if item.get('correction_item_id') is not None}
+    spare = [row.CorrectionItemID for row in rows if row.CorrectionItemID not in named]
+    added, changed, ids = [], [], []
+    for item in items:
+        if item.get('correction_item_id') is not None:
+            changed.append(item)
+            ids.append(_item_id(item['correction_item_id']))
+        elif spare:
+            changed.append({**item, 'correction_item_id': spare.pop(0)})
+            ids.append(changed[-1]['correction_item_id'])
+        else:
+            added.append(item)
+            ids.append(None)
+    return added, changed, spare, ids
 
+def _apply_item_changes(db, correction_id, rows, added, changed, removed, partial=True):
+    """
+    Apply an item diff to a correction's stored rows, writing only what differs.
+    Returns (items after the change, new rows, counts of added / changed / removed rows).
+    """
+    by_id = {row.CorrectionItemID: row for row in rows}
+    removed = [_item_id(item_id) for item_id in removed]
+    changed = [(_item_id(item.get('correction_item_id')), item) for item in changed]
+    unknown = [item_id for item_id in removed + [item_id for item_id, _ in changed] if item_id not in by_id]
+    if unknown:
+        raise HTTPException(status_code=409, detail={
+            "message": f"Items {unknown} are not part of correction {correction_id}; reload it before saving."})
+
+    for item_id in removed:
+        db.delete(by_id.pop(item_id))
+    updated = sum(_assign(by_id[item_id], _correction_item_values(item, partial)) for item_id, item in changed
+                  if item_id in by_id)
+    new_rows = [CorrectedItems(CorrectionID=correction_id, **_correction_item_values(item)) for item in added]
+    db.add_all(new_rows)
+    return list(by_id.values()) + new_rows, new_rows, {"added": len(new_rows), "changed": updated, "removed": len(removed)}
 
 #Scave Correted Invoice from user in invoice correction form
 # Modified save correction endpoint
-@router.post("/invoices/save-correction")
+@router.post("/invoices/save-correction", dependencies=[Depends(hold_rebuilds)])
 def save_corrected_invoice(
     correction_data: dict = Body(...),
     db: Session = Depends(get_db)
 ):
+    """
+    Save a correction from the editor: { invoice_data, items | changes, styling, version?, correction_id? }.
+    A pending correction can be saved with only `changes` ({added: [items], changed: [{correction_item_id,
+    changed fields}], removed: [correction_item_id]}) and is then written row by row. `version` is the
+    correction version the editor loaded; a save against an older version is refused with 409.
+    """
     try:
         # Validate required fields
-        if not correction_data.get('invoice_data') or not correction_data.get('items'):
+        changes = correction_data.get('changes')
+        if not correction_data.get('invoice_data') or not (correction_data.get('items') or changes):
             raise HTTPException(status_code=400, detail="Missing required data")
             
         invoice_data = correction_data['invoice_data']
-        items = correction_data['items']
+        items = correction_data.get('items') or []
         styling = correction_data.get('styling', {})
+        expected_version = correction_data.get('version')
+        if expected_version is not None:
+            try:
+                expected_version = int(expected_version)
+            except (TypeError, ValueError):
+                raise HTTPException(status_code=400, detail="version must be an integer")
         
         # Validate invoice number
         invoice_no = invoice_data.get('invoice_number')
@@ -604,28 +1121,61 @@ def save_corrected_invoice(
             CorrectedInvoices.OriginalInvoiceNo == invoice_no,
             CorrectedInvoices.Status == 'PENDING_APPROVAL'
         ).first()
+        if changes is not None and (not existing_pending or
+                                    correction_data.get('correction_id') not in (None, existing_pending.CorrectionID)):
+            raise HTTPException(status_code=409, detail={
+                "message": f"The correction of invoice {invoice_no} no longer exists; reload it before saving changes."})
         
         if existing_pending:
-            # Update existing correction
-            existing_pending.FromAddress = invoice_data.get('from_address', '')
-            existing_pending.ToAddress = invoice_data.get('to_address', '')
-            existing_pending.SupplierGST = invoice_data.get('gst_number', '')
-            existing_pending.CustomerGST = invoice_data.get('customer_gst', '')
-            existing_pending.InvoiceDate = invoice_date
-            existing_pending.Total = total
-            existing_pending.Subtotal = subtotal
-            existing_pending.TaxAmount = tax_amount
-            existing_pending.Taxes = invoice_data.get('taxes', '')
-            existing_pending.TotalQuantity = total_quantity
-            existing_pending.TemplateStyle = styling
-            existing_pending.CorrectedBy = "current_user@example.com"
             correction_id = existing_pending.CorrectionID
-            
-            # Delete existing items
-            db.query(CorrectedItems).filter(
-                CorrectedItems.CorrectionID == correction_id
-            ).delete()
+
+            # Optimistic concurrency: the version only moves on if nobody saved since the editor loaded it
+            version_filter = [CorrectedInvoices.CorrectionID == correction_id]
+            if expected_version is not None:
+                version_filter.append(CorrectedInvoices.Version == expected_version)
+            bumped = db.query(CorrectedInvoices).filter(*version_filter).update(
+                {CorrectedInvoices.Version: CorrectedInvoices.Version + 1}, synchronize_session=False)
+            if not bumped:
+                db.rollback()
+                current = db.query(CorrectedInvoices.Version).filter(CorrectedInvoices.CorrectionID == correction_id).scalar()
+                raise HTTPException(status_code=409, detail={
+                    "message": f"Invoice {invoice_no} was saved by someone else (version {current}); reload it before saving.",
+                    "version": current})
+
+            stored_items = db.query(CorrectedItems).filter(CorrectedItems.CorrectionID == correction_id).all()
+            # Its current totals leave the analytics rollups; the saved version is added below
+            previous = analytics.correction_contribution(existing_pending, stored_items)
+
+            # Update existing correction (only the columns that changed are written)
+            _assign(existing_pending, {
+                "FromAddress": invoice_data.get('from_address', ''),
+                "ToAddress": invoice_data.get('to_address', ''),
+                "SupplierGST": invoice_data.get('gst_number', ''),
+                "CustomerGST": invoice_data.get('customer_gst', ''),
+                "InvoiceDate": invoice_date,
+                "Total": total,
+                "Subtotal": subtotal,
+                "TaxAmount": tax_amount,
+                "Taxes": invoice_data.get('taxes', ''),
+                "TotalQuantity": total_quantity,
+                "TemplateStyle": styling,
+                "CorrectedBy": "current_user@example.com",
+            })
+
+            # Apply the item diff sent by the editor, or work it out from the full list
+            if changes is not None:
+                changed_items = changes.get('changed') or []
+                saved_items, new_items, counts = _apply_item_changes(
+                    db, correction_id, stored_items,
+                    changes.get('added') or [], changed_items, changes.get('removed') or [])
+                sent_ids = [_item_id(item.get('correction_item_id')) for item in changed_items] + \
+                    [None] * len(new_items)
+            else:
+                added, changed_items, removed, sent_ids = _diff_items(stored_items, items)
+                saved_items, new_items, counts = _apply_item_changes(
+                    db, correction_id, stored_items, added, changed_items, removed, partial=False)
         else:
+            previous = None
             # Create new correction
             corrected_invoice = CorrectedInvoices(
                 OriginalInvoiceNo=invoice_no,
@@ -641,34 +1191,52 @@ def save_corrected_invoice(
                 TotalQuantity=total_quantity,
                 TemplateStyle=styling,
                 CorrectedBy="current_user@example.com",
-                Status="APPROVED"
+                Status="APPROVED",
+                Version=1
             )
             db.add(corrected_invoice)
             db.flush()
             correction_id = corrected_invoice.CorrectionID
+            saved_items, new_items, counts = _apply_item_changes(db, correction_id, [], items, [], [])
+            sent_ids = [None] * len(new_items)
         
-        # Save corrected items with validation
-        for item in items:
-            corrected_item = CorrectedItems(
-                CorrectionID=correction_id,
-                OriginalItemID=item.get('original_item_id'),
-                Description=item.get('description', ''),
-                Quantity=safe_decimal(item.get('quantity', '0')),
-                Rate=safe_decimal(item.get('price_per_unit', '0')),
-                Tax=safe_decimal(item.get('gst', '0')),
-                Amount=safe_decimal(item.get('amount', '0')),
-                HSN=item.get('hsn', '')
-            )
-            db.add(corrected_item)
-        
+        correction = existing_pending or corrected_invoice
+
+        # --- DUPLICATE CHECK: same document, same header or near-identical items ---
+        prints = fingerprints.correction_fingerprints(
+            correction, saved_items, fingerprints.file_hash(invoice_data.get('source_file')))
+        duplicates, similar = fingerprints.find(db, prints, exclude=("correction", correction_id))
+        if duplicates and not correction_data.get('allow_duplicate'):
+            db.rollback()
+            raise HTTPException(status_code=409, detail={"message": fingerprints.describe(duplicates),
+                                                         "duplicate_of": duplicates})
+        fingerprints.register(db, "correction", correction_id, prints)
+
+        analytics.apply(db, added=analytics.correction_contribution(correction, saved_items), removed=previous)
+        db.flush()
+        # Read before the commit expires the rows
+        version = db.query(CorrectedInvoices.Version).filter(CorrectedInvoices.CorrectionID == correction_id).scalar()
+        status = correction.Status
+        added_item_ids = [row.CorrectionItemID for row in new_items]
+        # The row of every sent item, the added ones taking the new ids in order
+        new_ids = iter(added_item_ids)
+        item_ids = [item_id if item_id is not None else next(new_ids) for item_id in sent_ids]
         db.commit()
+        search_index.index_correction(db, correction_id)
         return {
             "status": "success", 
             "correction_id": correction_id,
-            "message": "Invoice correction saved successfully"
+            "correction_status": status,
+            "version": version,
+            "added_item_ids": added_item_ids,
+            "item_ids": item_ids,
+            "changes": counts,
+            "message": "Invoice correction saved successfully",
+            "possible_duplicates": similar
         }
     
     except HTTPException:
+        db.rollback()
         raise  # Re-raise HTTP exceptions
     except Exception as e:
         db.rollback()
@@ -679,7 +1247,7 @@ def save_corrected_invoice(
             detail=f"Failed to save invoice correction: {str(e)}"
         )
 
-@router.delete("/invoices/corrections/delete")
+@router.delete("/invoices/corrections/delete", dependencies=[Depends(hold_rebuilds)])
 def delete_invoice_api(
     invoice_number: str = Query(..., description="Invoice number to delete"),
     db: Session = Depends(get_db)
@@ -691,6 +1259,12 @@ def delete_invoice_api(
         ).all()
         if not corrections:
             raise HTTPException(status_code=404, detail="Invoice not found")
+        correction_ids = [correction.CorrectionID for correction in corrections]
+        removed = None
+        for correction_id in correction_ids:
+            removed = analytics.stored_correction(db, correction_id, removed)
+        analytics.apply(db, removed=removed)
+        fingerprints.remove(db, "correction", correction_ids)
         for correction in corrections:
             db.query(CorrectedItems).filter(
                 CorrectedItems.CorrectionID == correction.CorrectionID
@@ -699,13 +1273,14 @@ def delete_invoice_api(
             CorrectedInvoices.OriginalInvoiceNo == invoice_number
         ).delete()
         db.commit()
+        search_index.unindex(db, "correction", correction_ids)
         return {"status": "success", "message": f"Invoice {invoice_number} deleted"}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post('/save-invoice')
+@router.post('/save-invoice', dependencies=[Depends(hold_rebuilds)])
 def save_advanced_columns(
     invoice_data: dict= Body(...),
     db: Session = Depends(get_db)
@@ -780,6 +1355,7 @@ def save_advanced_columns(
         db.flush()  # Get the InvoiceID for foreign key relationship
         
         # Save items
+        saved_items = []
         for item_data in items:
             advanced_item = AdvancedColumnsItems(
                 InvoiceID=advanced_invoice.InvoiceID,
@@ -793,15 +1369,31 @@ def save_advanced_columns(
                 ItemTotal=safe_decimal(item_data.get('Item Total'))
             )
             db.add(advanced_item)
+            saved_items.append(advanced_item)
         
+        # Saving the same bill again is refused unless the editor confirms it
+        prints = fingerprints.advanced_fingerprints(
+            advanced_invoice, saved_items, fingerprints.file_hash(invoice_info.get('sourceFile')))
+        duplicates, similar = fingerprints.find(db, prints, exclude=("advanced", advanced_invoice.InvoiceID))
+        if duplicates and not invoice_data.get('allow_duplicate'):
+            db.rollback()
+            raise HTTPException(status_code=409, detail={"message": fingerprints.describe(duplicates),
+                                                         "duplicate_of": duplicates})
+        fingerprints.register(db, "advanced", advanced_invoice.InvoiceID, prints)
+
+        analytics.apply(db, added=analytics.advanced_contribution(advanced_invoice, saved_items))
         db.commit()
+        search_index.index_advanced(db, advanced_invoice.InvoiceID)
         
         return {
             "status": "success",
             "message": "Advanced invoice data saved successfully",
-            "invoice_id": advanced_invoice.InvoiceID
+            "invoice_id": advanced_invoice.InvoiceID,
+            "possible_duplicates": similar
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         print(f"Error saving advanced invoice data: {str(e)}")
@@ -812,6 +1404,7 @@ def save_advanced_columns(
     
 @router.get("/advanced-invoices")
 def get_advanced_invoices(
+    request: Request,
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=100),
     db: Session = Depends(get_db)
@@ -820,7 +1413,11 @@ def get_advanced_invoices(
         # Query advanced invoices
         query = db.query(AdvancedColumnsInvoicedata)
         
-        total = query.count()
+        total, version = invoice_crud.advanced_invoices_version(db)
+        headers = _list_headers(total, page, per_page, http_cache.etag_for("advanced", version, total, page, per_page))
+        if http_cache.not_modified(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+
         invoices = query.order_by(AdvancedColumnsInvoicedata.CreatedDate.desc()) \
                        .offset((page - 1) * per_page) \
                        .limit(per_page) \
@@ -858,14 +1455,6 @@ def get_advanced_invoices(
             }
             result.append(invoice_data)
         
-        # Create response headers
-        headers = {
-            "X-Total-Count": str(total),
-            "X-Page": str(page),
-            "X-Per-Page": str(per_page),
-            "X-Total-Pages": str((total + per_page - 1) // per_page)
-        }
-        
         return JSONResponse(content=result, headers=headers)
         
     except Exception as e:
@@ -873,6 +1462,8 @@ def get_advanced_invoices(
 
 @router.get("/advanced-invoices/export/excel")
 def export_advanced_invoices_excel(db: Session = Depends(get_db)):
+    import openpyxl
+    from openpyxl.styles import Font, PatternFill, Alignment
     try:
         # Create a BytesIO object for the zip file
         zip_buffer = io.BytesIO()
@@ -1025,6 +1616,8 @@ def export_advanced_invoices_excel(db: Session = Depends(get_db)):
 
 @router.get("/advanced-invoices/{invoice_id}/download")
 def download_advanced_invoice(invoice_id: int, db: Session = Depends(get_db)):
+    import openpyxl
+    from openpyxl.styles import Font, PatternFill, Alignment
     try:
         # Get invoice
         invoice = db.query(AdvancedColumnsInvoicedata).filter(
@@ -1169,48 +1762,18 @@ def download_advanced_invoice(invoice_id: int, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error downloading invoice: {str(e)}")
      
-@router.delete("/advanced-invoices/{invoice_id}")
+@router.delete("/advanced-invoices/{invoice_id}", dependencies=[Depends(hold_rebuilds)])
 def delete_advanced_invoice(invoice_id: int, db: Session = Depends(get_db)):
     try:
+        analytics.apply(db, removed=analytics.stored_advanced(db, invoice_id))
+        fingerprints.remove(db, "advanced", [invoice_id])
         items_deleted = db.query(AdvancedColumnsItems).filter(AdvancedColumnsItems.InvoiceID == invoice_id).delete()
         invoice_deleted = db.query(AdvancedColumnsInvoicedata).filter(AdvancedColumnsInvoicedata.InvoiceID == invoice_id).delete()
         db.commit()
+        search_index.unindex(db, "advanced", [invoice_id])
         if invoice_deleted == 0:
             raise HTTPException(status_code=404, detail="Invoice not found")
         return {"status": "success", "message": f"Advanced invoice {invoice_id} deleted"}
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail=f"Error deleting invoice: {str(e)}")
-
-
-import base64
-import webview
-
-class PyWebViewSaveAPI:
-    def save_file_dialog(self, base64_data: str, suggested_name: str):
-        """
-        Opens a save dialog and saves the provided base64 file content.
-        Intended for PyWebView desktop context.
-        """
-        try:
-            # Let the user choose a location
-            file_path = webview.windows[0].create_file_dialog(
-                webview.FileDialog.SAVE,
-                save_filename=suggested_name
-            )
-
-
-            if not file_path:
-                return {"status": "cancelled"}
-
-            # Decode base64 and save
-            file_bytes = base64.b64decode(base64_data.split(",")[1])
-            with open(file_path[0], "wb") as f:
-                f.write(file_bytes)
-
-            return {
-                "status": "success",
-                "path": file_path[0]
-            }
-        except Exception as e:
-            return {"status": "error", "message": str(e)}
@@ -0,0 +1,214 @@
+"""
+Extraction benchmark.
+
+Generates synthetic invoices (see benchmarks/synthetic_invoices.py) and measures latency,
+throughput and peak RSS of template detection, each plumber vendor parser,
+process_with_pdfplumber and process_with_ocr. Every case runs in a fresh worker process so
+peak RSS is attributable to that case alone. Results are written as JSON so runs on
+different commits can be diffed.
+
+    python -m benchmarks.bench_extraction --pages 1 5 20 --items 10 100 --repeat 5 --output bench.json
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# The extraction code never touches the DB, but importing the routes builds an engine
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+# Time real OCR on every iteration rather than OCR cache hits
+os.environ.setdefault("OCR_CACHE_MAX_BYTES", "0")
+
+from benchmarks import synthetic_invoices
+
+VENDOR_NAMES = {
+    "nucleus": "Nucleus Analytics Private Limited",
+    "satrun": "Satrun Technologies",
+}
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return round(psutil.Process().memory_info().peak_wset / 1048576, 1)
+        except Exception:
+            return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS, kilobytes elsewhere
+    return round(peak / (1048576 if sys.platform == "darwin" else 1024), 1)
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _build_call(case):
+    """Return a zero-argument callable running one iteration of the case."""
+    from api.v1 import routes
+    from core import pdf_reader, template_loader
+
+    path = case["path"]
+    target = case["target"]
+    if target == "detect_template":
+        text = pdf_reader.extract_text(path)
+
+        def call():
+            return template_loader.detect_template(text, template_loader.load_templates())
+        return call
+    if target == "process_with_pdfplumber":
+        return lambda: routes.process_with_pdfplumber(path, "plumber", case["advanced"])
+    if target == "process_with_ocr":
+        sidecar = path.rsplit('.', 1)[0] + '_textpdf.pdf'
+
+        def call():
+            # Drop the OCR output left by the previous iteration so every run pays for OCR
+            if os.path.exists(sidecar):
+                os.remove(sidecar)
+            return routes.process_with_ocr(path, "ocr", case["advanced"])
+        return call
+    if target == "vendor_parser":
+        text = pdf_reader.extract_text(path)
+        module = routes.load_vendor_parser(VENDOR_NAMES[case["vendor"]], "plumber", case["advanced"])
+        if module is None:
+            raise RuntimeError(f"No plumber parser for {case['vendor']} (advanced={case['advanced']})")
+        return lambda: module.process_invoice(text, path)
+    raise ValueError(f"Unknown benchmark target: {target}")
+
+
+def run_case(case):
+    """Worker entry point: warm up once, then time `repeat` iterations."""
+    result = {key: case[key] for key in ("name", "target", "vendor", "kind", "pages", "items", "advanced")}
+    sink = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(sink):
+            call = _build_call(case)
+            call()  # warm-up: imports, template YAML, OCR models
+            latencies = []
+            for _ in range(case["repeat"]):
+                start = time.perf_counter()
+                call()
+                latencies.append((time.perf_counter() - start) * 1000.0)
+        total_s = sum(latencies) / 1000.0
+        result.update({
+            "runs": len(latencies),
+            "latency_ms": {
+                "min": round(min(latencies), 2),
+                "p50": round(statistics.median(latencies), 2),
+                "p95": round(_percentile(latencies, 95), 2),
+                "mean": round(statistics.fmean(latencies), 2),
+                "max": round(max(latencies), 2),
+            },
+            "throughput_docs_per_s": round(len(latencies) / total_s, 3) if total_s else None,
+            "throughput_pages_per_s": round(len(latencies) * case["pages"] / total_s, 3) if total_s else None,
+            "error": None,
+        })
+    except Exception as e:
+        result.update({"runs": 0, "error": f"{type(e).__name__}: {e}", "traceback": traceback.format_exc(limit=3)})
+    result["peak_rss_mb"] = _peak_rss_mb()
+    return result
+
+
+def build_cases(work_dir, vendors, pages_list, items_list, kinds, repeat, seed):
+    cases = []
+    for vendor in vendors:
+        for pages in pages_list:
+            for items in items_list:
+                for kind in kinds:
+                    try:
+                        path = synthetic_invoices.generate(work_dir, vendor, pages, items, kind=kind, seed=seed)
+                    except ImportError as e:
+                        print(f"[WARN] Skipping {kind} {vendor} invoices: {e}", file=sys.stderr)
+                        continue
+                    common = {"vendor": vendor, "kind": kind, "pages": pages, "items": items,
+                              "path": path, "repeat": repeat}
+                    if kind == "text":
+                        targets = [("detect_template", False), ("vendor_parser", False), ("vendor_parser", True),
+                                   ("process_with_pdfplumber", False), ("process_with_pdfplumber", True)]
+                    else:
+                        targets = [("process_with_ocr", False)]
+                    for target, advanced in targets:
+                        name = f"{target}{'[advanced]' if advanced else ''}/{vendor}/{kind}/p{pages}/i{items}"
+                        cases.append({**common, "name": name, "target": target, "advanced": advanced})
+    return cases
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark invoice extraction on synthetic invoices.")
+    parser.add_argument("--vendors", nargs="+", default=list(synthetic_invoices.VENDORS),
+                        choices=synthetic_invoices.VENDORS)
+    parser.add_argument("--pages", nargs="+", type=int, default=[1, 5])
+    parser.add_argument("--items", nargs="+", type=int, default=[10, 50])
+    parser.add_argument("--kinds", nargs="+", default=["text", "raster", "image"],
+                        choices=["text", "raster", "image"])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this string")
+    parser.add_argument("--work-dir", default=None, help="Where to write the synthetic invoices (default: temp dir)")
+    parser.add_argument("--output", default="-", help="JSON results file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="prodoc_bench_")
+    cases = [c for c in build_cases(work_dir, args.vendors, args.pages, args.items, args.kinds,
+                                    args.repeat, args.seed) if args.filter in c["name"]]
+
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    for case in cases:
+        print(f"[INFO] {case['name']}", file=sys.stderr)
+        # A fresh single-use process per case keeps peak RSS and import costs isolated
+        with ctx.Pool(1, maxtasksperchild=1) as pool:
+            result = pool.apply(run_case, (case,))
+        if result["error"]:
+            print(f"[WARN]   {result['error']}", file=sys.stderr)
+        else:
+            print(f"[INFO]   p50={result['latency_ms']['p50']}ms rss={result['peak_rss_mb']}MB", file=sys.stderr)
+        results.append(result)
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {k: v for k, v in vars(args).items() if k != "output"},
+        "work_dir": work_dir,
+        "cases": results,
+    }
+    payload = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(payload)
+    else:
+        Path(args.output).write_text(payload)
+        print(f"[INFO] Wrote {len(results)} results to {args.output}", file=sys.stderr)
+    return 0 if all(not r["error"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,124 @@
+"""
+Import-time guard for API cold start.
+
+Runs `python -X importtime -c "import main"` in a fresh interpreter, reports the
+slowest imports, and fails when a heavy dependency that should only be imported on
+first use (OCR engines, Excel writers, the desktop webview, ...) is pulled in at
+import, or when the total import time exceeds --budget-ms.
+
+    python -m benchmarks.import_time --repeat 5 --budget-ms 1500 --output import_time.json
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Top-level packages that must not be imported just by importing the app
+DEFERRED_MODULES = (
+    "webview", "ocrmypdf", "openpyxl", "dateutil", "paddleocr", "paddle", "pandas",
+    "cv2", "numpy", "pdf2image", "pdfplumber", "pdfminer",
+)
+
+_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)\s*$")
+
+
+def parse_importtime(stderr):
+    """Return [(module, self_us, cumulative_us, depth)] from -X importtime output."""
+    entries = []
+    for line in stderr.splitlines():
+        m = _LINE.match(line)
+        if m:
+            depth = (len(m.group(3)) - 1) // 2
+            entries.append((m.group(4), int(m.group(1)), int(m.group(2)), depth))
+    return entries
+
+
+def run_once(module, env):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        # The traceback follows the importtime lines; keep only the tail
+        tail = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")]
+        raise RuntimeError("\n".join(tail[-5:]) or f"exit code {proc.returncode}")
+    return parse_importtime(proc.stderr)
+
+
+def build_environment(work_dir):
+    env = dict(os.environ)
+    # Importing main builds the engine and creates the storage folders; keep both local
+    env.setdefault("DATABASE_URL", "sqlite://")
+    env["APPDATA"] = work_dir
+    env["SQL_ECHO"] = "false"
+    return env
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure and guard the import time of the API.")
+    parser.add_argument("--module", default="main", help="Module to import (default: main)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs to take the fastest of")
+    parser.add_argument("--top", type=int, default=15, help="How many of the slowest imports to report")
+    parser.add_argument("--budget-ms", type=float, default=None, help="Fail if importing takes longer than this")
+    parser.add_argument("--allow", nargs="*", default=[], help="Deferred modules to tolerate for this run")
+    parser.add_argument("--output", default="-", help="JSON results file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    env = build_environment(tempfile.mkdtemp(prefix="prodoc_importtime_"))
+    runs = []
+    for _ in range(max(1, args.repeat)):
+        try:
+            runs.append(run_once(args.module, env))
+        except RuntimeError as e:
+            print(f"[ERROR] import {args.module} failed:\n{e}", file=sys.stderr)
+            return 2
+
+    # The run with the smallest total is the least disturbed by the OS
+    totals = [sum(cum for _, _, cum, depth in entries if depth == 0) for entries in runs]
+    best = runs[totals.index(min(totals))]
+    total_ms = min(totals) / 1000.0
+    module_ms = next((cum / 1000.0 for name, _, cum, depth in best if depth == 0 and name == args.module), None)
+
+    imported = {name.split(".")[0] for name, _, _, _ in best}
+    violations = sorted(m for m in DEFERRED_MODULES if m in imported and m not in args.allow)
+    slowest = sorted(best, key=lambda e: e[2], reverse=True)[:args.top]
+
+    report = {
+        "module": args.module,
+        "python": sys.version.split()[0],
+        "runs_ms": [round(t / 1000.0, 1) for t in totals],
+        "total_ms": round(total_ms, 1),
+        "module_ms": round(module_ms, 1) if module_ms is not None else None,
+        "budget_ms": args.budget_ms,
+        "modules_imported": len(best),
+        "deferred_modules_imported": violations,
+        "slowest": [
+            {"module": name, "cumulative_ms": round(cum / 1000.0, 1), "self_ms": round(own / 1000.0, 1)}
+            for name, own, cum, _ in slowest
+        ],
+    }
+    payload = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(payload)
+    else:
+        Path(args.output).write_text(payload)
+
+    print(f"[INFO] import {args.module}: {total_ms:.1f}ms over {len(best)} modules", file=sys.stderr)
+    status = 0
+    if violations:
+        print(f"[ERROR] Imported at startup but should be deferred: {', '.join(violations)}", file=sys.stderr)
+        status = 1
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f"[ERROR] Import time {total_ms:.1f}ms exceeds budget of {args.budget_ms:.0f}ms", file=sys.stderr)
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,343 @@
+"""
+Load test for the FastAPI app against a local SQLite stand-in.
+
+Boots `main:app` under uvicorn in a child process with DATABASE_URL pointing at a fresh
+SQLite file (and APPDATA at a scratch directory, so uploads never touch real data), seeds it
+with N invoices, corrections and advanced invoices, then drives a weighted mix of
+upload / extract / list / export requests from concurrent clients and reports
+p50/p95/p99 latency and error rate per endpoint. Exits with status 1 if the server
+answered any request with a 5xx, so a broken endpoint fails the run.
+
+    python -m benchmarks.loadtest --invoices 1000 --concurrency 16 --duration 60 --output loadtest.json
+"""
+import argparse
+import datetime
+import decimal
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+# Endpoint label -> relative weight; labels are the keys used in the report
+DEFAULT_MIX = {
+    "upload": 10,
+    "extract": 10,
+    "list_docs": 15,
+    "list_completed": 20,
+    "list_advanced": 20,
+    "list_invoices": 10,
+    "export_one": 10,
+    "export_all": 5,
+}
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100.0 * (len(ordered) - 1))))
+    return round(ordered[index], 2)
+
+
+# ------------------------------
+# Environment and seed data
+# ------------------------------
+def build_environment(work_dir):
+    db_path = Path(work_dir) / "loadtest.db"
+    env = dict(os.environ)
+    env.update({
+        # check_same_thread/timeout: FastAPI serves sync routes from a thread pool
+        "DATABASE_URL": f"sqlite:///{db_path.as_posix()}?check_same_thread=false&timeout=30",
+        "APPDATA": str(work_dir),
+        "SQL_ECHO": "false",
+    })
+    return env
+
+
+def seed_database(env, invoices, items_per_invoice, seed):
+    """Create the schema on the SQLite file and insert the seed rows; returns advanced invoice ids."""
+    os.environ.update(env)
+    from sqlalchemy import text
+    from core.database import engine, SessionLocal
+    from models import models, usermodel
+
+    with engine.connect() as conn:
+        conn.execute(text("PRAGMA journal_mode=WAL"))
+    models.Base.metadata.create_all(engine)
+    usermodel.Base.metadata.create_all(engine)
+
+    rng = random.Random(seed)
+    D = decimal.Decimal
+    db = SessionLocal()
+    try:
+        for n in range(invoices):
+            invoice_no = f"LT-{n:07d}"
+            total = D(rng.randint(1000, 500000)) / 100
+            db.add(models.Invoices(
+                InvoiceNo=invoice_no, FromAddress=f"Vendor {n % 50}\nIndustrial Area", ToAddress="Load Test Buyer",
+                GSTNo="29AAACA0000A1Z5", InvoiceDate="2025-03-12", Total=total, Taxes="18%", TotalQuantity=D(5),
+            ))
+            correction = models.CorrectedInvoices(
+                OriginalInvoiceNo=invoice_no, FromAddress=f"Vendor {n % 50}\nIndustrial Area",
+                ToAddress="Load Test Buyer", SupplierGST="29AAECNOIGIEIZR", CustomerGST="29AAACA0000A1Z5",
+                InvoiceDate="2025-03-12", Total=total, Subtotal=total, TaxAmount=D(0), Taxes="18%",
+                TotalQuantity=D(5), CorrectedBy="loadtest", Status="APPROVED", TemplateStyle={},
+            )
+            invoice = models.AdvancedColumnsInvoicedata(
+                BillDate=datetime.date(2025, 1 + n % 12, 1 + n % 28), BillNumber=f"ADV-{n:07d}",
+                VendorName=f"Vendor {n % 50}", CustomerName="Load Test Buyer", GSTIN="29AAACA0000A1Z5",
+                SubTotal=total, Total=total, Balance=total, Status="SAVED", TemplateStyle={},
+            )
+            for i in range(items_per_invoice):
+                qty, rate = D(rng.randint(1, 20)), D(rng.randint(100, 50000)) / 100
+                db.add(models.Items(InvoiceNo=invoice_no, Description=f"Item {i}", HSN="85234910",
+                                    Quantity=str(qty), PricePerUnit=str(rate), GST="18", Amount=qty * rate))
+                correction.Items.append(models.CorrectedItems(
+                    Description=f"Item {i}", Quantity=qty, Rate=rate, Tax=D(18), Amount=qty * rate, HSN="85234910"))
+                invoice.Items.append(models.AdvancedColumnsItems(
+                    ItemName=f"Item {i}", SKU=f"SKU{i}", HSN_SAC="8471", Quantity=qty, Rate=rate,
+                    TaxPercentage=D(18), TaxAmount=qty * rate * D("0.18"), ItemTotal=qty * rate * D("1.18")))
+            db.add(correction)
+            db.add(invoice)
+            if n % 500 == 499:
+                db.commit()
+        db.commit()
+        return [row[0] for row in db.query(models.AdvancedColumnsInvoicedata.InvoiceID).all()]
+    finally:
+        db.close()
+
+
+def seed_uploads(documents, seed):
+    """Write synthetic text-PDF invoices into the scratch uploads folder for extract traffic."""
+    from benchmarks import synthetic_invoices
+    from core.config import UPLOADS_DIR  # resolved from APPDATA set in seed_database
+
+    names = []
+    for n in range(documents):
+        vendor = synthetic_invoices.VENDORS[n % len(synthetic_invoices.VENDORS)]
+        path = synthetic_invoices.generate(str(UPLOADS_DIR), vendor, pages=1 + n % 3, items=5 + n % 20, seed=seed + n)
+        names.append(os.path.basename(path))
+    return names
+
+
+# ------------------------------
+# Server lifecycle
+# ------------------------------
+def start_server(env, port, workers, log_path):
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+           "--workers", str(workers), "--log-level", "warning"]
+    # Server output goes to a file: a pipe nobody drains would eventually block the server
+    log = open(log_path, "wb")
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    import requests
+    deadline = time.time() + 120
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            log.close()
+            raise RuntimeError(f"Server exited during startup, see {log_path}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/health-check", timeout=1).ok:
+                return proc
+        except requests.RequestException:
+            time.sleep(0.25)
+    proc.terminate()
+    raise RuntimeError("Server did not become healthy within 120s")
+
+
+# ------------------------------
+# Traffic
+# ------------------------------
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples = {}
+
+    def add(self, endpoint, latency_ms, ok, status):
+        with self._lock:
+            entry = self.samples.setdefault(endpoint, {"latencies": [], "errors": 0, "server_errors": 0,
+                                                       "statuses": {}})
+            entry["latencies"].append(latency_ms)
+            if not ok:
+                entry["errors"] += 1
+            if isinstance(status, int) and status >= 500:
+                entry["server_errors"] += 1
+            entry["statuses"][str(status)] = entry["statuses"].get(str(status), 0) + 1
+
+
+def make_request(session, base, endpoint, rng, ctx):
+    if endpoint == "upload":
+        name = rng.choice(ctx["documents"])
+        body = ctx["document_bytes"][name]
+        upload_name = f"lt_{rng.randint(0, 10 ** 9)}_{name}"
+        return session.post(f"{base}/api/v1/upload-doc", files={"file": (upload_name, body, "application/pdf")})
+    if endpoint == "extract":
+        data = {"filename": rng.choice(ctx["documents"]), "mode": "text",
+                "advanced": rng.choice(["true", "false"])}
+        return session.post(f"{base}/api/v1/upload-invoice", data=data)
+    if endpoint == "list_docs":
+        return session.get(f"{base}/api/v1/list-docs")
+    if endpoint == "list_completed":
+        return session.get(f"{base}/api/v1/invoices/completed", params={"page": rng.randint(1, ctx["pages"]), "per_page": 10})
+    if endpoint == "list_advanced":
+        return session.get(f"{base}/api/v1/advanced-invoices", params={"page": rng.randint(1, ctx["pages"]), "per_page": 10})
+    if endpoint == "list_invoices":
+        return session.get(f"{base}/api/v1/invoices")
+    if endpoint == "export_one":
+        return session.get(f"{base}/api/v1/advanced-invoices/{rng.choice(ctx['advanced_ids'])}/download")
+    if endpoint == "export_all":
+        return session.get(f"{base}/api/v1/advanced-invoices/export/excel")
+    raise ValueError(f"Unknown endpoint: {endpoint}")
+
+
+def worker(worker_id, base, mix, deadline, max_requests, counter, recorder, ctx, seed):
+    import requests
+    rng = random.Random(seed + worker_id)
+    endpoints, weights = zip(*mix.items())
+    session = requests.Session()
+    while time.time() < deadline:
+        with counter["lock"]:
+            if max_requests and counter["sent"] >= max_requests:
+                return
+            counter["sent"] += 1
+        endpoint = rng.choices(endpoints, weights)[0]
+        start = time.perf_counter()
+        try:
+            response = make_request(session, base, endpoint, rng, ctx)
+            ok, status = response.status_code < 400, response.status_code
+        except requests.RequestException as e:
+            ok, status = False, type(e).__name__
+        recorder.add(endpoint, (time.perf_counter() - start) * 1000.0, ok, status)
+
+
+def summarise(recorder, elapsed_s):
+    report = {}
+    for endpoint, entry in sorted(recorder.samples.items()):
+        latencies = entry["latencies"]
+        report[endpoint] = {
+            "requests": len(latencies),
+            "errors": entry["errors"],
+            "server_errors": entry["server_errors"],
+            "error_rate": round(entry["errors"] / len(latencies), 4) if latencies else 0.0,
+            "rps": round(len(latencies) / elapsed_s, 2) if elapsed_s else None,
+            "p50_ms": _percentile(latencies, 50),
+            "p95_ms": _percentile(latencies, 95),
+            "p99_ms": _percentile(latencies, 99),
+            "mean_ms": round(statistics.fmean(latencies), 2) if latencies else None,
+            "statuses": entry["statuses"],
+        }
+    return report
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        if name not in DEFAULT_MIX:
+            raise argparse.ArgumentTypeError(f"Unknown endpoint '{name}' (choose from {', '.join(DEFAULT_MIX)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test main:app against a seeded SQLite database.")
+    parser.add_argument("--invoices", type=int, default=500, help="Seed invoices (each with a correction and an advanced invoice)")
+    parser.add_argument("--items", type=int, default=8, help="Line items per seeded invoice")
+    parser.add_argument("--documents", type=int, default=20, help="Synthetic PDFs placed in the uploads folder")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to drive traffic")
+    parser.add_argument("--requests", type=int, default=0, help="Stop after this many requests (0 = duration only)")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--mix", type=parse_mix, default=dict(DEFAULT_MIX),
+                        help="Weighted endpoint mix, e.g. 'list_docs=5,extract=1'")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--work-dir", default=None, help="Scratch directory (default: new temp dir)")
+    parser.add_argument("--output", default="-", help="JSON report file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="prodoc_loadtest_")
+    Path(work_dir).mkdir(parents=True, exist_ok=True)
+    env = build_environment(work_dir)
+
+    print(f"[INFO] Seeding {args.invoices} invoices into {env['DATABASE_URL']}", file=sys.stderr)
+    t0 = time.time()
+    advanced_ids = seed_database(env, args.invoices, args.items, args.seed)
+    documents = seed_uploads(args.documents, args.seed)
+    from core.config import UPLOADS_DIR
+    ctx = {
+        "documents": documents,
+        "document_bytes": {name: (UPLOADS_DIR / name).read_bytes() for name in documents},
+        "advanced_ids": advanced_ids or [1],
+        "pages": max(1, args.invoices // 10),
+    }
+    print(f"[INFO] Seeded in {time.time() - t0:.1f}s", file=sys.stderr)
+
+    port = _free_port()
+    server = start_server(env, port, args.workers, Path(work_dir) / "server.log")
+    base = f"http://127.0.0.1:{port}"
+    recorder = Recorder()
+    counter = {"lock": threading.Lock(), "sent": 0}
+    try:
+        print(f"[INFO] Driving {args.concurrency} clients for {args.duration}s against {base}", file=sys.stderr)
+        started = time.time()
+        deadline = started + args.duration
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [pool.submit(worker, i, base, args.mix, deadline, args.requests, counter, recorder, ctx, args.seed)
+                       for i in range(args.concurrency)]
+            for future in futures:
+                future.result()
+        elapsed = time.time() - started
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+    endpoints = summarise(recorder, elapsed)
+    for name, row in endpoints.items():
+        print(f"[INFO] {name:15} n={row['requests']:6} err={row['error_rate']:.2%} "
+              f"p50={row['p50_ms']}ms p95={row['p95_ms']}ms p99={row['p99_ms']}ms", file=sys.stderr)
+
+    report = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "params": {k: v for k, v in vars(args).items() if k != "output"},
+        "work_dir": work_dir,
+        "elapsed_s": round(elapsed, 2),
+        "total_requests": sum(r["requests"] for r in endpoints.values()),
+        "server_errors": sum(r["server_errors"] for r in endpoints.values()),
+        "endpoints": endpoints,
+    }
+    payload = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(payload)
+    else:
+        Path(args.output).write_text(payload)
+        print(f"[INFO] Wrote report to {args.output}", file=sys.stderr)
+    if report["server_errors"]:
+        failing = ", ".join(name for name, row in endpoints.items() if row["server_errors"])
+        print(f"[WARN] {report['server_errors']} requests failed with a 5xx ({failing}), see "
+              f"{Path(work_dir) / 'server.log'}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""
+Login storm benchmark.
+
+Boots `main:app` like benchmarks/loadtest.py, then measures API latency (list endpoints)
+twice: alone, and while --logins concurrent clients sign in over and over. bcrypt runs on
+the dedicated password pool, so the API p99 during the storm should stay close to the
+baseline; the report gives both and their ratio, and the exit code is 1 when the ratio
+exceeds --max-p99-ratio. Sign-in outcomes (200 / 429 rate limited / 503 queue full) are
+reported too. The per-IP limit is lifted by default because every client is 127.0.0.1.
+
+    python -m benchmarks.login_storm --logins 100 --api-clients 8 --duration 20 --output login_storm.json
+"""
+import argparse
+import datetime
+import json
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks import loadtest
+
+API_MIX = {"list_docs": 1, "list_completed": 1, "list_advanced": 1}
+PASSWORD = "storm-password"
+
+
+def seed_users(count):
+    """Create `count` users sharing one bcrypt hash (hashing each would take minutes)."""
+    from api.v1.auth import get_password_hash
+    from core.database import SessionLocal
+    from models.usermodel import Users
+
+    hashed = get_password_hash(PASSWORD)
+    db = SessionLocal()
+    try:
+        names = [f"storm{n:04d}" for n in range(count)]
+        for name in names:
+            db.add(Users(Username=name, HashPassword=hashed, Role="user",
+                         EmailId=f"{name}@example.com", PhoneNumber="0000000000"))
+        db.commit()
+        return names
+    finally:
+        db.close()
+
+
+def login_worker(worker_id, base, users, deadline, recorder):
+    import requests
+    session = requests.Session()
+    n = worker_id
+    while time.time() < deadline:
+        username = users[n % len(users)]
+        n += 1
+        start = time.perf_counter()
+        try:
+            response = session.post(f"{base}/api/v1/auth/login", json={"username": username, "password": PASSWORD})
+            status = response.status_code
+        except requests.RequestException as e:
+            status = type(e).__name__
+        recorder.add("login", (time.perf_counter() - start) * 1000.0, status == 200, status)
+
+
+def drive(base, ctx, api_clients, logins, users, duration, seed):
+    recorder = loadtest.Recorder()
+    counter = {"lock": threading.Lock(), "sent": 0}
+    deadline = time.time() + duration
+    with ThreadPoolExecutor(max_workers=api_clients + logins) as pool:
+        futures = [pool.submit(loadtest.worker, i, base, API_MIX, deadline, 0, counter, recorder, ctx, seed)
+                   for i in range(api_clients)]
+        futures += [pool.submit(login_worker, i, base, users, deadline, recorder) for i in range(logins)]
+        for future in futures:
+            future.result()
+    return recorder
+
+
+def api_p99(recorder):
+    latencies = [ms for name, entry in recorder.samples.items() if name != "login" for ms in entry["latencies"]]
+    return loadtest._percentile(latencies, 99)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure API latency during a burst of concurrent logins.")
+    parser.add_argument("--logins", type=int, default=100, help="Concurrent clients signing in")
+    parser.add_argument("--users", type=int, default=100, help="Distinct accounts to sign in to")
+    parser.add_argument("--api-clients", type=int, default=8, help="Concurrent clients on the list endpoints")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per phase")
+    parser.add_argument("--invoices", type=int, default=200)
+    parser.add_argument("--keep-ip-limit", action="store_true", help="Keep the per-IP sign-in rate limit")
+    parser.add_argument("--max-p99-ratio", type=float, default=None, help="Fail if storm p99 / baseline p99 exceeds this")
+    parser.add_argument("--seed", type=int, default=11)
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument("--output", default="-", help="JSON report file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="prodoc_loginstorm_")
+    env = loadtest.build_environment(work_dir)
+    if not args.keep_ip_limit:
+        env["LOGIN_RATE_LIMIT_PER_IP"] = "0"
+    advanced_ids = loadtest.seed_database(env, args.invoices, 5, args.seed)
+    users = seed_users(args.users)
+    ctx = {"documents": [], "document_bytes": {}, "advanced_ids": advanced_ids or [1],
+           "pages": max(1, args.invoices // 10)}
+
+    port = loadtest._free_port()
+    server = loadtest.start_server(env, port, 1, Path(work_dir) / "server.log")
+    base = f"http://127.0.0.1:{port}"
+    try:
+        print(f"[INFO] Baseline: {args.api_clients} API clients for {args.duration}s", file=sys.stderr)
+        baseline = drive(base, ctx, args.api_clients, 0, users, args.duration, args.seed)
+        print(f"[INFO] Storm: + {args.logins} concurrent logins", file=sys.stderr)
+        storm = drive(base, ctx, args.api_clients, args.logins, users, args.duration, args.seed)
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+    baseline_p99, storm_p99 = api_p99(baseline), api_p99(storm)
+    ratio = round(storm_p99 / baseline_p99, 2) if baseline_p99 and storm_p99 else None
+    report = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "params": {k: v for k, v in vars(args).items() if k != "output"},
+        "work_dir": work_dir,
+        "api_p99_ms": {"baseline": baseline_p99, "storm": storm_p99, "ratio": ratio},
+        "baseline": loadtest.summarise(baseline, args.duration),
+        "storm": loadtest.summarise(storm, args.duration),
+    }
+    payload = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(payload)
+    else:
+        Path(args.output).write_text(payload)
+
+    logins = report["storm"].get("login", {})
+    print(f"[INFO] API p99 {baseline_p99}ms -> {storm_p99}ms (x{ratio}); logins n={logins.get('requests')} "
+          f"statuses={logins.get('statuses')}", file=sys.stderr)
+    if args.max_p99_ratio is not None and ratio is not None and ratio > args.max_p99_ratio:
+        print(f"[ERROR] API p99 grew x{ratio} during the storm (limit x{args.max_p99_ratio})", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,121 @@
+"""
+Search benchmark.
+
+Fills the SQLite FTS5 search index (core/search_index.py) in a scratch APPDATA with
+synthetic invoices (default 100,000 invoices x 10 items = 1M items), then times
+search_index queries by invoice number, GSTIN prefix, vendor, HSN and item words and reports
+p50/p95/p99 latency per query type. The index is filled directly, without the database, so
+only the search itself is measured.
+
+    python -m benchmarks.search_bench --invoices 100000 --items 10 --repeat 50 --output search.json
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+from benchmarks.loadtest import _percentile
+
+WORDS = ("copper cable wire steel bolt nut washer pipe valve flange motor pump sensor relay switch "
+         "panel breaker fuse bearing gasket hose clamp bracket coupling filter adapter socket").split()
+
+
+def synthetic_documents(invoices, items, seed):
+    rng = random.Random(seed)
+    for n in range(1, invoices + 1):
+        descriptions = [f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.randint(1, 200)}mm" for _ in range(items)]
+        yield {
+            "kind": "correction" if n % 2 else "advanced",
+            "ref_id": n,
+            "number": f"INV-{n:07d}",
+            "vendor": f"Vendor {n % 2000} Private Limited\nIndustrial Area",
+            "gstin": f"29AA{n % 100000:05d}Z1Z5",
+            "description": " ".join(descriptions),
+            "hsn": " ".join(str(85000000 + rng.randint(0, 9999)) for _ in range(items)),
+            "date": "2025-03-12",
+            "total": round(rng.uniform(100, 500000), 2),
+        }
+
+
+def queries(invoices, rng):
+    n = rng.randint(1, invoices)
+    return {
+        "invoice_number": f"INV-{n:07d}",
+        "gstin_prefix": f"29AA{n % 100000:05d}"[:9],
+        "vendor": f"vendor {n % 2000}",
+        "hsn": str(85000000 + rng.randint(0, 9999)),
+        "item_words": f"{rng.choice(WORDS)} {rng.choice(WORDS)}",
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time full-text invoice search on a synthetic FTS5 index.")
+    parser.add_argument("--invoices", type=int, default=100000)
+    parser.add_argument("--items", type=int, default=10, help="Items per invoice")
+    parser.add_argument("--repeat", type=int, default=50, help="Queries per query type")
+    parser.add_argument("--per-page", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--work-dir", default=None)
+    parser.add_argument("--output", default="-", help="JSON report file ('-' for stdout)")
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="prodoc_search_")
+    os.environ["APPDATA"] = work_dir
+    from core import search_index
+
+    started = time.perf_counter()
+    batch = []
+    for document in synthetic_documents(args.invoices, args.items, args.seed):
+        batch.append(document)
+        if len(batch) >= 5000:
+            search_index.upsert(batch)
+            batch = []
+    search_index.upsert(batch)
+    build_seconds = time.perf_counter() - started
+    print(f"[INFO] Indexed {args.invoices} invoices / {args.invoices * args.items} items in {build_seconds:.1f}s",
+          file=sys.stderr)
+
+    rng = random.Random(args.seed)
+    latencies, matches = {}, {}
+    for _ in range(args.repeat):
+        for name, query in queries(args.invoices, rng).items():
+            start = time.perf_counter()
+            total, _ = search_index._search_fts5(search_index._terms(query), None, 0, args.per_page)
+            latencies.setdefault(name, []).append((time.perf_counter() - start) * 1000.0)
+            matches.setdefault(name, []).append(total)
+
+    report = {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "params": {k: v for k, v in vars(args).items() if k != "output"},
+        "work_dir": work_dir,
+        "build_seconds": round(build_seconds, 1),
+        "index_bytes": os.path.getsize(search_index.SEARCH_INDEX_PATH),
+        "queries": {
+            name: {
+                "p50_ms": _percentile(values, 50),
+                "p95_ms": _percentile(values, 95),
+                "p99_ms": _percentile(values, 99),
+                "median_matches": sorted(matches[name])[len(matches[name]) // 2],
+            }
+            for name, values in latencies.items()
+        },
+    }
+    payload = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(payload)
+    else:
+        Path(args.output).write_text(payload)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
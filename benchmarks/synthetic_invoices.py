@@ -0,0 +1,230 @@
+# Synthetic Nucleus- and Satrun-style invoices for benchmarking
+#
+# Text PDFs are written directly (Courier, one text object per line) so the generator
+# has no dependencies; rasterised variants are rendered with Pillow, which the app
+# already requires for OCR.
+import os
+import random
+from pathlib import Path
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+FONT_SIZE = 8
+LEADING = 11
+MARGIN = 36
+LINES_PER_PAGE = (PAGE_HEIGHT - 2 * MARGIN) // LEADING
+
+VENDORS = ("nucleus", "satrun")
+
+_WORDS = [
+    "Processor", "Module", "Cable", "Adapter", "Sensor", "Controller", "Panel", "Switch",
+    "Bracket", "Assembly", "License", "Support", "Kit", "Drive", "Board", "Unit",
+]
+
+
+def _money(value):
+    return f"{value:,.2f}"
+
+
+def _description(rng):
+    return " ".join(rng.choice(_WORDS) for _ in range(3))
+
+
+# ------------------------------
+# Invoice bodies (lines of text laid out like the real vendor documents)
+# ------------------------------
+def nucleus_lines(items, seed=0):
+    rng = random.Random(seed)
+    lines = [
+        "Nucleus Analytics Private Limited",
+        "No. 12, 3rd Main Road, Bengaluru - 560 062. INDIA",
+        "Tel: 080-40000000   CIN: U72200KA2010PTC000000   GSTIN: 29AAECNOIGIEIZR",
+        "TAX INVOICE",
+        f"Invoice No: NAPL/{seed:05d}            Date: 12 March 2025",
+        "M/S. ABHARAN JEWELLERS PVT LTD",
+        "No. 4, Market Road, Udupi, Karnataka 576101",
+        "Customer GSTIN 29AAACA0000A1Z5",
+        "Payment terms: Against Invoice   Place of Supply state code: 29",
+        "SLNo. HSN CODE Material Description Unit | Qty. Unit Price Total",
+    ]
+    subtotal = 0.0
+    for n in range(1, items + 1):
+        qty = rng.randint(1, 20)
+        price = rng.randint(100, 50000) + rng.choice((0, 0.5))
+        total = qty * price
+        subtotal += total
+        hsn = f"{rng.randint(84710000, 85489999)}"
+        lines.append(f"{n} {hsn} {_description(rng)} Nos | {qty:.2f} {_money(price)} {_money(total)}")
+        lines.append(f"Serial batch {rng.randint(100, 999)}-{chr(65 + n % 26)}")
+    tax = subtotal * 0.18
+    lines += [
+        f"SubTotal {_money(subtotal)}",
+        f"IGST% [ 18%  {_money(tax)}",
+        f"Total {_money(subtotal + tax)}",
+        "Rupees Synthetic Amount Only",
+        "Declaration: We declare that this invoice shows the actual price of the goods described.",
+        "For Nucleus Analytics Private Limited",
+    ]
+    return lines
+
+
+def satrun_lines(items, seed=0):
+    rng = random.Random(seed)
+    lines = [
+        "SATRUN TECHNOLOGIES",
+        "Mobile:9800000000/9811111111  Email: satruntechnologies@hotmail.com",
+        "GSTIN: 33ABCPS0000A1Z2",
+        f"Invoice No: SAT-{seed:05d}   Invoice date: 01/04/2025",
+        "Transport Mode: Road",
+        "State: Tamil Nadu Code 33",
+        "Bill to Party",
+        "ABHARAN JEWELLERS PVT LTD",
+        "IGST NO : 29AAACA0000A1Z5",
+        "State Name: Karnataka, Code 29",
+        "S. No. Product Description HSN Qty Rate Amount Taxable Value Tax Rate Tax Amount Total",
+    ]
+    before_tax = 0.0
+    tax_total = 0.0
+    for n in range(1, items + 1):
+        qty = rng.randint(1, 20)
+        rate = rng.randint(100, 50000) + rng.choice((0, 0.5))
+        amount = qty * rate
+        tax = amount * 0.18
+        before_tax += amount
+        tax_total += tax
+        hsn = f"{rng.randint(8471, 8548)}"
+        lines.append(
+            f"{n} {_description(rng)} {hsn} {qty} {_money(rate)} {_money(amount)} "
+            f"{_money(amount)} 18% {_money(tax)} {_money(amount + tax)}"
+        )
+    lines += [
+        f"Total Amount before Tax {_money(before_tax)}",
+        f"IGST 18% {_money(tax_total)}",
+        f"Total Tax Amount {_money(tax_total)}",
+        f"Total Amount after Tax {_money(before_tax + tax_total)}",
+        "INR SYNTHETIC AMOUNT ONLY",
+    ]
+    return lines
+
+
+def invoice_lines(vendor, items, seed=0):
+    if vendor == "nucleus":
+        return nucleus_lines(items, seed)
+    if vendor == "satrun":
+        return satrun_lines(items, seed)
+    raise ValueError(f"Unknown synthetic vendor: {vendor}")
+
+
+def paginate(lines, pages):
+    """Spread lines over at least `pages` pages, never exceeding what fits on a page."""
+    pages = max(1, pages)
+    per_page = max(1, min(LINES_PER_PAGE, -(-len(lines) // pages)))
+    chunks = [lines[i:i + per_page] for i in range(0, len(lines), per_page)]
+    while len(chunks) < pages:
+        chunks.append(["(continued)"])
+    return chunks
+
+
+# ------------------------------
+# Writers
+# ------------------------------
+def _pdf_escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_text_pdf(path, page_lines):
+    """Write a minimal text-layer PDF: one Courier text line per entry."""
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    catalog_id = add(None)
+    pages_id = add(None)
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>")
+
+    page_ids = []
+    for lines in page_lines:
+        ops = [f"BT /F1 {FONT_SIZE} Tf {LEADING} TL {MARGIN} {PAGE_HEIGHT - MARGIN} Td"]
+        for line in lines:
+            ops.append(f"({_pdf_escape(line)}) Tj T*")
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1", "replace")
+        content_id = add(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        page_ids.append(add(
+            f"<< /Type /Page /Parent {pages_id} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {content_id} 0 R >>".encode()
+        ))
+
+    kids = " ".join(f"{pid} 0 R" for pid in page_ids)
+    objects[catalog_id - 1] = f"<< /Type /Catalog /Pages {pages_id} 0 R >>".encode()
+    objects[pages_id - 1] = f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, catalog_id, xref_at)
+
+    Path(path).write_bytes(bytes(out))
+    return path
+
+
+def render_page_images(page_lines, dpi=200):
+    """Render each page of text to a grayscale PIL image, as a scanner would produce."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    scale = dpi / 72.0
+    size = (int(PAGE_WIDTH * scale), int(PAGE_HEIGHT * scale))
+    try:
+        font = ImageFont.truetype("DejaVuSansMono.ttf", int(FONT_SIZE * scale))
+    except OSError:
+        font = ImageFont.load_default()
+
+    images = []
+    for lines in page_lines:
+        image = Image.new("L", size, 255)
+        draw = ImageDraw.Draw(image)
+        y = MARGIN * scale
+        for line in lines:
+            draw.text((MARGIN * scale, y), line, fill=0, font=font)
+            y += LEADING * scale
+        images.append(image)
+    return images
+
+
+def write_raster_pdf(path, page_lines, dpi=200):
+    images = render_page_images(page_lines, dpi)
+    images[0].save(path, "PDF", save_all=True, append_images=images[1:], resolution=dpi)
+    return path
+
+
+def write_raster_png(path, page_lines, dpi=200):
+    """Single-image variant (first page) for the image branch of process_with_ocr."""
+    render_page_images(page_lines[:1], dpi)[0].save(path, "PNG", dpi=(dpi, dpi))
+    return path
+
+
+# ------------------------------
+# Corpus generation
+# ------------------------------
+def generate(out_dir, vendor, pages, items, kind="text", seed=0, dpi=200):
+    """
+    Write one synthetic invoice and return its path.
+    kind: "text" (text-layer PDF), "raster" (image-only PDF) or "image" (PNG of page 1).
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    page_lines = paginate(invoice_lines(vendor, items, seed), pages)
+    stem = f"{vendor}_{kind}_p{pages}_i{items}_s{seed}"
+    if kind == "text":
+        return write_text_pdf(os.path.join(out_dir, stem + ".pdf"), page_lines)
+    if kind == "raster":
+        return write_raster_pdf(os.path.join(out_dir, stem + ".pdf"), page_lines, dpi)
+    if kind == "image":
+        return write_raster_png(os.path.join(out_dir, stem + ".png"), page_lines, dpi)
+    raise ValueError(f"Unknown synthetic invoice kind: {kind}")
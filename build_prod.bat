@@ -22,6 +22,11 @@ echo   Installing dependencies fresh
 echo ==============================
 pip install -r requirements.txt --no-cache-dir
 
+echo ==============================
+echo   Building hashed, precompressed static assets
+echo ==============================
+python -m core.static_assets
+
 echo ==============================
 echo   Building ProDoc executable
 echo ==============================
@@ -0,0 +1,281 @@
+# Analytics rollups: totals by month, vendor, HSN and GST rate
+#
+# analytics_invoice_rollup keeps invoice count, total and tax per (source, month, vendor);
+# analytics_item_rollup keeps item count, quantity, amount and tax per (source, month,
+# vendor, HSN, GST rate). The save and delete routes add or subtract an invoice's
+# contribution in the same transaction as the change itself, so /analytics sums a few
+# rollup rows instead of scanning the item tables. The tables are created and filled from
+# the existing invoices on first start; `python -m core.analytics --rebuild` recomputes
+# them after any change made to the invoice tables by hand (with the app stopped, or use
+# POST /analytics/rebuild: saves wait for a rebuild in the app, see core/rebuild_gate.py).
+import argparse
+import threading
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import func, inspect
+from sqlalchemy.exc import IntegrityError
+
+from core import rebuild_gate
+from models.models import (
+    Base, AnalyticsInvoiceRollup, AnalyticsItemRollup,
+    CorrectedInvoices, CorrectedItems, AdvancedColumnsInvoicedata, AdvancedColumnsItems,
+)
+
+# API dimension -> rollup column; invoice-level sums exist only for source, month and vendor
+DIMENSIONS = {"source": "Source", "month": "Month", "vendor": "Vendor", "hsn": "HSN", "tax_rate": "TaxRate"}
+INVOICE_DIMENSIONS = {"source", "month", "vendor"}
+INVOICE_MEASURES = {"InvoiceCount": "invoice_count", "Total": "total", "TaxAmount": "tax_amount"}
+ITEM_MEASURES = {"ItemCount": "item_count", "Quantity": "quantity", "Amount": "amount", "TaxAmount": "tax_amount"}
+BATCH = 1000  # invoices read per rebuild step
+
+CENT = Decimal("0.01")
+
+
+def _dec(value):
+    try:
+        return Decimal(str(value)) if value is not None else Decimal(0)
+    except InvalidOperation:
+        return Decimal(0)
+
+
+def _month(value):
+    text = str(value or "")[:7]
+    if len(text) == 7 and text[4] == "-" and text[:4].isdigit() and text[5:].isdigit():
+        return text
+    return "unknown"
+
+
+def _vendor(value):
+    return ((value or "").split("\n")[0].strip() or "Unknown Vendor")[:200]
+
+
+def _add(delta, model, key, **measures):
+    target = delta[(model, key)]
+    for name, value in measures.items():
+        target[name] += value
+
+
+def _new_delta():
+    return defaultdict(lambda: defaultdict(int))
+
+
+# ------------------------------
+# Contributions of one invoice
+# ------------------------------
+def correction_contribution(invoice, items, delta=None):
+    """Rollup amounts a correction adds: {(model, key): {measure: value}}."""
+    delta = _new_delta() if delta is None else delta
+    month, vendor = _month(invoice.InvoiceDate), _vendor(invoice.FromAddress)
+    tax_total = Decimal(0)
+    for item in items:
+        rate, amount = _dec(item.Tax).quantize(CENT), _dec(item.Amount)
+        # As in /invoices/completed: the item tax is its amount at its GST rate
+        tax = (amount * rate / 100).quantize(CENT)
+        tax_total += tax
+        _add(delta, AnalyticsItemRollup, ("correction", month, vendor, (item.HSN or "").strip()[:50], rate),
+             ItemCount=1, Quantity=_dec(item.Quantity), Amount=amount, TaxAmount=tax)
+    _add(delta, AnalyticsInvoiceRollup, ("correction", month, vendor),
+         InvoiceCount=1, Total=_dec(invoice.Total), TaxAmount=tax_total)
+    return delta
+
+
+def advanced_contribution(invoice, items, delta=None):
+    delta = _new_delta() if delta is None else delta
+    month, vendor = _month(invoice.BillDate), _vendor(invoice.VendorName)
+    tax_total = Decimal(0)
+    for item in items:
+        rate, tax = _dec(item.TaxPercentage).quantize(CENT), _dec(item.TaxAmount)
+        tax_total += tax
+        _add(delta, AnalyticsItemRollup, ("advanced", month, vendor, (item.HSN_SAC or "").strip()[:50], rate),
+             ItemCount=1, Quantity=_dec(item.Quantity), Amount=_dec(item.ItemTotal), TaxAmount=tax)
+    _add(delta, AnalyticsInvoiceRollup, ("advanced", month, vendor),
+         InvoiceCount=1, Total=_dec(invoice.Total), TaxAmount=tax_total)
+    return delta
+
+
+def stored_correction(db, correction_id, delta=None):
+    """Contribution of a correction as currently stored (call before changing or deleting it)."""
+    invoice = db.query(CorrectedInvoices).filter(CorrectedInvoices.CorrectionID == correction_id).first()
+    if invoice is None:
+        return _new_delta() if delta is None else delta
+    items = db.query(CorrectedItems).filter(CorrectedItems.CorrectionID == correction_id).all()
+    return correction_contribution(invoice, items, delta)
+
+
+def stored_advanced(db, invoice_id, delta=None):
+    invoice = db.query(AdvancedColumnsInvoicedata).filter(AdvancedColumnsInvoicedata.InvoiceID == invoice_id).first()
+    if invoice is None:
+        return _new_delta() if delta is None else delta
+    items = db.query(AdvancedColumnsItems).filter(AdvancedColumnsItems.InvoiceID == invoice_id).all()
+    return advanced_contribution(invoice, items, delta)
+
+
+# ------------------------------
+# Applying changes
+# ------------------------------
+def _upsert(db, model, key, measures):
+    filters = [getattr(model, column) == value for column, value in zip(model.KEY, key)]
+    increments = {getattr(model, name): getattr(model, name) + value for name, value in measures.items()}
+    if db.query(model).filter(*filters).update(increments, synchronize_session=False):
+        return
+    try:
+        with db.begin_nested():
+            db.add(model(**dict(zip(model.KEY, key)), **measures))
+    except IntegrityError:
+        # Another save created the row meanwhile: add to it instead
+        db.query(model).filter(*filters).update(increments, synchronize_session=False)
+
+
+def apply(db, added=None, removed=None):
+    """
+    Add `added` and subtract `removed` (contributions) in the caller's transaction, touching
+    each rollup row once. Commit together with the invoice change.
+    """
+    changes = _new_delta()
+    for sign, delta in ((1, added), (-1, removed)):
+        for target, measures in (delta or {}).items():
+            for name, value in measures.items():
+                changes[target][name] += sign * value
+    for (model, key), measures in changes.items():
+        measures = {name: value for name, value in measures.items() if value}
+        if measures:
+            _upsert(db, model, key, measures)
+
+
+def ensure_tables(engine):
+    """Create the rollup tables if they do not exist yet; True if they were created now."""
+    tables = [AnalyticsInvoiceRollup.__table__, AnalyticsItemRollup.__table__]
+    try:
+        missing = [t for t in tables if not inspect(engine).has_table(t.name)]
+        Base.metadata.create_all(engine, tables=missing)
+    except Exception as e:
+        print(f"[WARN] Could not create the analytics rollup tables: {e}")
+        return False
+    return bool(missing)
+
+
+def _rebuild_in_background(session_factory):
+    db = session_factory()
+    try:
+        rebuild(db)
+    except Exception as e:
+        db.rollback()
+        print(f"[WARN] Analytics rollup build failed: {e}")
+    finally:
+        db.close()
+
+
+def start(engine, session_factory):
+    """Create the rollup tables on first start and fill them from existing invoices in a daemon thread."""
+    if ensure_tables(engine):
+        threading.Thread(target=_rebuild_in_background, args=(session_factory,),
+                         name="analytics-rebuild", daemon=True).start()
+
+
+def _batches(db, column):
+    last = None
+    while True:
+        query = db.query(column)
+        if last is not None:
+            query = query.filter(column > last)
+        ids = [row[0] for row in query.order_by(column).limit(BATCH).all()]
+        if not ids:
+            return
+        yield ids[0], ids[-1]
+        last = ids[-1]
+
+
+def rebuild(db):
+    """
+    Recompute both rollup tables from the invoice tables, in one transaction. Saves wait
+    meanwhile (core/rebuild_gate.py), so none is lost between the reads and the rewrite.
+    """
+    with rebuild_gate.rebuilding():
+        return _rebuild(db)
+
+
+def _rebuild(db):
+    delta = _new_delta()
+    sources = (
+        (CorrectedInvoices, CorrectedInvoices.CorrectionID, CorrectedItems, CorrectedItems.CorrectionID,
+         correction_contribution),
+        (AdvancedColumnsInvoicedata, AdvancedColumnsInvoicedata.InvoiceID, AdvancedColumnsItems,
+         AdvancedColumnsItems.InvoiceID, advanced_contribution),
+    )
+    for header, header_id, item, item_parent, contribution in sources:
+        for first, last in _batches(db, header_id):
+            items = defaultdict(list)
+            for row in db.query(item).filter(item_parent.between(first, last)):
+                items[getattr(row, item_parent.key)].append(row)
+            for invoice in db.query(header).filter(header_id.between(first, last)):
+                contribution(invoice, items.get(getattr(invoice, header_id.key), ()), delta)
+            db.expunge_all()
+
+    db.query(AnalyticsItemRollup).delete(synchronize_session=False)
+    db.query(AnalyticsInvoiceRollup).delete(synchronize_session=False)
+    for (model, key), measures in delta.items():
+        db.add(model(**dict(zip(model.KEY, key)), **measures))
+    db.commit()
+    counts = {model.__tablename__: sum(1 for m, _ in delta if m is model)
+              for model in (AnalyticsInvoiceRollup, AnalyticsItemRollup)}
+    print(f"[INFO] Analytics rollups rebuilt: {counts}")
+    return counts
+
+
+# ------------------------------
+# Queries
+# ------------------------------
+def summary(db, group_by, month_from=None, month_to=None, vendor=None, source=None, limit=1000):
+    """
+    Sums grouped by any of DIMENSIONS (e.g. ["month", "vendor", "tax_rate"]). Grouping by
+    source / month / vendor only reads invoice totals; hsn or tax_rate reads item totals.
+    """
+    invoice_level = set(group_by) <= INVOICE_DIMENSIONS
+    model = AnalyticsInvoiceRollup if invoice_level else AnalyticsItemRollup
+    measures = INVOICE_MEASURES if invoice_level else ITEM_MEASURES
+    count_column = model.InvoiceCount if invoice_level else model.ItemCount
+
+    columns = [getattr(model, DIMENSIONS[name]) for name in group_by]
+    query = db.query(*columns, *(func.sum(getattr(model, column)).label(column) for column in measures))
+    if month_from:
+        query = query.filter(model.Month >= month_from)
+    if month_to:
+        query = query.filter(model.Month <= month_to)
+    if vendor:
+        query = query.filter(model.Vendor == vendor)
+    if source:
+        query = query.filter(model.Source == source)
+    # Rows whose invoices were all deleted stay behind with zero counts
+    query = query.group_by(*columns).having(func.sum(count_column) > 0).order_by(*columns).limit(limit)
+
+    rows = []
+    for row in query.all():
+        values = row._mapping
+        entry = {name: values[DIMENSIONS[name]] for name in group_by}
+        if "tax_rate" in entry:
+            entry["tax_rate"] = float(entry["tax_rate"])
+        for column, name in measures.items():
+            value = values[column] or 0
+            entry[name] = int(value) if column.endswith("Count") else float(value)
+        rows.append(entry)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the analytics rollup tables.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the rollups from the invoice tables")
+    args = parser.parse_args(argv)
+    from core.database import engine, SessionLocal
+    ensure_tables(engine)
+    if args.rebuild:
+        db = SessionLocal()
+        try:
+            rebuild(db)
+        finally:
+            db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
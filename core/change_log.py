@@ -0,0 +1,342 @@
+# Invoice change log
+#
+# Changes to Invoices and Items are appended to change_log as one row per changed invoice or
+# item, holding only the fields that changed as JSON {field: [old, new]} (an insert has only
+# new values, a delete only old ones). This replaces the full-row copies in Invoices_History
+# and Items_History, which are kept for the rows already in them but no longer written.
+# The entries of one save are collected in a ChangeBatch and written with a single multi-row
+# INSERT in the caller's transaction. Every row carries its month in Period, the leading
+# column of the listing index: time-bounded queries only read their months, and
+# `python -m core.change_log --prune-before 2024-01` drops whole months at once.
+# Past versions are rebuilt on demand by undoing newer changes from the current rows.
+# The rows already in the two history tables are copied into it once, in a background thread
+# started at startup (see backfill), so history from before the change log stays available.
+import argparse
+import datetime
+import decimal
+import heapq
+import json
+import threading
+
+from sqlalchemy import func, insert, inspect, select
+
+from core.config import STREAM_BATCH_SIZE
+from models.models import Base, ChangeLog, ChangeLogBackfill, Invoices, Items, InvoicesHistory, ItemsHistory
+
+INVOICE_FIELDS = ("FromAddress", "ToAddress", "GSTNo", "InvoiceDate", "Total", "Taxes", "TotalQuantity")
+ITEM_FIELDS = ("Description", "HSN", "Quantity", "PricePerUnit", "GST", "IGST", "SGST", "Amount")
+BATCH = 1000  # legacy history rows read per backfill step
+LEGACY_EPOCH = datetime.datetime(2000, 1, 1)  # ChangedAt of legacy rows that have none
+
+
+def _plain(value):
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
+
+
+def snapshot(row, fields):
+    """{field: JSON-ready value} of an Invoices / Items row (None for no row)."""
+    return {field: _plain(getattr(row, field)) for field in fields} if row is not None else None
+
+
+def _same(old, new):
+    if old == new:
+        return True
+    # A DECIMAL column reads back as "100.50" after 100.5 or "100.5" was assigned to it
+    try:
+        return decimal.Decimal(str(old)) == decimal.Decimal(str(new))
+    except (decimal.InvalidOperation, ValueError):
+        return False
+
+
+def diff(before, after):
+    """{field: [old, new]} of the fields that differ; either side may be None (insert / delete)."""
+    before, after = before or {}, after or {}
+    changes = {}
+    for field in dict.fromkeys(list(before) + list(after)):
+        old, new = before.get(field), after.get(field)
+        if not _same(old, new):
+            changes[field] = [old, new]
+    return changes
+
+
+class ChangeBatch:
+    """Change log entries of one transaction, written together by flush(db)."""
+
+    def __init__(self):
+        self.rows = []
+
+    def add(self, invoice_no, before, after, item_id=None, changed_at=None, change_id=None):
+        changes = diff(before, after)
+        if not changes:
+            return
+        action = "insert" if before is None else "delete" if after is None else "update"
+        now = changed_at or datetime.datetime.now()
+        row = {
+            "Period": now.strftime("%Y-%m"),
+            "ChangedAt": now,
+            "InvoiceNo": invoice_no,
+            "ItemID": item_id,
+            "Action": action,
+            "Changes": json.dumps(changes, ensure_ascii=False, separators=(",", ":")),
+        }
+        # Only the backfill numbers its entries itself; a batch uses either form, not both
+        if change_id is not None:
+            row["ChangeID"] = change_id
+        self.rows.append(row)
+
+    def flush(self, db):
+        """One multi-row INSERT in the caller's transaction; commit together with the change."""
+        if self.rows:
+            db.execute(insert(ChangeLog), self.rows)
+            self.rows = []
+
+
+# ------------------------------
+# Queries
+# ------------------------------
+def _as_dict(entry):
+    return {
+        "change_id": entry.ChangeID,
+        "changed_at": entry.ChangedAt.isoformat() if entry.ChangedAt else None,
+        "invoice_number": entry.InvoiceNo,
+        "entity": "item" if entry.ItemID is not None else "invoice",
+        "item_id": entry.ItemID,
+        "action": entry.Action,
+        "changes": json.loads(entry.Changes),
+    }
+
+
+def _filtered(db, invoice_no=None, entity=None, field=None, action=None, since=None, until=None):
+    query = db.query(ChangeLog)
+    if invoice_no:
+        query = query.filter(ChangeLog.InvoiceNo == invoice_no)
+    if entity == "invoice":
+        query = query.filter(ChangeLog.ItemID.is_(None))
+    elif entity == "item":
+        query = query.filter(ChangeLog.ItemID.isnot(None))
+    if action:
+        query = query.filter(ChangeLog.Action == action)
+    if field:
+        # Keys are written by json.dumps without spaces ('"Total":'); quotes inside values are escaped
+        query = query.filter(ChangeLog.Changes.contains(json.dumps(field) + ":", autoescape=True))
+    # Bound Period as well so only the partitions in range are read
+    if since:
+        query = query.filter(ChangeLog.Period >= since.strftime("%Y-%m"), ChangeLog.ChangedAt >= since)
+    if until:
+        query = query.filter(ChangeLog.Period <= until.strftime("%Y-%m"), ChangeLog.ChangedAt < until)
+    return query
+
+
+def history(db, page=1, per_page=50, **filters):
+    """(total, entries) newest first; filters: invoice_no, entity, field, action, since, until."""
+    query = _filtered(db, **filters)
+    total = query.count()
+    entries = query.order_by(ChangeLog.ChangeID.desc()).offset((page - 1) * per_page).limit(per_page).all()
+    return total, [_as_dict(entry) for entry in entries]
+
+
+def entries(db, before=None, limit=None, **filters):
+    """
+    Entries newest first with a ChangeID below `before` (keyset paging, no count), read from
+    the DB cursor in batches; same filters as history().
+    """
+    query = _filtered(db, **filters)
+    if before is not None:
+        query = query.filter(ChangeLog.ChangeID < before)
+    query = query.order_by(ChangeLog.ChangeID.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    for entry in query.yield_per(STREAM_BATCH_SIZE):
+        yield _as_dict(entry)
+
+
+def version(db, invoice_no, change_id):
+    """
+    The invoice and its items as they were right after change `change_id`, rebuilt by
+    undoing every later change from the current rows. None if it did not exist then.
+    """
+    invoice = snapshot(db.query(Invoices).filter(Invoices.InvoiceNo == invoice_no).first(), INVOICE_FIELDS)
+    items = {item.ItemID: snapshot(item, ITEM_FIELDS)
+             for item in db.query(Items).filter(Items.InvoiceNo == invoice_no)}
+    later = db.query(ChangeLog).filter(ChangeLog.InvoiceNo == invoice_no, ChangeLog.ChangeID > change_id)\
+        .order_by(ChangeLog.ChangeID.desc())
+    for entry in later:
+        changes = json.loads(entry.Changes)
+        current = invoice if entry.ItemID is None else items.get(entry.ItemID)
+        if entry.Action == "insert":
+            current = None
+        else:
+            # Undoing a delete starts from an empty row: the entry only lists non-empty fields
+            current = dict(current) if current is not None else \
+                dict.fromkeys(INVOICE_FIELDS if entry.ItemID is None else ITEM_FIELDS)
+            current.update({field: old for field, (old, new) in changes.items()})
+        if entry.ItemID is None:
+            invoice = current
+        elif current is None:
+            items.pop(entry.ItemID, None)
+        else:
+            items[entry.ItemID] = current
+    if invoice is None:
+        return None
+    return {
+        "invoice_number": invoice_no,
+        "change_id": change_id,
+        "invoice": invoice,
+        "items": [{"item_id": item_id, **values} for item_id, values in sorted(items.items())],
+    }
+
+
+# ------------------------------
+# Maintenance
+# ------------------------------
+def ensure_tables(engine):
+    """Create change_log and its backfill marker if they do not exist yet; False if that failed."""
+    try:
+        Base.metadata.create_all(engine, tables=[ChangeLog.__table__, ChangeLogBackfill.__table__])
+    except Exception as e:
+        print(f"[WARN] Could not create the change log table: {e}")
+        return False
+    return True
+
+
+def _pages(db, rows):
+    """
+    The rows of `rows` (a select with a row_number() "Seq") in Seq order, BATCH at a time.
+    Each page is fetched in full before it is handed out, so the caller can run its own
+    queries and inserts in between on the same connection (pymssql has no MARS).
+    """
+    rows = rows.subquery()
+    last = 0
+    while True:
+        page = db.execute(select(rows).where(rows.c.Seq > last).order_by(rows.c.Seq).limit(BATCH)).all()
+        if page:
+            yield page
+        if len(page) < BATCH:
+            return
+        last = page[-1].Seq
+
+
+def _legacy_invoice_entries(db):
+    """
+    Entries for the Invoices_History rows, oldest first. A row is the invoice before an
+    update: it is diffed against the next copy of that invoice, or else the current invoice
+    (a 'delete' if the invoice is gone), looked up for a whole page in one query.
+    """
+    h = InvoicesHistory
+    order = (h.ChangedAt, h.HistoryID)
+    window = dict(partition_by=h.InvoiceNo, order_by=order)
+    copies = select(
+        h.HistoryID, h.InvoiceNo, h.ChangedAt, *(getattr(h, field) for field in INVOICE_FIELDS),
+        func.lead(h.HistoryID).over(**window).label("NextID"),
+        *(func.lead(getattr(h, field), type_=getattr(h, field).type).over(**window).label("Next" + field)
+          for field in INVOICE_FIELDS),
+        func.row_number().over(order_by=order).label("Seq"))
+    for page in _pages(db, copies):
+        gone = {row.InvoiceNo for row in page if row.NextID is None}
+        current = {invoice.InvoiceNo: invoice
+                   for invoice in db.query(Invoices).filter(Invoices.InvoiceNo.in_(gone))} if gone else {}
+        for row in page:
+            if row.NextID is not None:
+                after = {field: _plain(getattr(row, "Next" + field)) for field in INVOICE_FIELDS}
+            else:
+                after = snapshot(current.get(row.InvoiceNo), INVOICE_FIELDS)
+            yield row.ChangedAt or LEGACY_EPOCH, row.InvoiceNo, snapshot(row, INVOICE_FIELDS), after, None
+
+
+def _legacy_item_entries(db):
+    """
+    Entries for the Items_History rows, oldest first. A row is an item that a save deleted
+    and re-inserted; its ItemID was not recorded, so it is logged as a delete of item
+    -<history id>.
+    """
+    h = ItemsHistory
+    copies = select(h.ItemID, h.InvoiceNo, h.ChangedAt, *(getattr(h, field) for field in ITEM_FIELDS),
+                    func.row_number().over(order_by=(h.ChangedAt, h.ItemID)).label("Seq"))
+    for page in _pages(db, copies):
+        for row in page:
+            yield row.ChangedAt or LEGACY_EPOCH, row.InvoiceNo, snapshot(row, ITEM_FIELDS), None, -row.ItemID
+
+
+def _legacy_entries(db):
+    """Both tables merged oldest first; each is read in ChangedAt order (NULLs first, as LEGACY_EPOCH)."""
+    return heapq.merge(_legacy_invoice_entries(db), _legacy_item_entries(db), key=lambda entry: entry[0])
+
+
+def backfill(engine, db):
+    """
+    Copy the legacy history tables into change_log unless change_log_backfill records that
+    it was done; returns the number of entries. With N legacy rows, the copies are numbered
+    from -N upwards in ChangedAt order, so they precede every change the app logs, even one
+    logged while the copy runs. Batches are committed as they go: the entries of an
+    interrupted copy are deleted and copied again at the next start.
+    """
+    if db.query(ChangeLogBackfill.BackfillID).first() is not None:
+        return 0
+    tables = inspect(engine)
+    count = 0
+    if tables.has_table(InvoicesHistory.__tablename__) and tables.has_table(ItemsHistory.__tablename__):
+        db.query(ChangeLog).filter(ChangeLog.ChangeID < 0).delete(synchronize_session=False)
+        first = -(db.query(func.count(InvoicesHistory.HistoryID)).scalar()
+                  + db.query(func.count(ItemsHistory.ItemID)).scalar())
+        changes = ChangeBatch()
+        for n, (changed_at, invoice_no, before, after, item_id) in enumerate(_legacy_entries(db)):
+            changes.add(invoice_no, before, after, item_id, changed_at, change_id=first + n)
+            if len(changes.rows) >= BATCH:
+                count += len(changes.rows)
+                changes.flush(db)
+                db.commit()
+        count += len(changes.rows)
+        changes.flush(db)
+        print(f"[INFO] Change log: copied {count} entries from Invoices_History / Items_History")
+    db.add(ChangeLogBackfill(CompletedAt=datetime.datetime.now(), Entries=count))
+    db.commit()
+    return count
+
+
+def _backfill_in_background(engine, session_factory):
+    db = session_factory()
+    try:
+        backfill(engine, db)
+    except Exception as e:
+        db.rollback()
+        print(f"[WARN] Copying the legacy invoice history failed, it is retried at the next start: {e}")
+    finally:
+        db.close()
+
+
+def start(engine, session_factory):
+    """Create change_log and copy the legacy history into it in a daemon thread, until that is done once."""
+    if ensure_tables(engine):
+        threading.Thread(target=_backfill_in_background, args=(engine, session_factory),
+                         name="change-log-backfill", daemon=True).start()
+
+
+def prune(db, before_period):
+    """Delete every month before `before_period` ('YYYY-MM'); returns the number of entries removed."""
+    removed = db.query(ChangeLog).filter(ChangeLog.Period < before_period).delete(synchronize_session=False)
+    db.commit()
+    print(f"[INFO] Change log: removed {removed} entries before {before_period}")
+    return removed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the invoice change log.")
+    parser.add_argument("--prune-before", metavar="YYYY-MM", help="Delete the entries of all earlier months")
+    args = parser.parse_args(argv)
+    from core.database import engine, SessionLocal
+    ensure_tables(engine)
+    if args.prune_before:
+        db = SessionLocal()
+        try:
+            prune(db, args.prune_before)
+        finally:
+            db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,107 @@
+# Response compression for the API and rendered pages
+#
+# Plain ASGI middleware: a complete (single message) JSON / HTML / text response of at
+# least COMPRESSION_MIN_BYTES is compressed with brotli when the client accepts it and the
+# brotli package is installed, with gzip otherwise. Everything else passes through
+# untouched: streamed bodies (file downloads, exports), partial content, responses that
+# already carry a Content-Encoding (the precompressed static assets) and images / PDFs,
+# which do not shrink.
+import gzip
+
+from core.config import COMPRESSION_MIN_BYTES, COMPRESSION_GZIP_LEVEL, COMPRESSION_BROTLI_QUALITY
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSIBLE_TYPES = ("application/json", "text/html", "text/plain", "text/css", "text/javascript",
+                      "application/javascript", "application/x-ndjson")
+
+
+def accepted_encodings(accept_encoding):
+    """Content codings an Accept-Encoding header allows (q > 0), e.g. {"gzip", "br"}."""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        offered[name.strip()] = q
+    return {name for name, q in offered.items() if name and q > 0}
+
+
+def choose_encoding(accept_encoding):
+    """Best encoding we can produce for an Accept-Encoding header, or None."""
+    offered = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in offered:
+        return "br"
+    if "gzip" in offered:
+        return "gzip"
+    return None
+
+
+def compress(body, encoding):
+    if encoding == "br":
+        return brotli.compress(body, quality=COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=COMPRESSION_GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    def __init__(self, app, minimum_size=COMPRESSION_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.minimum_size:
+            await self.app(scope, receive, send)
+            return
+        accept = ""
+        for key, value in scope.get("headers", []):
+            if key == b"accept-encoding":
+                accept = value.decode("latin-1")
+        encoding = choose_encoding(accept)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None  # held back until we know whether the body gets compressed
+
+        async def send_wrapper(message):
+            nonlocal start
+            if start is None and message["type"] == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                content_type = headers.get(b"content-type", b"").decode("latin-1").split(";")[0].strip()
+                if (message["status"] != 200 or b"content-encoding" in headers
+                        or content_type not in COMPRESSIBLE_TYPES):
+                    start = False
+                    await send(message)
+                else:
+                    start = message
+                return
+            if not start or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            held, start = start, False
+            body = message.get("body", b"")
+            headers = [(k, v) for k, v in held.get("headers", []) if k.lower() != b"content-length"]
+            if message.get("more_body") or len(body) < self.minimum_size:
+                # Streamed or small: forward as produced
+                await send(held)
+                await send(message)
+                return
+            body = compress(body, encoding)
+            headers += [
+                (b"content-encoding", encoding.encode("latin-1")),
+                (b"content-length", str(len(body)).encode("latin-1")),
+            ]
+            if not any(k.lower() == b"vary" for k, _ in headers):
+                headers.append((b"vary", b"Accept-Encoding"))
+            await send({**held, "headers": headers})
+            await send({"type": "http.response.body", "body": body, "more_body": False})
+
+        await self.app(scope, receive, send_wrapper)
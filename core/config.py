@@ -41,6 +41,34 @@ DOWNLOAD_DIR = APP_STORAGE / "downloads"
 UPLOADS_DIR.mkdir(exist_ok=True)
 DOWNLOAD_DIR.mkdir(exist_ok=True)
 
+# Content-addressed blob store and its index (hidden inside the uploads folder)
+UPLOAD_STORE_DIR = UPLOADS_DIR / ".store"
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 1024 * 1024 * 1024))  # bytes, for resumable uploads
+
+# Derived data that can always be rebuilt (page rasters, thumbnails, ...)
+CACHE_DIR = APP_STORAGE / "cache"
+RASTER_CACHE_MAX_BYTES = int(os.getenv("RASTER_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+OCR_CACHE_MAX_BYTES = int(os.getenv("OCR_CACHE_MAX_BYTES", 256 * 1024 * 1024))  # 0 disables the OCR cache
+
+# Rasterising PDF pages for OCR (pdf2image)
+RASTER_DPI = int(os.getenv("RASTER_DPI", 200))
+RASTER_GRAYSCALE = os.getenv("RASTER_GRAYSCALE", "false").lower() == "true"
+
+# Storage retention (core/retention.py): maximum age in days and total size in bytes per
+# artefact type, oldest removed first; 0 disables a limit. Uploads are kept by default.
+RETENTION_INTERVAL_HOURS = float(os.getenv("RETENTION_INTERVAL_HOURS", 6))  # 0 disables the background run
+RETENTION_UPLOADS_DAYS = float(os.getenv("RETENTION_UPLOADS_DAYS", 0))
+RETENTION_UPLOADS_MAX_BYTES = int(os.getenv("RETENTION_UPLOADS_MAX_BYTES", 0))
+RETENTION_SIDECARS_DAYS = float(os.getenv("RETENTION_SIDECARS_DAYS", 7))
+RETENTION_EXPORTS_DAYS = float(os.getenv("RETENTION_EXPORTS_DAYS", 7))
+RETENTION_EXPORTS_MAX_BYTES = int(os.getenv("RETENTION_EXPORTS_MAX_BYTES", 1024 * 1024 * 1024))
+RETENTION_CACHE_DAYS = float(os.getenv("RETENTION_CACHE_DAYS", 30))
+
+# Full-text search (core/search_index.py): "auto" uses SQL Server full-text when the
+# database has it, otherwise the SQLite FTS5 index at SEARCH_INDEX_PATH ("fts5" / "mssql" force one)
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "auto").lower()
+SEARCH_INDEX_PATH = APP_STORAGE / "search.sqlite3"
+
 # ------------------------------
 # Bundled resource folders (inside exe or project)
 # ------------------------------
@@ -61,4 +89,25 @@ else:
 SECRET_KEY = os.getenv("SECRET_KEY", "INV_EXT_CrEaTiVe_TeCh730@04082025")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+
+# Password hashing runs on its own small pool; beyond the queue limit sign-ins get a 503
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 2))
+PASSWORD_HASH_QUEUE = int(os.getenv("PASSWORD_HASH_QUEUE", 64))
+# Sign-in attempts allowed per LOGIN_RATE_WINDOW seconds (0 disables the limit)
+LOGIN_RATE_LIMIT_PER_USER = int(os.getenv("LOGIN_RATE_LIMIT_PER_USER", 10))
+LOGIN_RATE_LIMIT_PER_IP = int(os.getenv("LOGIN_RATE_LIMIT_PER_IP", 60))
+LOGIN_RATE_WINDOW = int(os.getenv("LOGIN_RATE_WINDOW", 60))
+
+# Response compression (core/compression.py); COMPRESSION_MIN_BYTES=0 disables it
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", 6))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", 5))
+
+# Duplicate detection (core/fingerprints.py): saved invoices whose line-item simhashes differ
+# in at most this many of 64 bits are reported as possible duplicates (at most 3)
+FINGERPRINT_SIMHASH_DISTANCE = min(int(os.getenv("FINGERPRINT_SIMHASH_DISTANCE", 3)), 3)
+
+# Rows fetched from the database per batch when a listing is streamed (core/streaming.py)
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 1000))
+
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///default.db")
@@ -1,9 +1,11 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 import sys
+from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
+from core import metrics
 
 # Path to the folder where EXE is running
 base_path = Path(getattr(sys, '_MEIPASS', Path.cwd()))
@@ -11,7 +13,8 @@ env_file = base_path / ".env"
 
 if env_file.exists():
     load_dotenv(env_file)
-else:
+elif not os.getenv("DATABASE_URL"):
+    # Tools such as the benchmarks may supply DATABASE_URL directly instead of a .env file
     raise ValueError(f".env file not found at {env_file}")
 
 DATABASE_URL = os.getenv("DATABASE_URL")
@@ -19,7 +22,42 @@ if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set.")
 
 # engine = create_engine(DATABASE_URL, echo=True, fast_executemany=True)
-engine = create_engine(DATABASE_URL, echo=True)
+engine = create_engine(DATABASE_URL, echo=os.getenv("SQL_ECHO", "true").lower() == "true")
+
+# SQLite stand-in (local runs, load tests): provide the MSSQL function and collation the models use
+if engine.dialect.name == "sqlite":
+    from sqlalchemy import Date
+    from sqlalchemy.dialects.sqlite import DATE
+
+    class _SQLiteDate(DATE):
+        """getdate() gives a timestamp, also as the default of Date columns: read its date part."""
+
+        def result_processor(self, dialect, coltype):
+            parse = super().result_processor(dialect, coltype)
+            return lambda value: parse(value[:10] if isinstance(value, str) else value)
+
+    engine.dialect.colspecs = {**engine.dialect.colspecs, Date: _SQLiteDate}
+
+    def _ci_collation(a, b):
+        a, b = a.lower(), b.lower()
+        return (a > b) - (a < b)
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_mssql_compat(dbapi_connection, connection_record):
+        dbapi_connection.create_function(
+            "getdate", 0, lambda: datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f"))
+        dbapi_connection.create_collation("SQL_Latin1_General_CP1_CI_AS", _ci_collation)
+
+# Pool usage feeds the /metrics endpoint
+@event.listens_for(engine, "checkout")
+def _on_checkout(dbapi_connection, connection_record, connection_proxy):
+    metrics.DB_POOL_CHECKOUTS.inc()
+    metrics.DB_POOL_CHECKED_OUT.inc()
+
+@event.listens_for(engine, "checkin")
+def _on_checkin(dbapi_connection, connection_record):
+    metrics.DB_POOL_CHECKED_OUT.dec()
+
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False)
 Base = declarative_base()
 
@@ -0,0 +1,125 @@
+# Size-capped directories of derived files (page rasters, OCR output, ...)
+#
+# Files are written atomically and every read bumps the file's mtime, so once a directory
+# grows past its cap the least recently used files are evicted first. Everything kept in
+# a DiskCache can be rebuilt from the uploads, so deleting any of it is always safe.
+import os
+import threading
+from pathlib import Path
+
+from core import upload_store
+
+# Evict down to this fraction of the cap so a full cache is not rescanned on every write
+EVICT_TO = 0.8
+
+_digests = {}  # (realpath, mtime_ns, size) -> sha256, so unchanged files are not rehashed
+MAX_DIGESTS = 4096
+
+
+def file_digest(path):
+    """Content hash of a file, memoised on its path, mtime and size."""
+    st = os.stat(path)
+    key = (os.path.realpath(path), st.st_mtime_ns, st.st_size)
+    digest = _digests.get(key)
+    if digest is None:
+        digest = upload_store.hash_file(path)
+        if len(_digests) >= MAX_DIGESTS:
+            _digests.clear()
+        _digests[key] = digest
+    return digest
+
+
+class DiskCache:
+    def __init__(self, root, max_bytes):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._size = None  # bytes on disk, counted on the first write
+
+    def path(self, key, suffix=""):
+        return self.root / key[:2] / f"{key}{suffix}"
+
+    def touch(self, path):
+        """True if `path` is cached, marking it as recently used."""
+        try:
+            os.utime(path, None)
+            return True
+        except OSError:
+            return False
+
+    def write(self, target, writer):
+        """Call writer(tmp_path), then move the result into place (concurrent writers just race)."""
+        target = Path(target)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            writer(tmp)
+            os.replace(tmp, target)
+        finally:
+            if tmp.exists():
+                tmp.unlink()
+        self._account(target.stat().st_size)
+        return target
+
+    def entries(self):
+        """(path, mtime, size) of every cached file."""
+        for root, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_mtime, st.st_size
+
+    def _account(self, added):
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, _, size in self.entries())
+            else:
+                self._size += added
+            if self._size > self.max_bytes:
+                self._size = self.evict(int(self.max_bytes * EVICT_TO))
+
+    def evict(self, target_bytes):
+        """Delete least recently used files until the cache fits in target_bytes; returns the bytes left."""
+        entries = sorted(self.entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        removed = 0
+        for path, _, size in entries:
+            if total <= target_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self._prune(os.path.dirname(path))
+            total -= size
+            removed += 1
+        if removed:
+            print(f"[INFO] {self.root.name} cache: evicted {removed} files, {total // 1048576}MB left")
+        return total
+
+    def remove(self, path):
+        """Delete one cached file (used by the retention service)."""
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return False
+        self._prune(os.path.dirname(path))
+        with self._lock:
+            if self._size is not None:
+                self._size = max(0, self._size - size)
+        return True
+
+    def _prune(self, folder):
+        """Remove now-empty folders between `folder` and the cache root."""
+        root = os.path.abspath(self.root)
+        folder = os.path.abspath(folder)
+        while folder != root and folder.startswith(root):
+            try:
+                os.rmdir(folder)
+            except OSError:
+                break
+            folder = os.path.dirname(folder)
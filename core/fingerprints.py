@@ -0,0 +1,280 @@
+# Duplicate invoice detection
+#
+# Every saved correction and advanced bill gets a few fingerprints in invoice_fingerprints:
+#   file     SHA-256 of the uploaded document it was extracted from (from the upload store)
+#   header   normalised supplier GSTIN + bill number + date + total
+#   simhash  64-bit simhash of the line items, stored as four 16-bit bands
+# Each is an indexed (Kind, Value) lookup, so checking a save or an upload costs a few index
+# seeks whatever the number of invoices. A file or header match is an exact duplicate; two
+# simhashes within FINGERPRINT_SIMHASH_DISTANCE bits share at least one band (pigeonhole),
+# so only the invoices in matching bands are compared bit by bit and reported as possible
+# duplicates. The table is filled from existing invoices on first start;
+# `python -m core.fingerprints --rebuild` recomputes it (file hashes of old corrections are
+# not known and stay missing).
+import argparse
+import hashlib
+import re
+import threading
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import inspect
+
+from core import rebuild_gate, upload_store
+from core.config import FINGERPRINT_SIMHASH_DISTANCE
+from models.models import (
+    Base, InvoiceFingerprint,
+    CorrectedInvoices, CorrectedItems, AdvancedColumnsInvoicedata, AdvancedColumnsItems,
+)
+
+BANDS = 4
+BAND_BITS = 64 // BANDS
+BATCH = 1000  # invoices read per rebuild step
+
+_WORD = re.compile(r"[a-z0-9]+")
+_NOT_ALNUM = re.compile(r"[^A-Z0-9]")
+
+
+# ------------------------------
+# Fingerprints
+# ------------------------------
+def _code(value):
+    """Upper-case letters and digits only: ' inv/2024-07 ' and 'INV202407' are the same number."""
+    return _NOT_ALNUM.sub("", str(value or "").upper())
+
+
+def _amount(value, places="0.01"):
+    try:
+        return str(Decimal(str(value)).quantize(Decimal(places)))
+    except (InvalidOperation, ValueError):
+        return ""
+
+
+def header_key(gstin, number, date, total):
+    """Key of the invoice header, or None without a bill number to key on."""
+    number = _code(number)
+    if not number:
+        return None
+    parts = (_code(gstin), number, str(date or "")[:10], _amount(total or 0))
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def simhash(features):
+    """64-bit simhash of an iterable of feature strings (None when there are none)."""
+    weights = [0] * 64
+    seen = False
+    for feature in features:
+        seen = True
+        value = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    if not seen:
+        return None
+    return sum(1 << bit for bit in range(64) if weights[bit] > 0)
+
+
+def _item_features(description, hsn, amount):
+    for word in _WORD.findall((description or "").lower()):
+        yield f"w:{word}"
+    if _code(hsn):
+        yield f"h:{_code(hsn)}"
+    # Whole rupees, so a re-typed amount that only differs in paise still matches
+    yield f"a:{_amount(amount or 0, '1')}"
+
+
+def _items_simhash(items):
+    return simhash(feature for item in items for feature in _item_features(*item))
+
+
+def correction_fingerprints(invoice, items, file_hash=None):
+    """{kind: value} for a correction and its CorrectedItems."""
+    return {
+        "file": file_hash,
+        "header": header_key(invoice.SupplierGST, invoice.OriginalInvoiceNo, invoice.InvoiceDate, invoice.Total),
+        "simhash": _items_simhash((i.Description, i.HSN, i.Amount) for i in items),
+    }
+
+
+def advanced_fingerprints(invoice, items, file_hash=None):
+    return {
+        "file": file_hash,
+        "header": header_key(invoice.GSTIN, invoice.BillNumber, invoice.BillDate, invoice.Total),
+        "simhash": _items_simhash((i.ItemName, i.HSN_SAC, i.ItemTotal) for i in items),
+    }
+
+
+def file_hash(filename):
+    """SHA-256 of an uploaded document by its stored name (None if unknown)."""
+    if not filename:
+        return None
+    try:
+        return upload_store.content_hash(filename)
+    except Exception as e:
+        print(f"[WARN] Could not hash upload {filename}: {e}")
+        return None
+
+
+def _bands(value):
+    mask = (1 << BAND_BITS) - 1
+    return [f"{band}:{value >> (band * BAND_BITS) & mask:04x}" for band in range(BANDS)]
+
+
+def _rows(source, ref_id, prints):
+    for kind in ("file", "header"):
+        if prints.get(kind):
+            yield InvoiceFingerprint(Kind=kind, Value=prints[kind], Source=source, RefID=ref_id)
+    if prints.get("simhash") is not None:
+        signature = f"{prints['simhash']:016x}"
+        for band in _bands(prints["simhash"]):
+            yield InvoiceFingerprint(Kind="simhash", Value=band, Signature=signature, Source=source, RefID=ref_id)
+
+
+# ------------------------------
+# Lookups and maintenance
+# ------------------------------
+def find(db, prints, exclude=None):
+    """
+    Saved invoices matching `prints`:
+    (duplicates, similar) as lists of {"source", "id", "match"[, "distance"]}.
+    Duplicates share the file or the header; similar ones only have near-identical items.
+    `exclude` is the (source, id) of the invoice being saved.
+    """
+    duplicates, similar, seen = [], [], {exclude}
+    for kind in ("file", "header"):
+        if not prints.get(kind):
+            continue
+        rows = db.query(InvoiceFingerprint.Source, InvoiceFingerprint.RefID).filter(
+            InvoiceFingerprint.Kind == kind, InvoiceFingerprint.Value == prints[kind]).all()
+        for source, ref_id in rows:
+            if (source, ref_id) not in seen:
+                seen.add((source, ref_id))
+                duplicates.append({"source": source, "id": ref_id, "match": kind})
+
+    if prints.get("simhash") is not None:
+        rows = db.query(InvoiceFingerprint.Source, InvoiceFingerprint.RefID, InvoiceFingerprint.Signature).filter(
+            InvoiceFingerprint.Kind == "simhash", InvoiceFingerprint.Value.in_(_bands(prints["simhash"]))).all()
+        for source, ref_id, signature in rows:
+            if (source, ref_id) in seen:
+                continue
+            seen.add((source, ref_id))
+            distance = bin(int(signature, 16) ^ prints["simhash"]).count("1")
+            if distance <= FINGERPRINT_SIMHASH_DISTANCE:
+                similar.append({"source": source, "id": ref_id, "match": "items", "distance": distance})
+    return duplicates, similar
+
+
+def describe(duplicates):
+    """One-line message for a list of duplicates from find()."""
+    reasons = {"file": "same document", "header": "same GSTIN, number, date and total"}
+    return "Already saved: " + "; ".join(
+        f"{d['source']} #{d['id']} ({reasons.get(d['match'], d['match'])})" for d in duplicates)
+
+
+def register(db, source, ref_id, prints):
+    """
+    Store the fingerprints of a saved invoice in the caller's transaction, replacing its
+    previous ones. A known file hash is kept when `prints` has none (re-saves from the editor).
+    """
+    query = db.query(InvoiceFingerprint).filter(InvoiceFingerprint.Source == source,
+                                               InvoiceFingerprint.RefID == ref_id)
+    if not prints.get("file"):
+        query = query.filter(InvoiceFingerprint.Kind != "file")
+    query.delete(synchronize_session=False)
+    db.add_all(list(_rows(source, ref_id, prints)))
+
+
+def remove(db, source, ref_ids):
+    """Drop the fingerprints of deleted invoices (in the caller's transaction)."""
+    if ref_ids:
+        db.query(InvoiceFingerprint).filter(InvoiceFingerprint.Source == source,
+                                            InvoiceFingerprint.RefID.in_(list(ref_ids))
+                                            ).delete(synchronize_session=False)
+
+
+def ensure_tables(engine):
+    """Create invoice_fingerprints if it does not exist yet; True if it was created now."""
+    try:
+        created = not inspect(engine).has_table(InvoiceFingerprint.__tablename__)
+        Base.metadata.create_all(engine, tables=[InvoiceFingerprint.__table__])
+    except Exception as e:
+        print(f"[WARN] Could not create the invoice fingerprint table: {e}")
+        return False
+    return created
+
+
+def _rebuild_in_background(session_factory):
+    db = session_factory()
+    try:
+        rebuild(db)
+    except Exception as e:
+        db.rollback()
+        print(f"[WARN] Invoice fingerprint build failed: {e}")
+    finally:
+        db.close()
+
+
+def start(engine, session_factory):
+    """Create the fingerprint table on first start and fill it from existing invoices in a daemon thread."""
+    if ensure_tables(engine):
+        threading.Thread(target=_rebuild_in_background, args=(session_factory,),
+                         name="fingerprint-rebuild", daemon=True).start()
+
+
+def rebuild(db):
+    """
+    Recompute header and item fingerprints from the invoice tables, keeping known file hashes.
+    Saves wait meanwhile (core/rebuild_gate.py), so none is missed.
+    """
+    with rebuild_gate.rebuilding():
+        return _rebuild(db)
+
+
+def _rebuild(db):
+    sources = (
+        ("correction", CorrectedInvoices, CorrectedInvoices.CorrectionID, CorrectedItems,
+         CorrectedItems.CorrectionID, correction_fingerprints),
+        ("advanced", AdvancedColumnsInvoicedata, AdvancedColumnsInvoicedata.InvoiceID, AdvancedColumnsItems,
+         AdvancedColumnsItems.InvoiceID, advanced_fingerprints),
+    )
+    db.query(InvoiceFingerprint).filter(InvoiceFingerprint.Kind != "file").delete(synchronize_session=False)
+    counts = {}
+    for source, header, header_id, item, item_parent, fingerprints in sources:
+        counts[source], last = 0, None
+        while True:
+            query = db.query(header)
+            if last is not None:
+                query = query.filter(header_id > last)
+            invoices = query.order_by(header_id).limit(BATCH).all()
+            if not invoices:
+                break
+            ids = [getattr(invoice, header_id.key) for invoice in invoices]
+            items = {}
+            for row in db.query(item).filter(item_parent.in_(ids)):
+                items.setdefault(getattr(row, item_parent.key), []).append(row)
+            for invoice, ref_id in zip(invoices, ids):
+                db.add_all(list(_rows(source, ref_id, fingerprints(invoice, items.get(ref_id, ())))))
+            db.flush()
+            db.expunge_all()
+            counts[source] += len(ids)
+            last = ids[-1]
+    db.commit()
+    print(f"[INFO] Invoice fingerprints rebuilt: {counts}")
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the duplicate-detection fingerprint table.")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the fingerprints from the invoice tables")
+    args = parser.parse_args(argv)
+    from core.database import engine, SessionLocal
+    ensure_tables(engine)
+    if args.rebuild:
+        db = SessionLocal()
+        try:
+            rebuild(db)
+        finally:
+            db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
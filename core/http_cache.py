@@ -0,0 +1,40 @@
+# HTTP caching helpers shared by endpoints that serve cacheable content
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+
+# Revalidated with the ETag once stale
+CACHE_PRIVATE_DAY = "private, max-age=86400"
+# For URLs that embed the content hash, so the bytes behind them can never change
+CACHE_IMMUTABLE = "private, max-age=31536000, immutable"
+# For data that can change at any time: always revalidated, usually answered with a 304
+CACHE_REVALIDATE = "private, no-cache"
+
+
+def etag_for(*parts):
+    """Strong ETag built from whatever identifies a version of a response (versions, query args)."""
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:24]
+    return f'"{digest}"'
+
+
+def http_date(timestamp):
+    return formatdate(timestamp, usegmt=True)
+
+
+def not_modified(request, etag, mtime=None):
+    """RFC 9110 conditional GET: If-None-Match wins; If-Modified-Since is only used without it."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison, as required for If-None-Match
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag.removeprefix("W/") in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and mtime is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return since is not None and int(mtime) <= since.timestamp()
+    return False
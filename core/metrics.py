@@ -0,0 +1,230 @@
+# In-process metrics registry with Prometheus text exposition
+import time
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = []
+    for name, value in pairs:
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{name}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._series.get(self._key(labels), 0)
+
+    def render(self):
+        lines = self.header()
+        with self._lock:
+            for key, value in sorted(self._series.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {"counts": [0] * (len(self.buckets) + 1), "sum": 0.0, "count": 0}
+            series["counts"][index] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    def series(self):
+        """Return (labels dict, per-bucket counts, sum, count) for every label combination."""
+        with self._lock:
+            return [
+                (dict(zip(self.labelnames, key)), list(s["counts"]), s["sum"], s["count"])
+                for key, s in sorted(self._series.items())
+            ]
+
+    def render(self):
+        lines = self.header()
+        for labels, counts, total, count in self.series():
+            values = tuple(labels[name] for name in self.labelnames)
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = _format_labels(self.labelnames, values, ("le", _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            suffix = _format_labels(self.labelnames, values)
+            lines.append(f"{self.name}_sum{suffix} {_format_value(total)}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ------------------------------
+# Application metrics
+# ------------------------------
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "prodoc_http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status"))
+HTTP_IN_FLIGHT = REGISTRY.gauge(
+    "prodoc_http_requests_in_flight", "HTTP requests currently being served.")
+EXTRACTION_STAGE_SECONDS = REGISTRY.histogram(
+    "prodoc_extraction_stage_seconds", "Extraction pipeline stage durations.", ("stage", "vendor", "mode", "pages"),
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60))
+OCR_PAGES = REGISTRY.counter(
+    "prodoc_ocr_pages_total", "Pages sent through an OCR engine.", ("engine",))
+DB_POOL_CHECKOUTS = REGISTRY.counter(
+    "prodoc_db_pool_checkouts_total", "Connections checked out of the SQLAlchemy pool.")
+DB_POOL_CHECKED_OUT = REGISTRY.gauge(
+    "prodoc_db_pool_checked_out", "Connections currently checked out of the SQLAlchemy pool.")
+CACHE_REQUESTS = REGISTRY.counter(
+    "prodoc_cache_requests_total", "Cache lookups by cache and result (hit/miss).", ("cache", "result"))
+UPLOAD_BYTES = REGISTRY.counter(
+    "prodoc_upload_bytes_total", "Bytes received through document uploads.")
+PASSWORD_JOBS_PENDING = REGISTRY.gauge(
+    "prodoc_password_jobs_pending", "bcrypt hash/verify calls running or queued on the password pool.")
+AUTH_REJECTED = REGISTRY.counter(
+    "prodoc_auth_rejected_total", "Sign-in requests turned away before bcrypt ran.", ("reason",))
+
+
+def cache_lookup(cache, hit):
+    """Count one cache lookup; the hit ratio is hit / (hit + miss) per cache."""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+# ------------------------------
+# ASGI middleware: per-route latency and in-flight requests
+# ------------------------------
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware (no request/response wrapping) so the per-request cost
+    is two clock reads and a couple of dict updates.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_holder = {"status": 500}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # Label by the matched route template, never the raw path, to keep cardinality bounded
+            route = scope.get("route")
+            route_label = getattr(route, "path", None)
+            if route_label is None:
+                route_label = "/static" if scope.get("path", "").startswith("/static/") else "unmatched"
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                method=scope.get("method", ""),
+                route=route_label,
+                status=status_holder["status"],
+            )
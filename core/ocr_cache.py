@@ -0,0 +1,89 @@
+# OCR output cache
+#
+# OCR results are keyed by what was recognised and how: the hash of the input (page
+# image pixels, or the document bytes for ocrmypdf), the engine and its settings (DPI,
+# deskew, pages, language, ...). Renaming or re-uploading a document therefore reuses the
+# earlier OCR, while changing a setting does not. Two kinds of entries share one
+# size-capped LRU directory (CACHE_DIR/ocr):
+#   <key>.json  recognised lines [{"text", "confidence", "box"}] from PaddleOCR
+#   <key>.pdf   the searchable PDF written by ocrmypdf (text layer with word boxes)
+# Setting OCR_CACHE_MAX_BYTES=0 disables the cache (the benchmarks do, to time real OCR).
+import hashlib
+import json
+import shutil
+
+from core import metrics
+from core.config import CACHE_DIR, OCR_CACHE_MAX_BYTES
+from core.disk_cache import DiskCache, file_digest
+
+OCR_DIR = CACHE_DIR / "ocr"
+ENABLED = OCR_CACHE_MAX_BYTES > 0
+
+cache = DiskCache(OCR_DIR, OCR_CACHE_MAX_BYTES)
+
+
+def make_key(content_hash, engine, **settings):
+    payload = json.dumps({"input": content_hash, "engine": engine, "settings": settings}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def image_hash(image):
+    """Hash of a PIL image's pixels (mode and size included, so the DPI is part of it)."""
+    digest = hashlib.sha256(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode("ascii"))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+def cached_lines(image, engine, recognise, **settings):
+    """
+    OCR lines of a page image, calling recognise(image) -> [{"text", "confidence", "box"}]
+    only on a cache miss.
+    """
+    if not ENABLED:
+        return recognise(image)
+
+    cached = cache.path(make_key(image_hash(image), engine, **settings), ".json")
+    if cache.touch(cached):
+        try:
+            with open(cached, encoding="utf-8") as f:
+                lines = json.load(f)
+            metrics.cache_lookup("ocr", True)
+            return lines
+        except (OSError, ValueError):
+            pass  # evicted meanwhile or truncated: recognise again
+    metrics.cache_lookup("ocr", False)
+
+    lines = recognise(image)
+    try:
+        cache.write(cached, lambda tmp: tmp.write_text(json.dumps(lines), encoding="utf-8"))
+    except OSError as e:
+        print(f"[WARN] Could not cache OCR result: {e}")
+    return lines
+
+
+def cached_pdf(source_path, output_path, engine, run, **settings):
+    """
+    Write the OCR'd PDF of `source_path` to `output_path`, copying it from the cache when
+    the same document was OCR'd with the same settings before and calling
+    run(source_path, output_path) otherwise. Returns True if OCR actually ran.
+    """
+    if not ENABLED:
+        run(source_path, output_path)
+        return True
+
+    cached = cache.path(make_key(file_digest(source_path), engine, **settings), ".pdf")
+    if cache.touch(cached):
+        try:
+            shutil.copyfile(cached, output_path)
+            metrics.cache_lookup("ocr", True)
+            return False
+        except OSError:
+            pass
+    metrics.cache_lookup("ocr", False)
+
+    run(source_path, output_path)
+    try:
+        cache.write(cached, lambda tmp: shutil.copyfile(output_path, tmp))
+    except OSError as e:
+        print(f"[WARN] Could not cache OCR output for {source_path}: {e}")
+    return True
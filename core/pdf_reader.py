@@ -1,10 +1,10 @@
-from pdf2image.pdf2image import convert_from_path
-import pdfplumber
-import numpy as np
-from pprint import pprint
-import cv2
-from PIL import Image
 import os
+
+from core.config import RASTER_DPI, RASTER_GRAYSCALE
+
+# pdfplumber and pdf2image are imported on first use so that importing this module
+# (and therefore the API) does not pay for pdfminer/Pillow; cv2 and numpy were only
+# needed by the commented-out ocr_image helper below
 # from paddleocr import PaddleOCR
 # ocr = PaddleOCR(use_angle_cls=True, lang='en')
 
@@ -18,10 +18,85 @@ import os
 #     return "\n".join([line[1][0] for block in result for line in block])
 
 
+def extract_pages(path):
+    """Return the text of every page, in order (empty string for pages without a text layer)."""
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return [p.extract_text() or "" for p in pdf.pages]
+
 def extract_text(path):
+    return "\n".join(extract_pages(path))
+
+# A page is treated as scanned when images cover at least this share of it and its text
+# layer holds fewer than MIN_CHAR_DENSITY visible characters per square inch (a typical
+# invoice page has 10-30; a scan with a stamped header or page number has well under 1).
+# Blank pages (no images) are never sent to OCR.
+MIN_IMAGE_COVERAGE = 0.3
+MIN_CHAR_DENSITY = 2.0
+
+def _image_coverage(page):
+    """Share of the page area covered by images (overlaps counted once per image, capped at 1)."""
+    page_area = float(page.width * page.height) or 1.0
+    x0, top, x1, bottom = (float(v) for v in page.bbox)
+    covered = 0.0
+    for image in page.images:
+        width = min(float(image["x1"]), x1) - max(float(image["x0"]), x0)
+        height = min(float(image["bottom"]), bottom) - max(float(image["top"]), top)
+        if width > 0 and height > 0:
+            covered += width * height
+    return min(1.0, covered / page_area)
+
+def classify_page(page):
+    """Text-layer and image statistics of one pdfplumber page, and whether it needs OCR."""
+    chars = sum(1 for c in page.chars if not c.get("text", "").isspace())
+    square_inches = float(page.width * page.height) / (72 * 72) or 1.0
+    density = chars / square_inches
+    coverage = _image_coverage(page)
+    return {
+        "page": page.page_number,
+        "chars": chars,
+        "char_density": round(density, 2),
+        "image_coverage": round(coverage, 3),
+        "scanned": coverage >= MIN_IMAGE_COVERAGE and density < MIN_CHAR_DENSITY,
+    }
+
+def analyze_pages(path):
+    """
+    One pass over the PDF returning classify_page() stats plus the page "text" for every
+    page, so callers can OCR only the scanned pages and keep the native text of the rest.
+    """
+    import pdfplumber
     with pdfplumber.open(path) as pdf:
-        return "\n".join([p.extract_text() for p in pdf.pages])
+        pages = []
+        for page in pdf.pages:
+            info = classify_page(page)
+            info["text"] = page.extract_text() or ""
+            pages.append(info)
+            page.flush_cache()
+        return pages
+
+def page_count(path):
+    from pdf2image.pdf2image import pdfinfo_from_path
+    return int(pdfinfo_from_path(path)["Pages"])
+
+def iter_page_images(path, dpi=None, grayscale=None, first_page=1, last_page=None):
+    """
+    Yield (page_number, PIL image) one page at a time, so only a single page bitmap is
+    held in memory however long the document is (a 100-page scan at 200 DPI RGB is
+    several GB when converted in one go). Defaults come from RASTER_DPI / RASTER_GRAYSCALE.
+    """
+    from pdf2image.pdf2image import convert_from_path
+    dpi = dpi or RASTER_DPI
+    grayscale = RASTER_GRAYSCALE if grayscale is None else grayscale
+    pages = page_count(path)
+    last_page = min(last_page or pages, pages)
+    for number in range(first_page, last_page + 1):
+        images = convert_from_path(path, dpi=dpi, grayscale=grayscale, first_page=number, last_page=number)
+        if images:
+            yield number, images[0]
 
-def convert_pdf_to_images(path):
-    return None if not convert_from_path(path) else convert_from_path(path)
+def convert_pdf_to_images(path, dpi=None, grayscale=None):
+    """All pages as a list (None if nothing could be rasterised); prefer iter_page_images."""
+    images = [image for _, image in iter_page_images(path, dpi, grayscale)]
+    return images or None
 
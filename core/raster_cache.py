@@ -0,0 +1,141 @@
+# Page raster cache
+#
+# Rendered pages are stored once per (document content hash, page, DPI) under
+# CACHE_DIR/rasters/<aa>/<sha256>/p<page>_d<dpi>.png, so the OCR fallback and the preview
+# endpoint share the same rasters. Preview thumbnails (p<page>_w<width>.<fmt>) are scaled
+# down from the smallest raster that is wide enough. The cache is capped at
+# RASTER_CACHE_MAX_BYTES; every hit bumps the file's mtime and the least recently used
+# files are evicted first.
+from core import metrics
+from core.config import CACHE_DIR, RASTER_CACHE_MAX_BYTES
+from core.disk_cache import DiskCache, file_digest
+
+RASTER_DIR = CACHE_DIR / "rasters"
+
+# Rendering DPIs used for thumbnails, so different widths share the same rasters
+DPI_STEPS = (72, 100, 150, 200, 300)
+THUMBNAIL_FORMATS = {"webp": "WEBP", "png": "PNG"}
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+cache = DiskCache(RASTER_DIR, RASTER_CACHE_MAX_BYTES)
+
+
+def _doc_dir(digest):
+    return RASTER_DIR / digest[:2] / digest
+
+
+def _is_image(path):
+    return str(path).lower().endswith(IMAGE_EXTENSIONS)
+
+
+def _load(path):
+    from PIL import Image
+    with Image.open(path) as image:
+        image.load()
+    return image
+
+
+def _store(image, target, fmt, **params):
+    cache.write(target, lambda tmp: image.save(tmp, fmt, **params))
+
+
+def page_count(path):
+    if _is_image(path):
+        return 1
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def _render(path, page_number, dpi, page=None):
+    if page is not None:
+        return page.to_image(resolution=dpi).original
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        if not 1 <= page_number <= len(pdf.pages):
+            raise IndexError(f"Page {page_number} out of range (1-{len(pdf.pages)})")
+        return pdf.pages[page_number - 1].to_image(resolution=dpi).original
+
+
+def page_image(path, page_number, dpi=200, page=None):
+    """
+    PIL image of one page (1-based) rendered at `dpi`, from the cache when possible.
+    Pass the already open pdfplumber `page` to avoid reopening the PDF on a miss.
+    Image uploads are already rasters and are returned as they are.
+    """
+    if _is_image(path):
+        if page_number != 1:
+            raise IndexError(f"Page {page_number} out of range (1-1)")
+        return _load(path)
+
+    cached = _doc_dir(file_digest(path)) / f"p{page_number}_d{dpi}.png"
+    if cached.exists():
+        try:
+            image = _load(cached)
+            metrics.cache_lookup("page_raster", True)
+            cache.touch(cached)
+            return image
+        except OSError:
+            pass  # evicted meanwhile or truncated: render again
+    metrics.cache_lookup("page_raster", False)
+
+    image = _render(path, page_number, dpi, page)
+    try:
+        _store(image, cached, "PNG")
+    except OSError as e:
+        print(f"[WARN] Could not cache page raster {cached.name}: {e}")
+    return image
+
+
+def _thumbnail_source(path, digest, page_number, width):
+    """Smallest cached raster at least `width` wide, else a render at the matching DPI step."""
+    if _is_image(path):
+        return page_image(path, page_number)
+
+    from PIL import Image
+    folder = _doc_dir(digest)
+    candidates = []
+    for cached in folder.glob(f"p{page_number}_d*.png"):
+        try:
+            with Image.open(cached) as image:
+                if image.width >= width:
+                    candidates.append((image.width, int(cached.stem.rsplit("_d", 1)[1])))
+        except (OSError, ValueError):
+            continue
+    if candidates:
+        return page_image(path, page_number, min(candidates)[1])
+
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        if not 1 <= page_number <= len(pdf.pages):
+            raise IndexError(f"Page {page_number} out of range (1-{len(pdf.pages)})")
+        page = pdf.pages[page_number - 1]
+        inches = float(page.width) / 72
+        dpi = next((step for step in DPI_STEPS if inches * step >= width), DPI_STEPS[-1])
+        return page_image(path, page_number, dpi, page=page)
+
+
+def thumbnail(path, page_number=1, width=300, fmt="webp"):
+    """
+    Path of a cached preview of one page scaled to `width` pixels (never upscaled),
+    rendering it on a miss. Returns (path, content hash).
+    """
+    if fmt not in THUMBNAIL_FORMATS:
+        raise ValueError(f"Unsupported thumbnail format: {fmt}")
+    digest = file_digest(path)
+    target = _doc_dir(digest) / f"p{page_number}_w{width}.{fmt}"
+    if target.exists():
+        metrics.cache_lookup("page_thumbnail", True)
+        cache.touch(target)
+        return target, digest
+    metrics.cache_lookup("page_thumbnail", False)
+
+    from PIL import Image
+    image = _thumbnail_source(path, digest, page_number, width)
+    if image.mode not in ("RGB", "L"):
+        image = image.convert("RGB")
+    if image.width > width:
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+    params = {"quality": 85, "method": 4} if fmt == "webp" else {"optimize": True}
+    _store(image, target, THUMBNAIL_FORMATS[fmt], **params)
+    return target, digest
@@ -0,0 +1,54 @@
+# Saves vs rebuilds of the derived invoice tables
+#
+# The analytics rollups, the duplicate fingerprints and the search index are kept in step by
+# the routes that save or delete corrections / advanced bills, and can be rebuilt from the
+# invoice tables. A rebuild reads the invoices in batches and then replaces what it built
+# from them, so a save that commits in between would be lost (or overwritten with the old
+# version). Saves therefore hold the gate shared and rebuilds exclusively: a rebuild waits
+# for the saves in progress, and new saves wait for the rebuild (up to SAVE_WAIT seconds,
+# then RebuildInProgress). The gate is per process: with several app processes, or for the
+# `--rebuild` command lines, run rebuilds while the app is not taking saves.
+import threading
+from contextlib import contextmanager
+
+SAVE_WAIT = 30  # seconds a save waits for a running rebuild
+
+_cond = threading.Condition()
+_saves = 0
+_rebuilds = 0
+
+
+class RebuildInProgress(RuntimeError):
+    pass
+
+
+@contextmanager
+def saving(timeout=None):
+    """Hold off rebuilds while a save changes invoices and their derived rows."""
+    global _saves
+    with _cond:
+        if not _cond.wait_for(lambda: not _rebuilds, SAVE_WAIT if timeout is None else timeout):
+            raise RebuildInProgress("A rebuild of the analytics / search tables is running, please retry shortly")
+        _saves += 1
+    try:
+        yield
+    finally:
+        with _cond:
+            _saves -= 1
+            _cond.notify_all()
+
+
+@contextmanager
+def rebuilding():
+    """Run a rebuild with no save in progress; saves arriving meanwhile wait for it."""
+    global _rebuilds
+    with _cond:
+        # Counted before waiting, so a steady stream of saves cannot keep the rebuild out
+        _rebuilds += 1
+        _cond.wait_for(lambda: not _saves)
+    try:
+        yield
+    finally:
+        with _cond:
+            _rebuilds -= 1
+            _cond.notify_all()
@@ -0,0 +1,195 @@
+# Storage retention and garbage collection
+#
+# Uploads, OCR sidecars (<name>_textpdf.pdf beside the upload), Excel exports and the
+# page raster / OCR caches all grow without bound on their own. run() applies a policy
+# per artefact type (maximum age and/or total size, oldest first; 0 disables a limit),
+# removes sidecars whose upload is gone and whatever the upload index no longer
+# references (upload_store.collect_garbage), and returns a report. With dry_run=True
+# nothing is deleted and the report lists what would be. start() repeats the run every
+# RETENTION_INTERVAL_HOURS in a daemon thread.
+#
+#     python -m core.retention            # dry-run report
+#     python -m core.retention --apply
+import argparse
+import json
+import os
+import threading
+import time
+
+from core import upload_store, raster_cache, ocr_cache
+from core.config import (
+    UPLOADS_DIR, DOWNLOAD_DIR, RASTER_CACHE_MAX_BYTES, OCR_CACHE_MAX_BYTES,
+    RETENTION_INTERVAL_HOURS, RETENTION_UPLOADS_DAYS, RETENTION_UPLOADS_MAX_BYTES,
+    RETENTION_SIDECARS_DAYS, RETENTION_EXPORTS_DAYS, RETENTION_EXPORTS_MAX_BYTES, RETENTION_CACHE_DAYS,
+)
+
+POLICIES = {
+    "uploads": {"max_age_days": RETENTION_UPLOADS_DAYS, "max_bytes": RETENTION_UPLOADS_MAX_BYTES},
+    "ocr_sidecars": {"max_age_days": RETENTION_SIDECARS_DAYS, "max_bytes": 0},
+    "exports": {"max_age_days": RETENTION_EXPORTS_DAYS, "max_bytes": RETENTION_EXPORTS_MAX_BYTES},
+    "page_rasters": {"max_age_days": RETENTION_CACHE_DAYS, "max_bytes": RASTER_CACHE_MAX_BYTES},
+    "ocr_cache": {"max_age_days": RETENTION_CACHE_DAYS, "max_bytes": OCR_CACHE_MAX_BYTES},
+}
+SOURCE_EXTENSIONS = (".pdf", ".jpg", ".jpeg", ".png")
+MAX_REPORT_ITEMS = 200  # per artefact type
+
+_run_lock = threading.Lock()
+_stop = threading.Event()
+_thread = None
+last_report = None
+
+
+def _select(entries, max_age_days, max_bytes, now):
+    """
+    entries: [(key, size, mtime, orphaned)]. Returns [(key, size, reason)] to remove:
+    orphans, then everything older than max_age_days, then the oldest until the rest
+    fits in max_bytes.
+    """
+    drop = [(key, size, "orphaned") for key, size, _, orphaned in entries if orphaned]
+    kept = sorted((e for e in entries if not e[3]), key=lambda e: e[2])
+    total = sum(e[1] for e in kept)
+    cutoff = now - max_age_days * 86400 if max_age_days else None
+    for key, size, mtime, _ in kept:
+        if cutoff is not None and mtime < cutoff:
+            reason = "expired"
+        elif max_bytes and total > max_bytes:
+            reason = "over quota"
+        else:
+            break  # sorted oldest first: nothing newer is expired, and the quota holds
+        drop.append((key, size, reason))
+        total -= size
+    return drop
+
+
+def _scan(folder, match=None):
+    if not os.path.isdir(folder):
+        return
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = [d for d in dirs if not d.startswith(".")]  # skips UPLOADS_DIR/.store
+        for name in files:
+            if match and not match(name):
+                continue
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            yield path, st.st_size, st.st_mtime
+
+
+def _sidecar_entries():
+    suffixes = upload_store.DERIVED_SUFFIXES
+    for path, size, mtime in _scan(UPLOADS_DIR, lambda name: name.endswith(suffixes)):
+        name = os.path.basename(path)
+        stem = next(name[:-len(s)] for s in suffixes if name.endswith(s))
+        orphaned = not any((UPLOADS_DIR / f"{stem}{ext}").exists() for ext in SOURCE_EXTENSIONS)
+        yield path, size, mtime, orphaned
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+        return True
+    except OSError:
+        return False
+
+
+# Artefact type -> (entries(), remove(key))
+ARTEFACTS = {
+    "uploads": (
+        lambda: ((name, size, uploaded, False) for name, size, uploaded in upload_store.catalog_entries()),
+        upload_store.release,
+    ),
+    "ocr_sidecars": (_sidecar_entries, _remove_file),
+    "exports": (
+        lambda: ((path, size, mtime, False) for path, size, mtime in _scan(DOWNLOAD_DIR)),
+        _remove_file,
+    ),
+    "page_rasters": (
+        lambda: ((path, size, mtime, False) for path, mtime, size in raster_cache.cache.entries()),
+        raster_cache.cache.remove,
+    ),
+    "ocr_cache": (
+        lambda: ((path, size, mtime, False) for path, mtime, size in ocr_cache.cache.entries()),
+        ocr_cache.cache.remove,
+    ),
+}
+
+
+def run(dry_run=False):
+    """Apply every retention policy once and return the report."""
+    global last_report
+    with _run_lock:
+        started = time.time()
+        report = {"dry_run": dry_run, "started_at": started, "artefacts": {}}
+        for kind, (entries, remove) in ARTEFACTS.items():
+            policy = POLICIES[kind]
+            try:
+                found = list(entries())
+            except Exception as e:
+                report["artefacts"][kind] = {"error": str(e)}
+                continue
+            drop = _select(found, policy["max_age_days"], policy["max_bytes"], started)
+            removed = [item for item in drop if dry_run or remove(item[0])]
+            report["artefacts"][kind] = {
+                "policy": policy,
+                "files": len(found),
+                "bytes": sum(e[1] for e in found),
+                "removed": len(removed),
+                "freed_bytes": sum(size for _, size, _ in removed),
+                "items": [{"name": str(key), "size": size, "reason": reason}
+                          for key, size, reason in removed[:MAX_REPORT_ITEMS]],
+            }
+
+        garbage = upload_store.collect_garbage(dry_run=dry_run)
+        report["artefacts"]["upload_store"] = {
+            "removed": len(garbage),
+            "freed_bytes": sum(item["size"] for item in garbage),
+            "items": [{"name": item["path"], "size": item["size"], "reason": item["reason"]}
+                      for item in garbage[:MAX_REPORT_ITEMS]],
+        }
+        report["duration_ms"] = round((time.time() - started) * 1000.0, 1)
+        report["freed_bytes"] = sum(a.get("freed_bytes", 0) for a in report["artefacts"].values())
+
+        if not dry_run:
+            last_report = report
+            removed = sum(a.get("removed", 0) for a in report["artefacts"].values())
+            print(f"[INFO] Retention: removed {removed} files, freed {report['freed_bytes'] // 1048576}MB")
+        return report
+
+
+def _loop(interval):
+    # First run shortly after startup rather than immediately, so it never delays it
+    delay = min(60.0, interval)
+    while not _stop.wait(delay):
+        try:
+            run()
+        except Exception as e:
+            print(f"[WARN] Retention run failed: {e}")
+        delay = interval
+
+
+def start(interval_hours=RETENTION_INTERVAL_HOURS):
+    """Run the retention policies periodically in a daemon thread (no-op if interval is 0)."""
+    global _thread
+    if interval_hours <= 0 or (_thread and _thread.is_alive()):
+        return
+    _stop.clear()
+    _thread = threading.Thread(target=_loop, args=(interval_hours * 3600,), name="retention", daemon=True)
+    _thread.start()
+
+
+def stop():
+    _stop.set()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply the storage retention policies.")
+    parser.add_argument("--apply", action="store_true", help="Delete files (default: dry-run report only)")
+    args = parser.parse_args(argv)
+    print(json.dumps(run(dry_run=not args.apply), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,415 @@
+# Full-text search over saved invoices
+#
+# A search document is one saved invoice: a correction (CorrectedInvoices + CorrectedItems)
+# or an advanced-columns bill (advanced_Columns_Invoicedata + advanced_Columns_Items), with
+# its number, vendor, GSTINs and the descriptions / HSN codes of all its items. Two backends:
+#   fts5   SQLite FTS5 index in SEARCH_INDEX_PATH. The save and delete routes keep it current
+#          (index_correction / index_advanced / remove); it is built in the background on
+#          first start and can be rebuilt with `python -m core.search_index --rebuild`.
+#   mssql  SQL Server full-text (CONTAINSTABLE) on the tables themselves, kept current by
+#          SQL Server's change tracking. Needs the indexes in MSSQL_FULLTEXT_DDL
+#          (`python -m core.search_index --mssql-ddl` prints them).
+# SEARCH_BACKEND=auto uses mssql when the database is SQL Server with those indexes in place.
+import argparse
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from sqlalchemy import text
+
+from core import rebuild_gate
+from core.config import SEARCH_BACKEND, SEARCH_INDEX_PATH
+
+KINDS = ("correction", "advanced")
+MAX_TERMS = 8
+BATCH = 1000  # invoices read per rebuild step
+
+SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS documents USING fts5(
+    number, vendor, gstin, description, hsn, kind,
+    ref_id UNINDEXED, date UNINDEXED, total UNINDEXED,
+    prefix = '2 3 4', tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+# bm25 weight per column: number, vendor, gstin, description, hsn, kind (stored as the
+# default rank, so ORDER BY rank is evaluated inside FTS5)
+RANK = "bm25(10.0, 4.0, 6.0, 1.0, 3.0, 0.0)"
+
+MSSQL_FULLTEXT_DDL = """
+-- KEY INDEX must name each table's primary key index (see sp_helpindex '<table>')
+CREATE FULLTEXT CATALOG ProDocSearch;
+CREATE FULLTEXT INDEX ON CorrectedInvoices (OriginalInvoiceNo, FromAddress, SupplierGST, CustomerGST)
+    KEY INDEX PK_CorrectedInvoices ON ProDocSearch WITH CHANGE_TRACKING AUTO;
+CREATE FULLTEXT INDEX ON CorrectedItems (Description, HSN)
+    KEY INDEX PK_CorrectedItems ON ProDocSearch WITH CHANGE_TRACKING AUTO;
+CREATE FULLTEXT INDEX ON advanced_Columns_Invoicedata (BillNumber, VendorName, GSTIN, CustomerName)
+    KEY INDEX PK_advanced_Columns_Invoicedata ON ProDocSearch WITH CHANGE_TRACKING AUTO;
+CREATE FULLTEXT INDEX ON advanced_Columns_Items (ItemName, SKU, HSN_SAC)
+    KEY INDEX PK_advanced_Columns_Items ON ProDocSearch WITH CHANGE_TRACKING AUTO;
+"""
+SEARCH_TABLES = ("CorrectedInvoices", "CorrectedItems", "advanced_Columns_Invoicedata", "advanced_Columns_Items")
+
+# Header matches count more than item matches, as with the FTS5 column weights. One block of
+# hits per term (:q0, :q1, ...); an invoice must be hit by every term, anywhere in its header
+# or items, as FTS5 requires of a document
+MSSQL_TERM_HITS = """
+    SELECT {n} AS term, 'correction' AS kind, ft.[KEY] AS ref_id, ft.RANK * 4 AS score
+      FROM CONTAINSTABLE(CorrectedInvoices, (OriginalInvoiceNo, FromAddress, SupplierGST, CustomerGST), :q{n}) ft
+    UNION ALL
+    SELECT {n}, 'correction', it.CorrectionID, ft.RANK
+      FROM CONTAINSTABLE(CorrectedItems, (Description, HSN), :q{n}) ft
+      JOIN CorrectedItems it ON it.CorrectionItemID = ft.[KEY]
+    UNION ALL
+    SELECT {n}, 'advanced', ft.[KEY], ft.RANK * 4
+      FROM CONTAINSTABLE(advanced_Columns_Invoicedata, (BillNumber, VendorName, GSTIN, CustomerName), :q{n}) ft
+    UNION ALL
+    SELECT {n}, 'advanced', it.InvoiceID, ft.RANK
+      FROM CONTAINSTABLE(advanced_Columns_Items, (ItemName, SKU, HSN_SAC), :q{n}) ft
+      JOIN advanced_Columns_Items it ON it.ItemID = ft.[KEY]"""
+
+MSSQL_SEARCH = """
+WITH hits AS ({hits}
+)
+SELECT kind, ref_id, SUM(score) AS score, COUNT(*) OVER () AS total
+  FROM hits
+ WHERE :kind IS NULL OR kind = :kind
+ GROUP BY kind, ref_id
+HAVING COUNT(DISTINCT term) = :terms
+ ORDER BY score DESC, ref_id DESC
+OFFSET :offset ROWS FETCH NEXT :limit ROWS ONLY
+"""
+
+_initialized = False
+_backend = None
+_build_thread = None
+
+
+@contextmanager
+def _index():
+    """Short-lived connection to the FTS5 index per operation; commits on success."""
+    global _initialized
+    conn = sqlite3.connect(SEARCH_INDEX_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        if not _initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            fresh = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'documents'").fetchone() is None
+            conn.executescript(SCHEMA)
+            if fresh:
+                conn.execute("INSERT INTO documents(documents, rank) VALUES ('rank', ?)", (RANK,))
+            conn.commit()
+            _initialized = True
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+# ------------------------------
+# Backend selection
+# ------------------------------
+def _mssql_fulltext_ready(db):
+    try:
+        installed = db.execute(text("SELECT FULLTEXTSERVICEPROPERTY('IsFullTextInstalled')")).scalar()
+        indexed = db.execute(text(
+            "SELECT COUNT(*) FROM sys.fulltext_indexes WHERE object_id IN ("
+            + ", ".join(f"OBJECT_ID('{table}')" for table in SEARCH_TABLES) + ")"
+        )).scalar()
+    except Exception as e:
+        print(f"[WARN] Could not check for SQL Server full-text search: {e}")
+        return False
+    return installed == 1 and indexed == len(SEARCH_TABLES)
+
+
+def backend(db):
+    """'mssql' or 'fts5', decided once per process."""
+    global _backend
+    if _backend is None:
+        if SEARCH_BACKEND in ("fts5", "mssql"):
+            _backend = SEARCH_BACKEND
+        elif db.get_bind().dialect.name == "mssql" and _mssql_fulltext_ready(db):
+            _backend = "mssql"
+        else:
+            _backend = "fts5"
+        print(f"[INFO] Search backend: {_backend}")
+    return _backend
+
+
+# ------------------------------
+# Documents
+# ------------------------------
+def _rowid(kind, ref_id):
+    return int(ref_id) * len(KINDS) + KINDS.index(kind)
+
+
+def _join(values):
+    return " ".join(v for v in values if v)
+
+
+def _documents(kind, headers, items):
+    """headers: [(id, number, vendor, gstin, date, total)], items: [(id, description, hsn)]."""
+    descriptions, hsns = {}, {}
+    for ref_id, description, hsn in items:
+        descriptions.setdefault(ref_id, []).append(description)
+        hsns.setdefault(ref_id, []).append(hsn)
+    for ref_id, number, vendor, gstin, date, total in headers:
+        yield {
+            "kind": kind,
+            "ref_id": ref_id,
+            "number": number or "",
+            "vendor": vendor or "",
+            "gstin": gstin or "",
+            "description": _join(descriptions.get(ref_id, ())),
+            "hsn": _join(hsns.get(ref_id, ())),
+            "date": str(date) if date else None,
+            "total": float(total) if total is not None else None,
+        }
+
+
+# Loaders take `which(column)`, the filter on the invoice id column (one id, a range or a list)
+def _correction_documents(db, which):
+    from models.models import CorrectedInvoices as H, CorrectedItems as I
+    headers = db.query(H.CorrectionID, H.OriginalInvoiceNo, H.FromAddress, H.SupplierGST, H.CustomerGST,
+                       H.InvoiceDate, H.Total).filter(which(H.CorrectionID)).all()
+    items = db.query(I.CorrectionID, I.Description, I.HSN).filter(which(I.CorrectionID)).all()
+    return list(_documents(
+        "correction",
+        [(ref_id, number, vendor, _join((supplier, customer)), date, total)
+         for ref_id, number, vendor, supplier, customer, date, total in headers],
+        items,
+    ))
+
+
+def _advanced_documents(db, which):
+    from models.models import AdvancedColumnsInvoicedata as H, AdvancedColumnsItems as I
+    headers = db.query(H.InvoiceID, H.BillNumber, H.VendorName, H.CustomerName, H.GSTIN, H.BillDate, H.Total) \
+        .filter(which(H.InvoiceID)).all()
+    items = db.query(I.InvoiceID, I.ItemName, I.SKU, I.HSN_SAC).filter(which(I.InvoiceID)).all()
+    return list(_documents(
+        "advanced",
+        [(ref_id, number, _join((vendor, customer)), gstin, date, total)
+         for ref_id, number, vendor, customer, gstin, date, total in headers],
+        [(ref_id, _join((name, sku)), hsn) for ref_id, name, sku, hsn in items],
+    ))
+
+
+def _id_column(kind):
+    from models.models import CorrectedInvoices, AdvancedColumnsInvoicedata
+    return CorrectedInvoices.CorrectionID if kind == "correction" else AdvancedColumnsInvoicedata.InvoiceID
+
+
+LOADERS = {"correction": _correction_documents, "advanced": _advanced_documents}
+
+
+def upsert(documents):
+    """Add or replace documents in the FTS5 index."""
+    rows = [(_rowid(d["kind"], d["ref_id"]), d["number"], d["vendor"], d["gstin"], d["description"], d["hsn"],
+             d["kind"], d["ref_id"], d["date"], d["total"]) for d in documents]
+    if not rows:
+        return
+    with _index() as conn:
+        conn.executemany("DELETE FROM documents WHERE rowid = ?", [(row[0],) for row in rows])
+        conn.executemany(
+            "INSERT INTO documents(rowid, number, vendor, gstin, description, hsn, kind, ref_id, date, total) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+def remove(kind, ref_ids):
+    with _index() as conn:
+        conn.executemany("DELETE FROM documents WHERE rowid = ?", [(_rowid(kind, ref_id),) for ref_id in ref_ids])
+
+
+def _reindex(db, kind, ref_id):
+    """Called after a save; never fails the save itself."""
+    try:
+        if backend(db) != "fts5":
+            return
+        documents = LOADERS[kind](db, lambda column: column == ref_id)
+        if documents:
+            upsert(documents)
+        else:
+            remove(kind, [ref_id])
+    except Exception as e:
+        print(f"[WARN] Could not update the search index for {kind} {ref_id}: {e}")
+
+
+def index_correction(db, correction_id):
+    _reindex(db, "correction", correction_id)
+
+
+def index_advanced(db, invoice_id):
+    _reindex(db, "advanced", invoice_id)
+
+
+def unindex(db, kind, ref_ids):
+    try:
+        if backend(db) == "fts5":
+            remove(kind, ref_ids)
+    except Exception as e:
+        print(f"[WARN] Could not remove {kind} {list(ref_ids)} from the search index: {e}")
+
+
+def rebuild(db):
+    """
+    Re-read every saved invoice into the FTS5 index, BATCH invoices at a time. Saves wait
+    meanwhile (core/rebuild_gate.py), so no batch overwrites a newer save with what it read.
+    """
+    with rebuild_gate.rebuilding():
+        return _rebuild(db)
+
+
+def _rebuild(db):
+    started = time.time()
+    with _index() as conn:
+        conn.execute("DELETE FROM documents")
+        conn.execute("DELETE FROM meta WHERE key = 'built_at'")
+    counts = {}
+    for kind in KINDS:
+        column, last, counts[kind] = _id_column(kind), None, 0
+        while True:
+            query = db.query(column)
+            if last is not None:
+                query = query.filter(column > last)
+            ids = [row[0] for row in query.order_by(column).limit(BATCH).all()]
+            if not ids:
+                break
+            documents = LOADERS[kind](db, lambda column: column.between(ids[0], ids[-1]))
+            upsert(documents)
+            counts[kind] += len(documents)
+            last = ids[-1]
+    with _index() as conn:
+        conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('built_at', ?)", (str(time.time()),))
+        conn.execute("INSERT INTO documents(documents) VALUES ('optimize')")
+    print(f"[INFO] Search index rebuilt: {counts} in {time.time() - started:.1f}s")
+    return counts
+
+
+def _build_if_missing(session_factory):
+    db = session_factory()
+    try:
+        if backend(db) != "fts5":
+            return
+        with _index() as conn:
+            built = conn.execute("SELECT 1 FROM meta WHERE key = 'built_at'").fetchone()
+        if not built:
+            rebuild(db)
+    except Exception as e:
+        print(f"[WARN] Search index build failed: {e}")
+    finally:
+        db.close()
+
+
+def start(session_factory):
+    """Build the FTS5 index in a daemon thread on first start (searches meanwhile see partial results)."""
+    global _build_thread
+    if _build_thread and _build_thread.is_alive():
+        return
+    _build_thread = threading.Thread(target=_build_if_missing, args=(session_factory,), name="search-index", daemon=True)
+    _build_thread.start()
+
+
+# ------------------------------
+# Search
+# ------------------------------
+def _terms(query):
+    return re.findall(r"\w+", query.lower())[:MAX_TERMS]
+
+
+def _hit(kind, ref_id, number, vendor, gstin, date, total, score):
+    return {
+        "kind": kind,
+        "id": int(ref_id),
+        "invoice_number": number,
+        "vendor_name": (vendor or "").split("\n")[0],
+        "gstin": gstin,
+        "date": date,
+        "total": total,
+        "score": round(float(score), 4) if score is not None else None,
+    }
+
+
+def _search_fts5(terms, kind, offset, limit):
+    # Every term must match, each as a prefix ("29aab" finds the GSTIN, "cab" finds "cable");
+    # the kind is an indexed column so filtering on it stays inside the full-text lookup
+    match = " ".join(f'"{term}"*' for term in terms)
+    if kind:
+        match = f"kind:{kind} {match}"
+    with _index() as conn:
+        total = conn.execute("SELECT count(*) FROM documents WHERE documents MATCH ?", (match,)).fetchone()[0]
+        ranked = conn.execute(
+            "SELECT rowid, rank FROM documents WHERE documents MATCH ? ORDER BY rank LIMIT ? OFFSET ?",
+            (match, limit, offset),
+        ).fetchall()
+        # Stored columns of the page of hits only, by rowid
+        rows = {r["rowid"]: r for r in conn.execute(
+            f"SELECT rowid, kind, ref_id, number, vendor, gstin, date, total FROM documents "
+            f"WHERE rowid IN ({', '.join('?' * len(ranked))})", [r["rowid"] for r in ranked],
+        )} if ranked else {}
+    # bm25 is lower-is-better; report it as a positive score
+    hits = []
+    for rowid, rank in ranked:
+        r = rows[rowid]
+        hits.append(_hit(r["kind"], r["ref_id"], r["number"], r["vendor"], r["gstin"], r["date"], r["total"], -rank))
+    return total, hits
+
+
+def _search_mssql(db, terms, kind, offset, limit):
+    # Every term must match, each as a prefix, like _search_fts5
+    sql = MSSQL_SEARCH.format(hits="\n    UNION ALL".join(MSSQL_TERM_HITS.format(n=n) for n in range(len(terms))))
+    params = {f"q{n}": f'"{term}*"' for n, term in enumerate(terms)}
+    params.update({"kind": kind, "terms": len(terms), "offset": offset, "limit": limit})
+    rows = db.execute(text(sql), params).all()
+    total = rows[0].total if rows else 0
+
+    found = {}
+    for kind_name in KINDS:
+        ids = [row.ref_id for row in rows if row.kind == kind_name]
+        if ids:
+            for document in LOADERS[kind_name](db, lambda column: column.in_(ids)):
+                found[(kind_name, document["ref_id"])] = document
+    hits = []
+    for row in rows:
+        d = found.get((row.kind, row.ref_id))
+        if d:
+            hits.append(_hit(row.kind, row.ref_id, d["number"], d["vendor"], d["gstin"], d["date"], d["total"], row.score))
+    return total, hits
+
+
+def search(db, query, kind=None, page=1, per_page=20):
+    """Ranked hits for `query` -> (total, hits, backend)."""
+    terms = _terms(query)
+    if not terms:
+        return 0, [], backend(db)
+    offset = (page - 1) * per_page
+    if backend(db) == "mssql":
+        total, hits = _search_mssql(db, terms, kind, offset, per_page)
+    else:
+        total, hits = _search_fts5(terms, kind, offset, per_page)
+    return total, hits, backend(db)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maintain the invoice search index.")
+    parser.add_argument("--rebuild", action="store_true", help="Rebuild the SQLite FTS5 index from the database")
+    parser.add_argument("--mssql-ddl", action="store_true", help="Print the SQL Server full-text index DDL")
+    args = parser.parse_args(argv)
+    if args.mssql_ddl:
+        print(MSSQL_FULLTEXT_DDL)
+    if args.rebuild:
+        from core.database import SessionLocal
+        db = SessionLocal()
+        try:
+            rebuild(db)
+        finally:
+            db.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,152 @@
+# Static asset build and serving
+#
+# `python -m core.static_assets` copies every JS/CSS file under STATIC_DIR to
+# STATIC_DIR/dist/<path>.<content hash>.<ext>, next to .gz (and .br when the brotli
+# package is installed) precompressed variants, and writes dist/manifest.json. Absolute
+# `/static/...` imports inside the JS are rewritten to the hashed names so a module is
+# never loaded under two URLs. Templates call asset("js/home.js"), which returns the
+# hashed URL when the manifest lists it and the plain /static URL otherwise (e.g. in a
+# checkout where the build step has not run). Hashed files never change, so they are
+# served with a one-year immutable Cache-Control.
+import gzip
+import hashlib
+import json
+import os
+import re
+import shutil
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import StaticFiles
+
+from core.compression import accepted_encodings
+from core.config import STATIC_DIR
+
+DIST_DIR = STATIC_DIR / "dist"
+MANIFEST_PATH = DIST_DIR / "manifest.json"
+ASSET_EXTENSIONS = (".js", ".css")
+# Variants written by build(), in order of preference
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are built without it
+    brotli = None
+
+_IMPORT = re.compile(r"""(['"])/static/([\w./-]+\.(?:js|css))\1""")
+_manifest = None
+
+
+# ------------------------------
+# Build
+# ------------------------------
+def _sources():
+    for root, dirs, files in os.walk(STATIC_DIR):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != str(DIST_DIR)]
+        for name in files:
+            if name.endswith(ASSET_EXTENSIONS):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, STATIC_DIR).replace(os.sep, "/")
+
+
+def _rewrite_imports(text, manifest):
+    return _IMPORT.sub(
+        lambda m: f"{m.group(1)}/static/{manifest[m.group(2)]}{m.group(1)}" if m.group(2) in manifest else m.group(0),
+        text,
+    )
+
+
+def _write_variants(target, data):
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_bytes(data)
+    # mtime=0 keeps the .gz bytes identical across builds of the same content
+    target.with_name(target.name + ".gz").write_bytes(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        target.with_name(target.name + ".br").write_bytes(brotli.compress(data, quality=11))
+
+
+def build():
+    """Write hashed, precompressed copies of the static JS/CSS and return the manifest."""
+    if DIST_DIR.exists():
+        shutil.rmtree(DIST_DIR)
+    sources = {rel: (STATIC_DIR / rel).read_text(encoding="utf-8") for rel in _sources()}
+
+    # Hash a file only once the files it imports have their final names
+    manifest, pending = {}, dict(sources)
+    while pending:
+        ready = [rel for rel, text in pending.items()
+                 if all(dep in manifest or dep not in sources or dep == rel for dep in
+                        (m.group(2) for m in _IMPORT.finditer(text)))]
+        if not ready:
+            ready = list(pending)  # import cycle: leave the remaining references unhashed
+        for rel in ready:
+            data = _rewrite_imports(pending.pop(rel), manifest).encode("utf-8")
+            stem, ext = os.path.splitext(rel)
+            hashed = f"dist/{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+            _write_variants(STATIC_DIR / hashed, data)
+            manifest[rel] = hashed
+
+    MANIFEST_PATH.write_text(json.dumps(manifest, indent=2, sort_keys=True), encoding="utf-8")
+    return manifest
+
+
+# ------------------------------
+# Serving
+# ------------------------------
+def manifest():
+    global _manifest
+    if _manifest is None:
+        try:
+            _manifest = json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            _manifest = {}
+    return _manifest
+
+
+def asset(path):
+    """URL of a static asset for templates, e.g. asset("js/home.js")."""
+    return f"/static/{manifest().get(path, path)}"
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """
+    StaticFiles that answers with a .br/.gz sibling when the client accepts it, and
+    marks content-hashed files under dist/ as immutable.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        full_path = str(full_path)
+        request_headers = Headers(scope=scope)
+        # Parsed like the compression middleware does, so "gzip;q=0" refuses gzip
+        accepted = accepted_encodings(request_headers.get("accept-encoding", ""))
+        response = None
+        if full_path.endswith(ASSET_EXTENSIONS):
+            for encoding, suffix in ENCODINGS:
+                variant = full_path + suffix
+                if encoding in accepted and os.path.isfile(variant):
+                    response = FileResponse(
+                        variant, status_code=status_code, stat_result=os.stat(variant),
+                        media_type=FileResponse(full_path).media_type,
+                        headers={"Content-Encoding": encoding},
+                    )
+                    break
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result)
+        if full_path.endswith(ASSET_EXTENSIONS):
+            response.headers["Vary"] = "Accept-Encoding"
+        hashed = os.path.realpath(full_path).startswith(os.path.realpath(DIST_DIR) + os.sep)
+        response.headers["Cache-Control"] = IMMUTABLE if hashed else REVALIDATE
+
+        if self.is_not_modified(response.headers, request_headers):
+            return Response(status_code=304, headers={
+                k: v for k, v in response.headers.items()
+                if k in ("etag", "last-modified", "cache-control", "vary")
+            })
+        return response
+
+
+if __name__ == "__main__":
+    built = build()
+    print(f"[INFO] Built {len(built)} static assets into {DIST_DIR} (brotli: {'yes' if brotli else 'no'})")
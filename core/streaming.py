@@ -0,0 +1,63 @@
+# Cursor pagination and streamed listings
+#
+# Listings that can grow without bound (/invoices, /invoices/history) page by key instead of
+# by offset: a page ends with an opaque cursor for its last key, and the next page seeks past
+# it through the index, so page 10,000 costs the same as page 1. Whole listings are streamed:
+# the rows are read with Query.yield_per, so the driver hands them over in batches of
+# STREAM_BATCH_SIZE and only one batch is in memory however large the table is. The stream
+# owns its session, because the request's session is closed before the body is sent.
+import base64
+import json
+
+from core.config import STREAM_BATCH_SIZE
+from core.database import SessionLocal
+
+NDJSON = "application/x-ndjson"
+
+
+def encode_cursor(value):
+    """Opaque, URL-safe cursor for the last key of a page."""
+    raw = json.dumps(value, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, kind=str):
+    """The key in a cursor from encode_cursor; ValueError if it is malformed or not a `kind`."""
+    try:
+        value = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("Invalid cursor")
+    if not isinstance(value, kind) or isinstance(value, bool):
+        raise ValueError("Invalid cursor")
+    return value
+
+
+def rows(fetch, serialise, *args, **kwargs):
+    """
+    Serialised rows of `fetch(db, *args, **kwargs)` (a query or generator using yield_per),
+    read in a session of their own that is closed when the stream ends or is abandoned.
+    """
+    db = SessionLocal()
+    try:
+        for row in fetch(db, *args, **kwargs):
+            yield serialise(row)
+    except Exception as e:
+        # The status line has been sent: the client only sees the body end early
+        print(f"[WARN] Streamed listing stopped: {e}")
+        raise
+    finally:
+        db.close()
+
+
+def ndjson(items):
+    """One JSON document per line."""
+    for item in items:
+        yield json.dumps(item, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+def json_array(items):
+    """A JSON array written element by element."""
+    yield b"["
+    for n, item in enumerate(items):
+        yield (b"," if n else b"") + json.dumps(item, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    yield b"]"
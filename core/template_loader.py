@@ -40,4 +40,24 @@ def detect_template(text, templates):
                     break
             if all_match:
                 return tpl
-    return None
\ No newline at end of file
+    return None
+
+def ocr_regions(vendor, template_dir=YML_TEMPLATE_DIR):
+    """
+    Bounding regions declared under `ocr_regions:` in the vendor's template, as
+    {field: (x0, top, x1, bottom)} in fractions of the page width/height (0-1).
+    Used by the OCR fallback to crop only where a header field is printed.
+    """
+    tpl = next((t for t in load_templates(template_dir) if t and t.get('vendor') == vendor), None)
+    regions = {}
+    for field, box in ((tpl or {}).get('ocr_regions') or {}).items():
+        try:
+            x0, top, x1, bottom = (float(v) for v in box)
+        except (TypeError, ValueError):
+            print(f"[WARN] Ignoring OCR region for {field} in {vendor} template: {box!r}")
+            continue
+        if not (0 <= x0 < x1 <= 1 and 0 <= top < bottom <= 1):
+            print(f"[WARN] Ignoring OCR region for {field} in {vendor} template: {box!r}")
+            continue
+        regions[field] = (x0, top, x1, bottom)
+    return regions
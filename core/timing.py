@@ -0,0 +1,94 @@
+# Per-stage timing for the invoice extraction pipeline
+import time
+from contextlib import contextmanager
+
+from core import metrics
+
+# ------------------------------
+# Page-count bands used as a histogram label
+# ------------------------------
+PAGE_BANDS = ((1, "1"), (5, "2-5"), (20, "6-20"))
+
+
+def page_band(page_count):
+    """Collapse a page count into a small set of labels so histograms stay bounded."""
+    if not page_count:
+        return "unknown"
+    for limit, label in PAGE_BANDS:
+        if page_count <= limit:
+            return label
+    return "21+"
+
+
+class ExtractionTimer:
+    """
+    Collects monotonic spans for each stage of one extraction run.
+    Stages are recorded in the order they finish; a stage that runs twice is summed.
+    """
+
+    def __init__(self, mode=None):
+        self.mode = mode
+        self.vendor = None
+        self.page_count = None
+        self.spans = []
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans.append((name, (time.perf_counter() - start) * 1000.0))
+
+    def stages(self):
+        totals = {}
+        for name, duration in self.spans:
+            totals[name] = totals.get(name, 0.0) + duration
+        return totals
+
+    def total_ms(self):
+        return (time.perf_counter() - self._started) * 1000.0
+
+    def as_dict(self):
+        return {
+            "vendor": self.vendor,
+            "mode": self.mode,
+            "pages": self.page_count,
+            "total_ms": round(self.total_ms(), 2),
+            "stages": {name: round(ms, 2) for name, ms in self.stages().items()},
+        }
+
+    def server_timing(self):
+        """Render the spans as a `Server-Timing` header value."""
+        parts = [f"{name};dur={ms:.1f}" for name, ms in self.stages().items()]
+        parts.append(f"total;dur={self.total_ms():.1f}")
+        return ", ".join(parts)
+
+
+# ------------------------------
+# Process-wide aggregation (shared with the /metrics registry)
+# ------------------------------
+def record(timer):
+    """Fold a finished timer into the per-(stage, vendor, mode, pages) histogram."""
+    labels = {
+        "vendor": timer.vendor or "unknown",
+        "mode": timer.mode or "unknown",
+        "pages": page_band(timer.page_count),
+    }
+    for stage, duration in list(timer.stages().items()) + [("total", timer.total_ms())]:
+        metrics.EXTRACTION_STAGE_SECONDS.observe(duration / 1000.0, stage=stage, **labels)
+
+
+def snapshot():
+    """Return a JSON-friendly copy of the aggregated histograms, in milliseconds."""
+    bucket_labels = [f"le_{int(b * 1000)}" for b in metrics.EXTRACTION_STAGE_SECONDS.buckets] + ["le_inf"]
+    result = []
+    for labels, counts, total, count in metrics.EXTRACTION_STAGE_SECONDS.series():
+        result.append({
+            **labels,
+            "count": count,
+            "avg_ms": round(total * 1000.0 / count, 2) if count else 0.0,
+            "buckets": dict(zip(bucket_labels, counts)),
+        })
+    return result
@@ -0,0 +1,650 @@
+# Content-addressed store for uploaded documents
+#
+# Every unique document is written once to UPLOAD_STORE_DIR/blobs/<aa>/<bb>/<sha256>.
+# The name the rest of the app works with (UPLOADS_DIR/<name>) is a hard link to that
+# blob (a copy where the filesystem cannot link), and a small SQLite index keeps the
+# name -> hash aliases plus a reference count per blob. The aliases table doubles as the
+# upload catalog behind /list-docs (size, upload time, extension, extraction status).
+import hashlib
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+
+from core import metrics
+from core.config import UPLOADS_DIR, UPLOAD_STORE_DIR, MAX_UPLOAD_SIZE
+
+CHUNK_SIZE = 1024 * 1024
+BLOB_DIR = UPLOAD_STORE_DIR / "blobs"
+TMP_DIR = UPLOAD_STORE_DIR / "tmp"
+PARTIAL_DIR = UPLOAD_STORE_DIR / "partial"
+INDEX_PATH = UPLOAD_STORE_DIR / "index.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS blobs (
+    hash TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    refcount INTEGER NOT NULL DEFAULT 0,
+    created_at TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    name TEXT PRIMARY KEY,
+    hash TEXT NOT NULL REFERENCES blobs(hash),
+    original_name TEXT,
+    size INTEGER NOT NULL,
+    uploaded_at TEXT NOT NULL,
+    ext TEXT,
+    status TEXT NOT NULL DEFAULT 'uploaded',
+    status_updated_at TEXT
+);
+CREATE TABLE IF NOT EXISTS partial_uploads (
+    upload_id TEXT PRIMARY KEY,
+    filename TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    checksum TEXT,
+    created_at TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Resumable uploads: largest accepted PUT body, and how long an idle upload is kept
+MAX_CHUNK_SIZE = 16 * 1024 * 1024
+PARTIAL_UPLOAD_TTL = 24 * 3600
+
+# Columns added after the first release of the index, with their DDL
+CATALOG_COLUMNS = {
+    "ext": "ext TEXT",
+    "status": "status TEXT NOT NULL DEFAULT 'uploaded'",
+    "status_updated_at": "status_updated_at TEXT",
+}
+
+INDEXES = """
+CREATE INDEX IF NOT EXISTS ix_aliases_hash ON aliases(hash);
+CREATE INDEX IF NOT EXISTS ix_aliases_uploaded_at ON aliases(uploaded_at);
+CREATE INDEX IF NOT EXISTS ix_aliases_ext_uploaded_at ON aliases(ext, uploaded_at);
+CREATE INDEX IF NOT EXISTS ix_aliases_status_uploaded_at ON aliases(status, uploaded_at);
+CREATE INDEX IF NOT EXISTS ix_aliases_original_name ON aliases(original_name);
+"""
+
+# /list-docs type filter -> extensions
+FILE_TYPES = {
+    "pdf": ("pdf",),
+    "images": ("jpg", "jpeg", "png"),
+    "documents": ("doc", "docx", "txt"),
+}
+
+# Catalog sort keys (API name -> column); anything else falls back to upload time
+SORT_COLUMNS = {
+    "uploadedOn": "uploaded_at",
+    "name": "name",
+    "originalName": "original_name",
+    "size": "size",
+    "status": "status",
+}
+
+# Derived files written next to uploads (OCR output) are not listed as uploads
+DERIVED_SUFFIXES = ("_textpdf.pdf",)
+
+# Serialises blob commits and alias/refcount changes; blob bytes are written outside the lock
+_lock = threading.RLock()
+_initialized = False
+_synced = False
+
+
+def _migrate(conn):
+    """Add catalog columns to an index created before they existed, then build the indexes."""
+    existing = {row["name"] for row in conn.execute("PRAGMA table_info(aliases)")}
+    for column, ddl in CATALOG_COLUMNS.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE aliases ADD COLUMN {ddl}")
+    rows = conn.execute("SELECT name FROM aliases WHERE ext IS NULL").fetchall()
+    conn.executemany("UPDATE aliases SET ext = ? WHERE name = ?", [(_ext(r["name"]), r["name"]) for r in rows])
+    conn.executescript(INDEXES)
+
+
+@contextmanager
+def _db():
+    """Short-lived connection per operation; commits on success."""
+    global _initialized
+    if not _initialized:
+        UPLOAD_STORE_DIR.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(INDEX_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        if not _initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            _migrate(conn)
+            conn.commit()
+            _initialized = True
+        yield conn
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+# ------------------------------
+# Helpers
+# ------------------------------
+def sanitize_filename(filename):
+    return filename.strip().replace(" ", "_").replace("/", "_").replace("\\", "_")
+
+
+def _ext(name):
+    return os.path.splitext(name)[1].lstrip(".").lower()
+
+
+def blob_path(digest):
+    return BLOB_DIR / digest[:2] / digest[2:4] / digest
+
+
+def hash_file(path):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def _link(source, target):
+    """Hard-link target to source, falling back to a copy (FAT volumes, other devices)."""
+    if os.path.lexists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def _write_blob(fileobj):
+    """Stream fileobj into a temp file while hashing it. Returns (hash, size, temp path)."""
+    TMP_DIR.mkdir(parents=True, exist_ok=True)
+    sha = hashlib.sha256()
+    size = 0
+    fd, tmp_path = tempfile.mkstemp(dir=TMP_DIR)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            for chunk in iter(lambda: fileobj.read(CHUNK_SIZE), b""):
+                sha.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+        return sha.hexdigest(), size, tmp_path
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _commit_blob(path, digest):
+    """
+    Move a fully written file into the blob store. Returns True if the blob already existed.
+    Call under _lock, so a release() cannot delete the existing blob before it is linked.
+    """
+    target = blob_path(digest)
+    if target.exists():
+        os.remove(path)
+        return True
+    target.parent.mkdir(parents=True, exist_ok=True)
+    os.replace(path, target)
+    # A resumable upload's file keeps the time of its last chunk; date the blob from now
+    os.utime(target)
+    return False
+
+
+def _register(conn, name, digest, size, original_name, uploaded_at=None):
+    conn.execute(
+        "INSERT INTO blobs (hash, size, refcount, created_at) VALUES (?, ?, 1, ?) "
+        "ON CONFLICT(hash) DO UPDATE SET refcount = refcount + 1",
+        (digest, size, datetime.now().isoformat()),
+    )
+    conn.execute(
+        "INSERT OR REPLACE INTO aliases (name, hash, original_name, size, uploaded_at, ext) VALUES (?, ?, ?, ?, ?, ?)",
+        (name, digest, original_name, size, uploaded_at or datetime.now().isoformat(), _ext(name)),
+    )
+
+
+def _adopt(conn, name, path):
+    """Bring a file written before the store existed under its management."""
+    digest = hash_file(path)
+    blob = blob_path(digest)
+    if not blob.exists():
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        _link(path, blob)
+    uploaded_at = datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+    _register(conn, name, digest, os.path.getsize(path), name, uploaded_at)
+    return digest
+
+
+def _is_plain_name(name):
+    return bool(name) and name not in (".", "..") and os.path.basename(name) == name and "\\" not in name
+
+
+def _alias_hash(conn, name):
+    if not _is_plain_name(name):
+        return None
+    row = conn.execute("SELECT hash FROM aliases WHERE name = ?", (name,)).fetchone()
+    if row:
+        return row["hash"]
+    path = UPLOADS_DIR / name
+    if path.is_file():
+        return _adopt(conn, name, path)
+    return None
+
+
+# ------------------------------
+# Public API
+# ------------------------------
+def _add_alias(filename, digest, size, path):
+    """Commit the written file at `path` as blob `digest` and give it a name, in one locked step."""
+    name = sanitize_filename(filename)
+
+    with _lock, _db() as conn:
+        already_stored = _commit_blob(path, digest)
+        current = _alias_hash(conn, name)
+        if current is not None and current != digest:
+            stem, ext = os.path.splitext(name)
+            for length in (8, 16, 64):
+                name = f"{stem}_{digest[:length]}{ext}"
+                current = _alias_hash(conn, name)
+                if current is None or current == digest:
+                    break
+            else:
+                raise FileExistsError(f"Could not find a free name for {filename}")
+
+        if current is None:
+            _link(blob_path(digest), UPLOADS_DIR / name)
+            _register(conn, name, digest, size, filename)
+
+    metrics.cache_lookup("upload_store", already_stored)
+    return {
+        "name": name,
+        "original_name": filename,
+        "hash": digest,
+        "size": size,
+        "deduplicated": already_stored,
+    }
+
+
+def put(fileobj, filename):
+    """
+    Store an uploaded file and return {name, original_name, hash, size, deduplicated}.
+    Re-uploading identical content under the same name is a no-op; a different document
+    arriving under a name that is already taken gets a hash-suffixed name instead of
+    overwriting the existing one.
+    """
+    digest, size, tmp_path = _write_blob(fileobj)
+    try:
+        return _add_alias(filename, digest, size, tmp_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _release(conn, name):
+    row = conn.execute("SELECT hash FROM aliases WHERE name = ?", (name,)).fetchone()
+    if not row:
+        return False
+    digest = row["hash"]
+    conn.execute("DELETE FROM aliases WHERE name = ?", (name,))
+    conn.execute("UPDATE blobs SET refcount = refcount - 1 WHERE hash = ?", (digest,))
+    remaining = conn.execute("SELECT refcount FROM blobs WHERE hash = ?", (digest,)).fetchone()
+    if remaining is None or remaining["refcount"] <= 0:
+        conn.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+        if blob_path(digest).exists():
+            os.remove(blob_path(digest))
+
+    alias_path = UPLOADS_DIR / name
+    if alias_path.exists():
+        os.remove(alias_path)
+    return True
+
+
+def release(name):
+    """
+    Drop the alias `name`, deleting the blob once nothing references it.
+    Returns False if the name is not known to the store.
+    """
+    if not _is_plain_name(name):
+        return False
+    with _lock, _db() as conn:
+        return _release(conn, name)
+
+
+def content_hash(name):
+    """SHA-256 of the document stored as `name` (None if there is no such upload)."""
+    with _lock, _db() as conn:
+        return _alias_hash(conn, name)
+
+
+# ------------------------------
+# Resumable (chunked) uploads
+# ------------------------------
+class UploadNotFound(LookupError):
+    pass
+
+
+class OffsetMismatch(ValueError):
+    """The client's offset disagrees with what the server holds; `offset` is the server's."""
+
+    def __init__(self, offset, message=None):
+        super().__init__(message or f"Expected offset {offset}")
+        self.offset = offset
+
+
+class ChecksumMismatch(ValueError):
+    pass
+
+
+# Uploads with a PUT in progress; a second concurrent PUT is rejected
+_busy = set()
+
+
+def _partial_path(upload_id):
+    # Upload ids come from the client; only ever accept the uuid4 hex we hand out
+    if not isinstance(upload_id, str) or len(upload_id) != 32 or not all(c in "0123456789abcdef" for c in upload_id):
+        raise UploadNotFound(upload_id)
+    return PARTIAL_DIR / f"{upload_id}.part"
+
+
+def _expire_partial_uploads(conn, dry_run=False):
+    """Drop resumable uploads idle for longer than PARTIAL_UPLOAD_TTL; returns [(path, size)]."""
+    cutoff = time.time() - PARTIAL_UPLOAD_TTL
+    expired = []
+    for row in conn.execute("SELECT upload_id FROM partial_uploads WHERE updated_at < ?", (cutoff,)).fetchall():
+        if row["upload_id"] in _busy:
+            continue
+        path = _partial_path(row["upload_id"])
+        expired.append((path, path.stat().st_size if path.exists() else 0))
+        if dry_run:
+            continue
+        conn.execute("DELETE FROM partial_uploads WHERE upload_id = ?", (row["upload_id"],))
+        if path.exists():
+            os.remove(path)
+    return expired
+
+
+def begin_upload(filename, size, checksum=None):
+    """Start a resumable upload of `size` bytes; returns its state (see upload_state)."""
+    if not filename or not sanitize_filename(filename):
+        raise ValueError("No filename provided")
+    if size < 0 or size > MAX_UPLOAD_SIZE:
+        raise ValueError(f"Upload size must be between 0 and {MAX_UPLOAD_SIZE} bytes")
+
+    upload_id = uuid.uuid4().hex
+    PARTIAL_DIR.mkdir(parents=True, exist_ok=True)
+    _partial_path(upload_id).touch()
+    with _lock, _db() as conn:
+        _expire_partial_uploads(conn)
+        conn.execute(
+            "INSERT INTO partial_uploads (upload_id, filename, size, checksum, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (upload_id, filename, size, checksum.lower() if checksum else None,
+             datetime.now().isoformat(), time.time()),
+        )
+    return upload_state(upload_id)
+
+
+def upload_state(upload_id):
+    """{upload_id, filename, size, offset, chunk_size}; the offset is what has been received so far."""
+    path = _partial_path(upload_id)
+    with _db() as conn:
+        row = conn.execute("SELECT * FROM partial_uploads WHERE upload_id = ?", (upload_id,)).fetchone()
+    if not row or not path.exists():
+        raise UploadNotFound(upload_id)
+    return {
+        "upload_id": upload_id,
+        "filename": row["filename"],
+        "size": row["size"],
+        "checksum": row["checksum"],
+        "offset": os.path.getsize(path),
+        "chunk_size": MAX_CHUNK_SIZE,
+    }
+
+
+class _ChunkWriter:
+    def __init__(self, f, limit):
+        self._f = f
+        self._limit = limit
+        self.written = 0
+
+    def write(self, data):
+        if self.written + len(data) > self._limit:
+            raise ValueError(f"Chunk exceeds the remaining upload size or {MAX_CHUNK_SIZE} bytes")
+        self._f.write(data)
+        self.written += len(data)
+
+
+@contextmanager
+def open_chunk(upload_id, offset):
+    """
+    Append one chunk at `offset`. Yields a writer; bytes written before a failure are
+    kept, so the client resumes from the offset reported by upload_state.
+    """
+    state = upload_state(upload_id)
+    if offset != state["offset"]:
+        raise OffsetMismatch(state["offset"])
+    with _lock:
+        if upload_id in _busy:
+            raise OffsetMismatch(state["offset"], "Another chunk for this upload is in progress")
+        _busy.add(upload_id)
+    try:
+        with open(_partial_path(upload_id), "r+b") as f:
+            f.seek(offset)
+            yield _ChunkWriter(f, min(MAX_CHUNK_SIZE, state["size"] - offset))
+    finally:
+        with _lock:
+            _busy.discard(upload_id)
+        with _db() as conn:
+            conn.execute("UPDATE partial_uploads SET updated_at = ? WHERE upload_id = ?", (time.time(), upload_id))
+
+
+def finish_upload(upload_id, checksum=None):
+    """Verify a completed upload and move it into the store; returns the same dict as put()."""
+    state = upload_state(upload_id)
+    if state["offset"] != state["size"]:
+        raise OffsetMismatch(state["offset"], f"Upload incomplete: {state['offset']} of {state['size']} bytes received")
+
+    path = _partial_path(upload_id)
+    digest = hash_file(path)
+    expected = (checksum or state["checksum"] or "").lower()
+    if expected and expected != digest:
+        abort_upload(upload_id)
+        raise ChecksumMismatch(f"Checksum mismatch: expected {expected}, got {digest}")
+
+    stored = _add_alias(state["filename"], digest, state["size"], path)
+    with _lock, _db() as conn:
+        conn.execute("DELETE FROM partial_uploads WHERE upload_id = ?", (upload_id,))
+    return stored
+
+
+def abort_upload(upload_id):
+    path = _partial_path(upload_id)
+    with _lock, _db() as conn:
+        deleted = conn.execute("DELETE FROM partial_uploads WHERE upload_id = ?", (upload_id,)).rowcount
+    if path.exists():
+        os.remove(path)
+        deleted = deleted or 1
+    return bool(deleted)
+
+
+# ------------------------------
+# Upload catalog
+# ------------------------------
+def sync():
+    """
+    Reconcile the catalog with UPLOADS_DIR: adopt files copied in by hand (or written
+    before the store existed) and drop entries whose file was removed outside the app.
+    Runs once per process, before the first listing.
+    """
+    global _synced
+    with _lock, _db() as conn:
+        on_disk = {
+            entry.name for entry in os.scandir(UPLOADS_DIR)
+            if entry.is_file() and not entry.name.startswith(".") and not entry.name.endswith(DERIVED_SUFFIXES)
+        }
+        known = {row["name"] for row in conn.execute("SELECT name FROM aliases")}
+        for name in sorted(on_disk - known):
+            _adopt(conn, name, UPLOADS_DIR / name)
+        for name in known - on_disk:
+            if not (UPLOADS_DIR / name).exists():
+                _release(conn, name)
+        if on_disk - known:
+            print(f"[INFO] Upload catalog adopted {len(on_disk - known)} existing files")
+        _synced = True
+
+
+def set_status(name, status):
+    """Record the extraction status (e.g. extracted/failed) of an upload."""
+    with _lock, _db() as conn:
+        conn.execute(
+            "UPDATE aliases SET status = ?, status_updated_at = ? WHERE name = ?",
+            (status, datetime.now().isoformat(), name),
+        )
+
+
+def _local_iso(value):
+    # Upload times are stored as naive local ISO strings; compare like with like
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return value.isoformat()
+
+
+def list_uploads(page=None, per_page=50, extensions=None, status=None, search=None,
+                 uploaded_from=None, uploaded_to=None, sort="uploadedOn", order="desc"):
+    """
+    Query the catalog. Returns (rows, total); rows are dicts shaped like the
+    /list-docs items. Without `page` every matching row is returned.
+    """
+    if not _synced:
+        sync()
+
+    where, params = [], []
+    if extensions:
+        where.append(f"ext IN ({', '.join('?' * len(extensions))})")
+        params.extend(extensions)
+    if status:
+        where.append("status = ?")
+        params.append(status)
+    if search:
+        where.append("(name LIKE ? ESCAPE '\\' OR original_name LIKE ? ESCAPE '\\')")
+        pattern = "%" + search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        params.extend([pattern, pattern])
+    if uploaded_from:
+        where.append("uploaded_at >= ?")
+        params.append(_local_iso(uploaded_from))
+    if uploaded_to:
+        where.append("uploaded_at < ?")
+        params.append(_local_iso(uploaded_to))
+    where_sql = f" WHERE {' AND '.join(where)}" if where else ""
+
+    column = SORT_COLUMNS.get(sort, "uploaded_at")
+    direction = "ASC" if str(order).lower() == "asc" else "DESC"
+    sql = (f"SELECT name, original_name, size, uploaded_at, hash, status FROM aliases{where_sql} "
+           f"ORDER BY {column} {direction}, name {direction}")
+    query_params = list(params)
+    if page:
+        sql += " LIMIT ? OFFSET ?"
+        query_params.extend([per_page, (page - 1) * per_page])
+
+    with _db() as conn:
+        rows = conn.execute(sql, query_params).fetchall()
+        if page:
+            total = conn.execute(f"SELECT COUNT(*) FROM aliases{where_sql}", params).fetchone()[0]
+        else:
+            total = len(rows)
+
+    return [
+        {
+            "name": row["name"],
+            "originalName": row["original_name"] or row["name"],
+            "size": row["size"],
+            "uploadedOn": row["uploaded_at"],
+            "hash": row["hash"],
+            "status": row["status"],
+        }
+        for row in rows
+    ], total
+
+
+def catalog_entries():
+    """(name, size, upload timestamp) of every upload in the catalog."""
+    if not _synced:
+        sync()
+    with _db() as conn:
+        rows = conn.execute("SELECT name, size, uploaded_at FROM aliases").fetchall()
+    return [(row["name"], row["size"], datetime.fromisoformat(row["uploaded_at"]).timestamp()) for row in rows]
+
+
+# ------------------------------
+# Garbage collection
+# ------------------------------
+STALE_TMP_AGE = 3600  # seconds; temp files of interrupted uploads
+
+
+def _files(folder):
+    for root, _, files in os.walk(folder):
+        for name in files:
+            path = os.path.join(root, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            yield path, st.st_size, st.st_mtime
+
+
+def collect_garbage(dry_run=False):
+    """
+    Find what the index no longer accounts for: blobs no alias points to, blob files
+    without an index row, temp files left by interrupted uploads and expired or
+    untracked resumable uploads. Unless dry_run, delete them and recount blob
+    references. Returns [{"path", "size", "reason"}].
+    """
+    found = []
+
+    def drop(path, size, reason):
+        found.append({"path": str(path), "size": size, "reason": reason})
+        if not dry_run and os.path.exists(path):
+            os.remove(path)
+
+    with _lock, _db() as conn:
+        referenced = {row["hash"] for row in conn.execute("SELECT DISTINCT hash FROM aliases")}
+        known = set()
+        for row in conn.execute("SELECT hash, size FROM blobs").fetchall():
+            if row["hash"] in referenced:
+                known.add(row["hash"])
+                continue
+            if not dry_run:
+                conn.execute("DELETE FROM blobs WHERE hash = ?", (row["hash"],))
+            drop(blob_path(row["hash"]), row["size"], "unreferenced blob")
+        if not dry_run:
+            conn.execute(
+                "UPDATE blobs SET refcount = (SELECT COUNT(*) FROM aliases WHERE aliases.hash = blobs.hash)"
+            )
+
+        # A blob is moved into place before its alias is registered: only an old one is orphaned
+        cutoff = time.time() - STALE_TMP_AGE
+        listed = {item["path"] for item in found}
+        for path, size, mtime in _files(BLOB_DIR):
+            if os.path.basename(path) not in known and path not in listed and mtime < cutoff:
+                drop(path, size, "blob without index entry")
+
+        for path, size, mtime in _files(TMP_DIR):
+            if mtime < cutoff:
+                drop(path, size, "stale temp file")
+
+        for path, size in _expire_partial_uploads(conn, dry_run=dry_run):
+            found.append({"path": str(path), "size": size, "reason": "expired resumable upload"})
+        tracked = {row["upload_id"] for row in conn.execute("SELECT upload_id FROM partial_uploads")}
+        for path, size, mtime in _files(PARTIAL_DIR):
+            upload_id = os.path.basename(path).removesuffix(".part")
+            if upload_id not in tracked and upload_id not in _busy and mtime < cutoff:
+                drop(path, size, "untracked resumable upload")
+    return found
@@ -1,7 +1,13 @@
+from sqlalchemy import func, inspect, text
 from sqlalchemy.orm import Session
-from models.models import Invoices, Items, InvoicesHistory, ItemsHistory
+from models.models import (
+    Invoices, Items,
+    CorrectedInvoices, CorrectedItems, AdvancedColumnsInvoicedata, AdvancedColumnsItems,
+)
 from fastapi import HTTPException
-from typing import List
+from typing import List, Optional
+from core import change_log
+from core.config import STREAM_BATCH_SIZE
 
 
 
@@ -10,20 +16,10 @@ def insert_invoice_orm(db: Session, invoice_data: dict):
 
     invoice_no = invoice_data["invoice_number"]
     existing = db.query(Invoices).filter_by(InvoiceNo=invoice_no).first()
+    changes = change_log.ChangeBatch()
 
     if existing:
-        # Log existing data to history table
-        history = InvoicesHistory(
-            InvoiceNo=existing.InvoiceNo,
-            FromAddress=existing.FromAddress,
-            ToAddress=existing.ToAddress,
-            GSTNo=existing.GSTNo,
-            InvoiceDate=existing.InvoiceDate,
-            Total=existing.Total,
-            Taxes=existing.Taxes,
-            TotalQuantity=existing.TotalQuantity
-        )
-        db.add(history)
+        before = change_log.snapshot(existing, change_log.INVOICE_FIELDS)
 
         # Update the invoice
         existing.FromAddress = invoice_data.get("from_address")
@@ -33,6 +29,10 @@ def insert_invoice_orm(db: Session, invoice_data: dict):
         existing.Total = invoice_data.get("total")
         existing.Taxes = invoice_data.get("taxes")
         existing.TotalQuantity = invoice_data.get("total_quantity")
+
+        # Log only the fields that changed
+        changes.add(invoice_no, before, change_log.snapshot(existing, change_log.INVOICE_FIELDS))
+        changes.flush(db)
         db.commit()
         db.refresh(existing)
         return existing
@@ -49,6 +49,8 @@ def insert_invoice_orm(db: Session, invoice_data: dict):
                 TotalQuantity=invoice_data.get("total_quantity"),
             )
             db.add(invoice)
+            changes.add(invoice.InvoiceNo, None, change_log.snapshot(invoice, change_log.INVOICE_FIELDS))
+            changes.flush(db)
             db.commit()
             db.refresh(invoice)
             return invoice
@@ -62,51 +64,64 @@ def insert_invoice_orm(db: Session, invoice_data: dict):
             raise HTTPException(status_code=500, detail="Failed to insert invoice.")
 
 
-#This functon will insert items into the database, if invoice already exists, it will backup the old items to history table and delete the old items
+def _item_values(item: dict):
+    return {
+        "Description": item.get("description"),
+        "HSN": item.get("hsn"),
+        "Quantity": item.get("quantity"),
+        "PricePerUnit": item.get("price_per_unit"),
+        "GST": item.get("gst"),
+        "IGST": item.get("igst"),
+        "SGST": item.get("sgst"),
+        "Amount": item.get("amount"),
+    }
+
+
+#This functon will insert items into the database. If the invoice already has items they are updated in place,
+#position by position (extra old items are deleted), and only the changed fields go to the change log
 def insert_items_orm(db: Session, invoice_no: str, items: List[dict]):
-    # Fetch and backup old items
-    old_items = db.query(Items).filter_by(InvoiceNo=invoice_no).all()
-    for old_item in old_items:
-        history = ItemsHistory(
-            InvoiceNo=old_item.InvoiceNo,
-            Description=old_item.Description,
-            HSN=old_item.HSN,
-            Quantity=old_item.Quantity,
-            PricePerUnit=old_item.PricePerUnit,
-            GST=old_item.GST,
-            IGST=old_item.IGST,
-            SGST=old_item.SGST,
-            Amount=old_item.Amount
-        )
-        db.add(history)
-
-    # Delete old items (if needed)
-    if old_items:
-        db.query(Items).filter_by(InvoiceNo=invoice_no).delete()
-
-    # Insert new items
-    item_objs = []
-    for item in items:
-        item_obj = Items(
-            InvoiceNo=invoice_no,
-            Description=item.get("description"),
-            HSN=item.get("hsn"),
-            Quantity=item.get("quantity"),
-            PricePerUnit=item.get("price_per_unit"),
-            GST=item.get("gst"),
-            IGST=item.get("igst"),
-            SGST=item.get("sgst"),
-            Amount=item.get("amount"),
-        )
-        db.add(item_obj)
+    changes = change_log.ChangeBatch()
+    old_items = db.query(Items).filter_by(InvoiceNo=invoice_no).order_by(Items.ItemID).all()
+
+    item_objs, new_items = [], []
+    for position, item in enumerate(items):
+        if position < len(old_items):
+            item_obj = old_items[position]
+            before = change_log.snapshot(item_obj, change_log.ITEM_FIELDS)
+            for column, value in _item_values(item).items():
+                setattr(item_obj, column, value)
+            changes.add(invoice_no, before, change_log.snapshot(item_obj, change_log.ITEM_FIELDS), item_obj.ItemID)
+        else:
+            item_obj = Items(InvoiceNo=invoice_no, **_item_values(item))
+            db.add(item_obj)
+            new_items.append(item_obj)
         item_objs.append(item_obj)
 
+    # Delete old items beyond the new list
+    for old_item in old_items[len(items):]:
+        changes.add(invoice_no, change_log.snapshot(old_item, change_log.ITEM_FIELDS), None, old_item.ItemID)
+        db.delete(old_item)
+
+    db.flush()  # ids of the new items for their log entries
+    for item_obj in new_items:
+        changes.add(invoice_no, None, change_log.snapshot(item_obj, change_log.ITEM_FIELDS), item_obj.ItemID)
+    changes.flush(db)
     db.commit()
     return item_objs
 
 
-def get_all_invoices_orm(db: Session):
-    return db.query(Invoices).all()
+def get_all_invoices_orm(db: Session, after: Optional[str] = None, limit: Optional[int] = None):
+    """
+    Invoices in InvoiceNo order, after the InvoiceNo `after` when given. Iterating the
+    returned query reads the rows from the DB cursor in batches; call .all() for a list.
+    """
+    query = db.query(Invoices)
+    if after is not None:
+        query = query.filter(Invoices.InvoiceNo > after)
+    query = query.order_by(Invoices.InvoiceNo)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.yield_per(STREAM_BATCH_SIZE)
 
 
 def get_invoice_by_invoice_no_orm(db: Session, invoice_no: str):
@@ -120,17 +135,32 @@ def get_items_by_invoice_no_orm(db: Session, invoice_no: str):
 def delete_invoice_by_id_orm(db: Session, invoice_no: str):
     invoice = db.query(Invoices).filter(Invoices.InvoiceNo == invoice_no).first()
     if invoice:
+        # The deleted values are logged, so the invoice can still be rebuilt from its history
+        changes = change_log.ChangeBatch()
+        for item in db.query(Items).filter(Items.InvoiceNo == invoice_no).order_by(Items.ItemID):
+            changes.add(invoice_no, change_log.snapshot(item, change_log.ITEM_FIELDS), None, item.ItemID)
+        changes.add(invoice_no, change_log.snapshot(invoice, change_log.INVOICE_FIELDS), None)
+        changes.flush(db)
         db.delete(invoice)
         db.commit()
     return invoice
 
-def get_invoice_history(db: Session, invoice_no: str):
-    return db.query(InvoicesHistory).filter_by(InvoiceNo=invoice_no).order_by(InvoicesHistory.ChangedAt.desc()).all()
-def get_item_history(db: Session, invoice_no: str):
-    return db.query(ItemsHistory).filter_by(InvoiceNo=invoice_no).order_by(ItemsHistory.ChangedAt.desc()).all()
+# History comes from the change log (core/change_log.py): (total, entries) newest first.
+# Filters: entity ('invoice' / 'item'), field, action, since, until (datetimes).
+def get_invoice_history(db: Session, invoice_no: str, page: int = 1, per_page: int = 50, **filters):
+    return change_log.history(db, page, per_page, invoice_no=invoice_no, **filters)
+def get_item_history(db: Session, invoice_no: str, page: int = 1, per_page: int = 50, **filters):
+    return change_log.history(db, page, per_page, invoice_no=invoice_no, entity="item", **filters)
 
-def get_all_invoice_history(db: Session):
-    return db.query(InvoicesHistory).order_by(InvoicesHistory.ChangedAt.desc()).all()
+def get_all_invoice_history(db: Session, page: int = 1, per_page: int = 50, **filters):
+    return change_log.history(db, page, per_page, **filters)
+
+# Keyset variant for cursors and streams: entries below ChangeID `before`, without a total
+def iter_invoice_history(db: Session, before: Optional[int] = None, limit: Optional[int] = None, **filters):
+    return change_log.entries(db, before, limit, **filters)
+
+def get_invoice_version(db: Session, invoice_no: str, change_id: int):
+    return change_log.version(db, invoice_no, change_id)
 
 def update_invoice_item_orm(db: Session, item_data: dict):
     # Fetch the item by its primary key
@@ -138,30 +168,71 @@ def update_invoice_item_orm(db: Session, item_data: dict):
     if not db_item:
         raise HTTPException(status_code=404, detail=f"Item with ID {item_data['item_id']} not found.")
 
-    # Save old data to history before updating
-    history = ItemsHistory(
-        InvoiceNo=db_item.InvoiceNo,
-        Description=db_item.Description,
-        HSN=db_item.HSN,
-        Quantity=db_item.Quantity,
-        PricePerUnit=db_item.PricePerUnit,
-        GST=db_item.GST,
-        IGST=db_item.IGST,
-        SGST=db_item.SGST,
-        Amount=db_item.Amount
-    )
-    db.add(history)
+    before = change_log.snapshot(db_item, change_log.ITEM_FIELDS)
 
     # Update item fields
-    db_item.Description = item_data.get("description")
-    db_item.HSN = item_data.get("hsn")
-    db_item.Quantity = item_data.get("quantity")
-    db_item.PricePerUnit = item_data.get("price_per_unit")
-    db_item.GST = item_data.get("gst")
-    db_item.IGST = item_data.get("igst")
-    db_item.SGST = item_data.get("sgst")
-    db_item.Amount = item_data.get("amount")
+    for column, value in _item_values(item_data).items():
+        setattr(db_item, column, value)
 
+    # Log only the fields that changed
+    changes = change_log.ChangeBatch()
+    changes.add(db_item.InvoiceNo, before, change_log.snapshot(db_item, change_log.ITEM_FIELDS), db_item.ItemID)
+    changes.flush(db)
     db.commit()
     db.refresh(db_item)
     return db_item
+
+
+# ------------------------------
+# Change versions for ETags
+# ------------------------------
+# Each returns (row count, version) from index-only aggregates, so a conditional GET can be
+# answered without loading the rows. The version changes on every insert (new maximum id),
+# delete (the count drops) and in-place update (ModifiedDate, where the table has one; every
+# save of a correction raises its Version, which also covers items changed in place).
+def corrections_version(db: Session):
+    count, last_id, last_date, versions = db.query(
+        func.count(CorrectedInvoices.CorrectionID),
+        func.max(CorrectedInvoices.CorrectionID),
+        func.max(CorrectedInvoices.CorrectionDate),
+        func.sum(CorrectedInvoices.Version),
+    ).one()
+    last_item = db.query(func.max(CorrectedItems.CorrectionItemID)).scalar()
+    return count, (last_id, str(last_date), last_item, versions)
+
+
+def correction_items_version(db: Session, correction_id: int):
+    count, last_item = db.query(
+        func.count(CorrectedItems.CorrectionItemID),
+        func.max(CorrectedItems.CorrectionItemID),
+    ).filter(CorrectedItems.CorrectionID == correction_id).one()
+    version = db.query(CorrectedInvoices.Version).filter(CorrectedInvoices.CorrectionID == correction_id).scalar()
+    return count, (last_item, version)
+
+
+def advanced_invoices_version(db: Session):
+    count, last_id, last_modified = db.query(
+        func.count(AdvancedColumnsInvoicedata.InvoiceID),
+        func.max(AdvancedColumnsInvoicedata.InvoiceID),
+        func.max(AdvancedColumnsInvoicedata.ModifiedDate),
+    ).one()
+    last_item, item_modified = db.query(
+        func.max(AdvancedColumnsItems.ItemID),
+        func.max(AdvancedColumnsItems.ModifiedDate),
+    ).one()
+    return count, (last_id, str(last_modified), last_item, str(item_modified))
+
+
+# ------------------------------
+# Schema upgrades
+# ------------------------------
+def ensure_correction_version(engine):
+    """Add CorrectedInvoices.Version to databases created before it existed (existing rows start at 1)."""
+    try:
+        columns = {column["name"] for column in inspect(engine).get_columns(CorrectedInvoices.__tablename__)}
+        if columns and "Version" not in columns:
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {CorrectedInvoices.__tablename__} ADD Version INTEGER NOT NULL DEFAULT 1"))
+            print("[INFO] Added CorrectedInvoices.Version")
+    except Exception as e:
+        print(f"[WARN] Could not add CorrectedInvoices.Version: {e}")
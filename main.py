@@ -9,19 +9,17 @@ import shutil
 import subprocess
 from pathlib import Path
 from typing import Optional
-import requests
+import base64
 import socket
-import webview
 import webbrowser
 
 from fastapi import FastAPI, Request, Depends, HTTPException, status, Cookie
-from fastapi.responses import HTMLResponse, FileResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, FileResponse, JSONResponse, PlainTextResponse, Response
+from starlette.concurrency import run_in_threadpool
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import OAuth2PasswordBearer
 from fastapi.middleware import Middleware
-from jose import JWTError, jwt
+from jose import JWTError
 import sys
 import subprocess
 
@@ -34,15 +32,17 @@ if sys.platform == "win32":
 import uvicorn
 
 from core.config import APP_NAME
-from api.v1.routes import router as v1_router, PyWebViewSaveAPI
-from api.v1.auth import router as auth_router
+from core import metrics, upload_store, http_cache, retention, static_assets, search_index, analytics, fingerprints, change_log
+from core.database import SessionLocal, engine
+from core.compression import CompressionMiddleware
+from api.v1.routes import router as v1_router
+from crud import invoice_crud
+from api.v1.auth import router as auth_router, decode_token, user_from_token
 from core.config import (
     TEMPLATES_DIR,
     STATIC_DIR,
     UPLOADS_DIR,
     DOWNLOAD_DIR,
-    SECRET_KEY,
-    ALGORITHM,
 )
 
 APP_VERSION = "2.0.0"
@@ -55,13 +55,16 @@ app = FastAPI(
     title=APP_TITLE,
     version=APP_VERSION,
     middleware=[
+        Middleware(metrics.MetricsMiddleware),
+        Middleware(CompressionMiddleware),
         Middleware(CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"])
     ]
 )
 
-# Mount static directory
-app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
+# Mount static directory (serves the precompressed, content-hashed build in static/dist)
+app.mount("/static", static_assets.PrecompressedStaticFiles(directory=STATIC_DIR), name="static")
 templates = Jinja2Templates(directory=TEMPLATES_DIR)
+templates.env.globals["asset"] = static_assets.asset
 
 # Include routers
 app.include_router(v1_router, prefix="/api/v1")
@@ -71,24 +74,39 @@ app.include_router(auth_router, prefix="/api/v1/auth")
 os.makedirs(UPLOADS_DIR, exist_ok=True)
 os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
-# Security setup
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="api/v1/auth/token")
 
+# Tables and columns added after a database was created; runs before the hooks below read them
+@app.on_event("startup")
+async def upgrade_schema():
+    invoice_crud.ensure_correction_version(engine)
+    # Copies the legacy invoice history into the change log once, in a background thread
+    change_log.start(engine, SessionLocal)
+
+
+# Periodic cleanup of old uploads, OCR sidecars, exports and caches (see core/retention.py)
+@app.on_event("startup")
+async def start_retention():
+    retention.start()
+
+
+@app.on_event("startup")
+async def start_search_index():
+    search_index.start(SessionLocal)
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: Optional[str] = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
-        raise credentials_exception
-    return username
+
+@app.on_event("startup")
+async def start_analytics():
+    analytics.start(engine, SessionLocal)
+
+
+@app.on_event("startup")
+async def start_fingerprints():
+    fingerprints.start(engine, SessionLocal)
+
+
+@app.on_event("shutdown")
+async def stop_retention():
+    retention.stop()
 
 
 # ------------------------------
@@ -99,7 +117,7 @@ async def home(request: Request, token: Optional[str] = Cookie(None)):
     if not token:
         return templates.TemplateResponse("login.html", {"request": request})
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_token(token)
         return templates.TemplateResponse("home.html", {
             "request": request,
             "username": payload.get("sub")
@@ -127,7 +145,7 @@ async def forgot_password_page(request: Request):
 async def index(request: Request, file: str, token: Optional[str] = None):
     try:
         if token:
-            await get_current_user(token)
+            user_from_token(token)
         return templates.TemplateResponse("index.html", {
             "request": request,
             "filename": file
@@ -139,7 +157,7 @@ async def index(request: Request, file: str, token: Optional[str] = None):
 async def AdvancedBillsExtraction(request: Request, file: str, token: Optional[str] = None):
     try:
         if token:
-            await get_current_user(token)
+            user_from_token(token)
         return templates.TemplateResponse("AdvancedBillsExtraction.html", {
             "request": request,
             "filename": file
@@ -151,49 +169,23 @@ async def AdvancedBillsExtraction(request: Request, file: str, token: Optional[s
 async def invoicelist(request: Request, token: Optional[str] = None):
     try:
         if token:
-            await get_current_user(token)
+            user_from_token(token)
         return templates.TemplateResponse("invoicelist.html", {"request": request})
     except HTTPException:
         return templates.TemplateResponse("login_redirect.html", {"request": request})
 
 
-# import base64
-# import webview
-
-# class PyWebViewSaveAPI:
-#     def save_file_dialog(self, base64_data: str, suggested_name: str):
-#         """
-#         Opens a save dialog and saves the provided base64 file content.
-#         Intended for PyWebView desktop context.
-#         """
-#         try:
-#             # Let the user choose a location
-#             file_path = webview.windows[0].create_file_dialog(
-#                 webview.FileDialog.SAVE,
-#                 save_filename=suggested_name
-#             )
-
-#             if not file_path:
-#                 return {"status": "cancelled"}
-
-#             # Decode base64 and save
-#             file_bytes = base64.b64decode(base64_data.split(",")[1])
-#             with open(file_path[0], "wb") as f:
-#                 f.write(file_bytes)
-
-#             return {
-#                 "status": "success",
-#                 "path": file_path[0]
-#             }
-#         except Exception as e:
-#             return {"status": "error", "message": str(e)}
-        
 # ------------------------------
 # File serving endpoint
 # ------------------------------
 @app.get("/api/v1/get-file")
-async def get_file(filename: str):
-    """Serve uploaded files for preview"""
+async def get_file(request: Request, filename: str, v: Optional[str] = None):
+    """
+    Serve uploaded files for preview.
+    The strong ETag is the document's content hash; If-None-Match / If-Modified-Since get a
+    304 and Range requests (partial PDF loading) are answered by FileResponse. Passing the
+    hash as `v` marks the URL as immutable so it can be cached for a year.
+    """
     if not filename or any(c in filename for c in ['..', '/', '\\']):
         raise HTTPException(status_code=400, detail="Invalid filename")
 
@@ -202,6 +194,19 @@ async def get_file(filename: str):
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
 
+    stat_result = file_path.stat()
+    digest = await run_in_threadpool(upload_store.content_hash, filename)
+    etag = f'"{digest}"' if digest else f'"{int(stat_result.st_mtime)}-{stat_result.st_size}"'
+    headers = {
+        'Content-Disposition': f'inline; filename="{filename}"',
+        'ETag': etag,
+        'Last-Modified': http_cache.http_date(stat_result.st_mtime),
+        'Cache-Control': http_cache.CACHE_IMMUTABLE if digest and v == digest else http_cache.CACHE_PRIVATE_DAY,
+    }
+
+    if http_cache.not_modified(request, etag, stat_result.st_mtime):
+        return Response(status_code=304, headers={k: headers[k] for k in ('ETag', 'Last-Modified', 'Cache-Control')})
+
     ext = filename.split('.')[-1].lower()
     media_type = {
         'pdf': 'application/pdf',
@@ -213,9 +218,11 @@ async def get_file(filename: str):
     return FileResponse(
         file_path,
         media_type=media_type,
-        headers={'Content-Disposition': f'inline; filename="{filename}"'}
+        headers=headers,
+        stat_result=stat_result
     )
 
+
 # ------------------------------
 # Error handlers
 # ------------------------------
@@ -224,6 +231,7 @@ async def http_exception_handler(request, exc):
     return JSONResponse(
         status_code=exc.status_code,
         content={"detail": exc.detail},
+        headers=getattr(exc, "headers", None),
     )
 
 
@@ -243,6 +251,14 @@ async def health_check():
     return {"status": "ok"}
 
 
+# ------------------------------
+# Metrics (Prometheus text exposition)
+# ------------------------------
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 # ------------------------------
 # Utility: find a free port
 # ------------------------------
@@ -283,6 +299,7 @@ def has_edge_webview2():
 def install_edge_webview2_background():
     """Download and install Edge WebView2 silently in the background."""
     def _install():
+        import requests
         try:
             url = "https://go.microsoft.com/fwlink/p/?LinkId=2124703"
             temp_dir = tempfile.mkdtemp()
@@ -302,6 +319,40 @@ def install_edge_webview2_background():
     threading.Thread(target=_install, daemon=True).start()
 
 
+# ------------------------------
+# Desktop bridge exposed to the frontend as window.pywebview.api
+# (webview is only imported by the desktop entry point, never by the API)
+# ------------------------------
+class PyWebViewSaveAPI:
+    def save_file_dialog(self, base64_data: str, suggested_name: str):
+        """
+        Opens a save dialog and saves the provided base64 file content.
+        Intended for PyWebView desktop context.
+        """
+        import webview
+        try:
+            # Let the user choose a location
+            file_path = webview.windows[0].create_file_dialog(
+                webview.FileDialog.SAVE,
+                save_filename=suggested_name
+            )
+
+            if not file_path:
+                return {"status": "cancelled"}
+
+            # Decode base64 and save
+            file_bytes = base64.b64decode(base64_data.split(",")[1])
+            with open(file_path[0], "wb") as f:
+                f.write(file_bytes)
+
+            return {
+                "status": "success",
+                "path": file_path[0]
+            }
+        except Exception as e:
+            return {"status": "error", "message": str(e)}
+
+
 # ------------------------------
 # App Entry Point
 # ------------------------------
@@ -311,6 +362,7 @@ if __name__ == "__main__":
     time.sleep(1)
 
     if has_edge_webview2():
+        import webview
         api_bridge = PyWebViewSaveAPI()
         webview.create_window(
             APP_TITLE,
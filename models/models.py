@@ -2,7 +2,7 @@ from __future__ import annotations
 from typing import List, Optional
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.sql import func
-from sqlalchemy import TypeDecorator,DECIMAL, Date, DateTime, ForeignKeyConstraint, Identity, Integer, PrimaryKeyConstraint, String, Unicode, text, ForeignKey, UnicodeText, JSON, Boolean, BigInteger
+from sqlalchemy import TypeDecorator,DECIMAL, Date, DateTime, ForeignKeyConstraint, Identity, Integer, PrimaryKeyConstraint, String, Unicode, text, ForeignKey, UnicodeText, JSON, Boolean, BigInteger, Index
 import datetime
 import decimal
 import json
@@ -153,6 +153,32 @@ class ItemsHistory(Base):
     ChangedAt: Mapped[Optional[datetime.datetime]] = mapped_column(DateTime, server_default=text("GETDATE()"))
 
 
+class ChangeLog(Base):
+    """Append-only change log of Invoices / Items (replaces the full-row copies above)."""
+    __tablename__ = 'change_log'
+    __table_args__ = (
+        Index('IX_change_log_period', 'Period', 'ChangeID'),
+        Index('IX_change_log_invoice', 'InvoiceNo', 'ChangeID'),
+    )
+
+    ChangeID: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    Period: Mapped[str] = mapped_column(String(7))  # 'YYYY-MM' of ChangedAt: the time partition
+    ChangedAt: Mapped[datetime.datetime] = mapped_column(DateTime)
+    InvoiceNo: Mapped[str] = mapped_column(Unicode(50))
+    ItemID: Mapped[Optional[int]] = mapped_column(Integer)  # None for invoice-level changes
+    Action: Mapped[str] = mapped_column(String(10))  # 'insert', 'update' or 'delete'
+    Changes: Mapped[str] = mapped_column(UnicodeText)  # JSON {field: [old, new]}
+
+
+class ChangeLogBackfill(Base):
+    """Marker row written once Invoices_History / Items_History are copied into change_log."""
+    __tablename__ = 'change_log_backfill'
+
+    BackfillID: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    CompletedAt: Mapped[datetime.datetime] = mapped_column(DateTime)
+    Entries: Mapped[int] = mapped_column(Integer)
+
+
 class CorrectedInvoices(Base):
     __tablename__ = 'CorrectedInvoices'
     
@@ -173,6 +199,7 @@ class CorrectedInvoices(Base):
     Status: Mapped[str] = mapped_column(String(20), default='PENDING_APPROVAL')
     Notes: Mapped[Optional[str]] = mapped_column(UnicodeText)
     TemplateStyle: Mapped[Optional[dict]] = mapped_column(JSONEncodedDict, nullable=True)  # Stores styling preferences as JSON
+    Version: Mapped[int] = mapped_column(Integer, default=1, server_default=text('1'))  # Raised on every save; saves must name the version they edited
     
     Items: Mapped[List['CorrectedItems']] = relationship('CorrectedItems', back_populates='Correction', cascade="all, delete-orphan")
 
@@ -194,7 +221,8 @@ class CorrectedInvoices(Base):
             "corrected_by": self.CorrectedBy,
             "status": self.Status,
             "notes": self.Notes,
-            "template_style": self.TemplateStyle if self.TemplateStyle else None
+            "template_style": self.TemplateStyle if self.TemplateStyle else None,
+            "version": self.Version
         }
     
 class CorrectedItems(Base):
@@ -303,3 +331,54 @@ class AdvancedColumnsItems(Base):
     OriginalItemID: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey('Items.ItemID'))
     
     Invoice: Mapped['AdvancedColumnsInvoicedata'] = relationship('AdvancedColumnsInvoicedata', back_populates='Items')
+
+
+# Running sums maintained by core/analytics.py on every save / delete of a correction or
+# advanced bill, so /analytics never scans the item tables
+class AnalyticsInvoiceRollup(Base):
+    __tablename__ = 'analytics_invoice_rollup'
+    __table_args__ = (
+        PrimaryKeyConstraint('Source', 'Month', 'Vendor', name='PK_analytics_invoice_rollup'),
+    )
+    KEY = ('Source', 'Month', 'Vendor')
+
+    Source: Mapped[str] = mapped_column(Unicode(20))  # 'correction' or 'advanced'
+    Month: Mapped[str] = mapped_column(String(7))  # 'YYYY-MM', or 'unknown'
+    Vendor: Mapped[str] = mapped_column(Unicode(200))
+    InvoiceCount: Mapped[int] = mapped_column(Integer, default=0)
+    Total: Mapped[decimal.Decimal] = mapped_column(DECIMAL(18, 2), default=0)
+    TaxAmount: Mapped[decimal.Decimal] = mapped_column(DECIMAL(18, 2), default=0)
+
+
+class AnalyticsItemRollup(Base):
+    __tablename__ = 'analytics_item_rollup'
+    __table_args__ = (
+        PrimaryKeyConstraint('Source', 'Month', 'Vendor', 'HSN', 'TaxRate', name='PK_analytics_item_rollup'),
+    )
+    KEY = ('Source', 'Month', 'Vendor', 'HSN', 'TaxRate')
+
+    Source: Mapped[str] = mapped_column(Unicode(20))
+    Month: Mapped[str] = mapped_column(String(7))
+    Vendor: Mapped[str] = mapped_column(Unicode(200))
+    HSN: Mapped[str] = mapped_column(Unicode(50))
+    TaxRate: Mapped[decimal.Decimal] = mapped_column(DECIMAL(5, 2))
+    ItemCount: Mapped[int] = mapped_column(Integer, default=0)
+    Quantity: Mapped[decimal.Decimal] = mapped_column(DECIMAL(18, 3), default=0)
+    Amount: Mapped[decimal.Decimal] = mapped_column(DECIMAL(18, 2), default=0)
+    TaxAmount: Mapped[decimal.Decimal] = mapped_column(DECIMAL(18, 2), default=0)
+
+
+class InvoiceFingerprint(Base):
+    __tablename__ = 'invoice_fingerprints'
+    __table_args__ = (
+        Index('IX_invoice_fingerprints_value', 'Kind', 'Value'),
+        Index('IX_invoice_fingerprints_ref', 'Source', 'RefID'),
+    )
+
+    FingerprintID: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    Kind: Mapped[str] = mapped_column(String(10))  # 'file', 'header' or 'simhash'
+    Value: Mapped[str] = mapped_column(String(64))  # SHA-256, header key, or '<band>:<16 bits>' of a simhash
+    Signature: Mapped[Optional[str]] = mapped_column(String(16))  # full 64-bit simhash (hex) on 'simhash' rows
+    Source: Mapped[str] = mapped_column(Unicode(20))  # 'correction' or 'advanced'
+    RefID: Mapped[int] = mapped_column(Integer)  # CorrectionID or advanced InvoiceID
+    CreatedAt: Mapped[datetime.datetime] = mapped_column(DateTime, server_default=func.now())
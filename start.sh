@@ -1 +1 @@
-uvicorn main:app --host 0.0.0.0 --port 10000
\ No newline at end of file
+uvicorn main:app --host 0.0.0.0 --port 10000 --proxy-headers --forwarded-allow-ips "${FORWARDED_ALLOW_IPS:-127.0.0.1}"
\ No newline at end of file
@@ -219,7 +219,7 @@ function initializeApplication() {
   
   // Initialize event handlers
   $('#uploadForm').on('submit', handleFormSubmit);
-  $('#saveInvoiceBtn').on('click', saveInvoice);
+  $('#saveInvoiceBtn').on('click', () => saveInvoice());
   
   // Initialize items table
   initializeItemsTable();
@@ -235,6 +235,22 @@ function initializeApplication() {
   });
 }
 
+// Preview URL for an uploaded file. A `v` (content hash) on the page URL is passed on
+// so the server can mark the response immutable.
+function previewUrl(filename) {
+  const version = new URLSearchParams(window.location.search).get('v');
+  return `/api/v1/get-file?filename=${encodeURIComponent(filename)}` +
+    (version ? `&v=${encodeURIComponent(version)}` : '');
+}
+
+// Page rendered (and cached per content hash) by the server; much lighter than pdf.js
+// rendering the PDF on a canvas for the initial preview
+function pageImageUrl(filename, page = 1, width = 1600) {
+  const version = new URLSearchParams(window.location.search).get('v');
+  return `/api/v1/page-image?filename=${encodeURIComponent(filename)}&page=${page}&width=${width}&format=webp` +
+    (version ? `&v=${encodeURIComponent(version)}` : '');
+}
+
 // Enhanced PDF preview function with high quality
 async function fetchPDFPreview(filename) {
   const pdfViewer = document.getElementById('pdfViewer');
@@ -246,13 +262,13 @@ async function fetchPDFPreview(filename) {
       currentPreview = null;
     }
 
-    const response = await fetch(`/api/v1/get-file?filename=${encodeURIComponent(filename)}`);
-    if (!response.ok) throw new Error('Failed to load PDF');
-
-    const blob = await response.blob();
-    const objectUrl = URL.createObjectURL(blob);
-
-    const pdf = await pdfjsLib.getDocument(objectUrl).promise;
+    // Let pdf.js load straight from the server: it uses Range requests to fetch only
+    // what page 1 needs, and the browser cache (ETag/Cache-Control) serves repeat visits
+    const pdf = await pdfjsLib.getDocument({
+      url: previewUrl(filename),
+      disableAutoFetch: true,
+      disableStream: true
+    }).promise;
     const page = await pdf.getPage(1);
 
     // Draw the first page on canvas
@@ -280,7 +296,7 @@ async function fetchPDFPreview(filename) {
 }
 
 // Enhanced image preview function with high quality
-async function fetchImagePreview(filename) {
+async function fetchImagePreview(filename, url = previewUrl(filename), onError = null) {
   const previewImg = document.getElementById('previewImg');
   const wrapper = document.getElementById('previewWrapper');
 
@@ -290,22 +306,22 @@ async function fetchImagePreview(filename) {
       currentPreview = null;
     }
 
-    const response = await fetch(`/api/v1/get-file?filename=${encodeURIComponent(filename)}`);
-    if (!response.ok) throw new Error('Failed to load image');
-
-    const blob = await response.blob();
-    const objectUrl = URL.createObjectURL(blob);
-
-    previewImg.src = objectUrl;
+    // Load through the HTTP cache rather than copying the file into a blob
+    await new Promise((resolve, reject) => {
+      previewImg.onload = resolve;
+      previewImg.onerror = () => reject(new Error('Failed to load image'));
+      previewImg.src = url;
+    });
     previewImg.style.display = 'block';
     document.getElementById('pdfViewer').style.display = 'none';
 
     currentPreview = new HighQualityPreview(wrapper, previewImg);
     currentPreview.initImagePreview();
 
-    showToast("Image loaded successfully");
+    showToast("Preview loaded successfully");
   } catch (error) {
     console.error("Image preview error:", error);
+    if (onError) return onError();
     showToast("Failed to load image preview", false);
   }
 }
@@ -330,7 +346,8 @@ function displayFilePreview(filename) {
   pdfViewer.style.transform = 'none';
 
   if (fileType === 'pdf') {
-    fetchPDFPreview(filename);
+    // Server-rendered page 1 first; pdf.js only if rendering it failed
+    fetchImagePreview(filename, pageImageUrl(filename), () => fetchPDFPreview(filename));
   } else if (['jpg', 'jpeg', 'png', 'gif', 'webp', 'bmp', 'tiff'].includes(fileType)) {
     fetchImagePreview(filename);
   } else {
@@ -762,11 +779,12 @@ function calculateGrandTotal() {
 }
 
 // Save the complete invoice
-function saveInvoice() {
-  // Collect all invoice data
+function saveInvoice(allowDuplicate = false) {
+  // Collect all invoice data; sourceFile lets the server recognise the document if it is saved again
   const invoiceToSave = {
-    invoice_data: collectInvoiceData(),
-    items: invoiceItems
+    invoice_data: { ...collectInvoiceData(), sourceFile: new URLSearchParams(window.location.search).get('file') || '' },
+    items: invoiceItems,
+    allow_duplicate: allowDuplicate
   };
   
   // Show loading
@@ -781,18 +799,33 @@ function saveInvoice() {
     },
     body: JSON.stringify(invoiceToSave)
   })
-  .then(response => {
+  .then(async response => {
+    if (response.status === 409) {
+      // The same bill was saved before: only save it again when confirmed
+      const detail = (await response.json()).detail || {};
+      if (confirm(`${detail.message}\n\nSave this bill anyway?`)) {
+        setTimeout(() => saveInvoice(true));
+        return null;
+      }
+      throw new Error(detail.message || 'Bill already saved');
+    }
     if (!response.ok) {
       throw new Error('Failed to save invoice');
     }
     return response.json();
   })
   .then(data => {
-    showToast("Invoice saved successfully");
+    if (!data) return;
+    const similar = data.possible_duplicates || [];
+    if (similar.length) {
+      showToast(`Invoice saved. Items look like ${similar.map(d => `${d.source} #${d.id}`).join(', ')}.`);
+    } else {
+      showToast("Invoice saved successfully");
+    }
   })
   .catch(error => {
     console.error("Error saving invoice:", error);
-    showToast("Failed to save invoice", false);
+    showToast(error.message || "Failed to save invoice", false);
   })
   .finally(() => {
     hideGlobalSpinner();
@@ -827,7 +860,7 @@ function collectInvoiceData() {
 }
 
 // Update the processFile function to handle the response
-function processFile(filename, mode) {
+function processFile(filename, mode, allowDuplicate = false) {
   showGlobalSpinner();
   
   // Disable form during processing
@@ -837,6 +870,7 @@ function processFile(filename, mode) {
   formData.append('filename', filename);
   formData.append('mode', mode);
   formData.append('advanced', 'true');  // Indicate advanced processing
+  formData.append('allow_duplicate', String(allowDuplicate));
 
   fetch('/api/v1/upload-invoice', {
     method: 'POST',
@@ -844,7 +878,16 @@ function processFile(filename, mode) {
     body: formData
   })
   
-  .then(response => {
+  .then(async response => {
+    if (response.status === 409) {
+      // Already saved: ask before running the extraction again
+      const detail = (await response.json()).detail || {};
+      if (confirm(`${detail.message}\n\nExtract this document again?`)) {
+        setTimeout(() => processFile(filename, mode, true));
+        return null;
+      }
+      throw new Error(detail.message || 'Document already saved');
+    }
     if (!response.ok) {
       throw new Error(response.statusText || 'Server returned an error');
     }
@@ -852,6 +895,7 @@ function processFile(filename, mode) {
   })
 
   .then(data => {
+    if (!data) return;
     showToast("Invoice processed successfully");
     // Process the extracted data
     processExtractionResult(data);
@@ -5,6 +5,31 @@ const itemsPerPage = 10;
 const token = localStorage.getItem('authToken');
 let currentBillType = 'regular'; // 'regular' or 'advanced'
 
+// Last response per URL with its ETag; the server answers 304 while nothing changed
+const responseCache = new Map();
+
+async function fetchJsonCached(url, options = {}) {
+    const cached = responseCache.get(url);
+    const headers = { ...(options.headers || {}) };
+    if (cached) headers['If-None-Match'] = cached.etag;
+
+    const response = await fetch(url, { ...options, headers, cache: 'no-store' });
+    if (response.status === 304 && cached) return cached;
+    if (!response.ok) {
+        const err = await response.json().catch(() => ({}));
+        throw new Error(err.detail || `HTTP error! status: ${response.status}`);
+    }
+
+    const entry = {
+        data: await response.json(),
+        total: parseInt(response.headers.get('X-Total-Count')) || 0,
+        totalPages: parseInt(response.headers.get('X-Total-Pages')) || 1,
+        etag: response.headers.get('ETag')
+    };
+    if (entry.etag) responseCache.set(url, entry);
+    return entry;
+}
+
 document.addEventListener('DOMContentLoaded', function() {
     // Check if we're already on the completed list page
     if (document.getElementById('completed-list').style.display === 'block') {
@@ -67,20 +92,7 @@ function loadRegularBills() {
     
     tableBody.innerHTML = '<tr><td colspan="8" class="loading-text">Loading regular bills...</td></tr>';
     
-    fetch(`/api/v1/invoices/completed?page=${currentPage}&per_page=${itemsPerPage}`)
-        .then(response => {
-            if (!response.ok) {
-                return response.json().then(err => {
-                    throw new Error(err.detail || `HTTP error! status: ${response.status}`);
-                });
-            }
-            return response.json().then(data => {
-                // Get pagination info from headers
-                const total = parseInt(response.headers.get('X-Total-Count')) || 0;
-                const totalPages = parseInt(response.headers.get('X-Total-Pages')) || 1;
-                return { data, total, totalPages };
-            });
-        })
+    fetchJsonCached(`/api/v1/invoices/completed?page=${currentPage}&per_page=${itemsPerPage}`)
         .then(({ data, total, totalPages }) => { 
             renderRegularBills(data, total, totalPages);
         })
@@ -103,20 +115,7 @@ function loadAdvancedBills() {
     
     tableBody.innerHTML = '<tr><td colspan="10" class="loading-text">Loading advanced bills...</td></tr>';
     
-    fetch(`/api/v1/advanced-invoices?page=${currentPage}&per_page=${itemsPerPage}`)
-        .then(response => {
-            if (!response.ok) {
-                return response.json().then(err => {
-                    throw new Error(err.detail || `HTTP error! status: ${response.status}`);
-                });
-            }
-            return response.json().then(data => {
-                // Get pagination info from headers
-                const total = parseInt(response.headers.get('X-Total-Count')) || 0;
-                const totalPages = parseInt(response.headers.get('X-Total-Pages')) || 1;
-                return { data, total, totalPages };
-            });
-        })
+    fetchJsonCached(`/api/v1/advanced-invoices?page=${currentPage}&per_page=${itemsPerPage}`)
         .then(({ data, total, totalPages }) => { 
             renderAdvancedBills(data, total, totalPages);
         })
@@ -334,16 +333,10 @@ async function downloadRegularInvoice(invoiceNumber) {
         const correction = await correctionResponse.json();
 
         // Fetch invoice items
-        const itemsResponse = await fetch(`/api/v1/corrections/${correction.CorrectionID}/items`, {
+        const { data: items } = await fetchJsonCached(`/api/v1/corrections/${correction.CorrectionID}/items`, {
             headers: { 'Authorization': `Bearer ${token}` }
         });
 
-        if (!itemsResponse.ok) {
-            throw new Error(await itemsResponse.text());
-        }
-
-        const items = await itemsResponse.json();
-
         // Create a temporary container and render the invoice preview
         const tempPaper = document.createElement('div');
         tempPaper.id = 'temp-invoice-paper';
@@ -7,6 +7,9 @@ let allDocuments = [];
 let filteredDocuments = [];
 let currentTypeFilter = 'all';
 let currentDateFilter = 'all';
+let currentDocsPage = 1;
+let docsTotalPages = 1;
+const docsPerPage = 50;
 const token = localStorage.getItem('authToken');
 
 // Expose functions to the global scope
@@ -121,17 +124,21 @@ function toggleChildRows(checkbox) {
 // Redirect to OCR page
 function redirectToOCR(filename, mode = 'text') {
     // Get the original filename from the document data
-    const originalFilename = allDocuments.find(doc => doc.name === filename)?.originalName || filename;
-    // Redirect with both stored filename and original filename
-    window.location.href = `index?file=${encodeURIComponent(filename)}&original=${encodeURIComponent(originalFilename)}&mode=${encodeURIComponent(mode)}`;
+    const doc = allDocuments.find(doc => doc.name === filename);
+    const originalFilename = doc?.originalName || filename;
+    // Redirect with both stored filename and original filename (and the content hash for preview caching)
+    window.location.href = `index?file=${encodeURIComponent(filename)}&original=${encodeURIComponent(originalFilename)}&mode=${encodeURIComponent(mode)}` +
+        (doc?.hash ? `&v=${doc.hash}` : '');
 }
 
 // Redirect to Advanced Columns page
 function redirectToAdvancedColumns(filename, mode = 'text') {
     // Get the original filename from the document data
-    const originalFilename = allDocuments.find(doc => doc.name === filename)?.originalName || filename;
-    // Redirect with both stored filename and original filename
-    window.location.href = `/AdvancedBillsExtraction?file=${encodeURIComponent(filename)}&original=${encodeURIComponent(originalFilename)}&mode=${encodeURIComponent(mode)}`;
+    const doc = allDocuments.find(doc => doc.name === filename);
+    const originalFilename = doc?.originalName || filename;
+    // Redirect with both stored filename and original filename (and the content hash for preview caching)
+    window.location.href = `/AdvancedBillsExtraction?file=${encodeURIComponent(filename)}&original=${encodeURIComponent(originalFilename)}&mode=${encodeURIComponent(mode)}` +
+        (doc?.hash ? `&v=${doc.hash}` : '');
 
 }
 // Function to get file icon based on extension
@@ -176,8 +183,24 @@ const SUPPORTED_FILE_TYPES = [
     'text/plain'
 ];
 
-// Max file size (5MB)
-const MAX_FILE_SIZE = 5 * 1024 * 1024; 
+// Max file size (1GB, matches MAX_UPLOAD_SIZE on the server)
+const MAX_FILE_SIZE = 1024 * 1024 * 1024;
+
+// Files above this go through the resumable chunked upload API
+const CHUNKED_UPLOAD_THRESHOLD = 5 * 1024 * 1024;
+const UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+const MAX_CHUNK_RETRIES = 5;
+// Browsers can only hash a file in one piece; skip the client checksum for very large files
+const CHECKSUM_MAX_SIZE = 128 * 1024 * 1024;
+
+// Uploads of the current batch that match an already saved invoice
+let savedDuplicates = [];
+
+function noteDuplicates(result) {
+    if (result.duplicate_of?.length) {
+        savedDuplicates.push(`${result.original_filename} (${result.duplicate_of.map(d => `${d.source} #${d.id}`).join(', ')})`);
+    }
+}
 
 // Function to upload file
 async function uploadFile(file) {
@@ -194,6 +217,10 @@ async function uploadFile(file) {
         return false;
     }
 
+    if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+        return uploadFileChunked(file);
+    }
+
     const formData = new FormData();
     formData.append('file', file);
     
@@ -207,6 +234,7 @@ async function uploadFile(file) {
         if (response.ok) {
             const result = await response.json();
             console.log('Upload successful:', result);
+            noteDuplicates(result);
             return true;
         } else {
             const error = await response.json();
@@ -221,14 +249,146 @@ async function uploadFile(file) {
     }
 }
 
-// Function to fetch and display documents
+async function sha256Hex(file) {
+    if (!window.crypto?.subtle || file.size > CHECKSUM_MAX_SIZE) return null;
+    const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+    return Array.from(new Uint8Array(digest)).map(b => b.toString(16).padStart(2, '0')).join('');
+}
+
+async function fetchUploadState(uploadId) {
+    const response = await fetch(`/api/v1/uploads/${uploadId}`, {
+        headers: { 'Authorization': `Bearer ${token}` }
+    });
+    return response.ok ? response.json() : null;
+}
+
+// Upload a large file in chunks. The upload id is remembered per file, so retrying the
+// same file (even after a page reload) continues from what the server already has.
+async function uploadFileChunked(file) {
+    const resumeKey = `upload:${file.name}:${file.size}:${file.lastModified}`;
+    try {
+        let state = null;
+        const savedId = localStorage.getItem(resumeKey);
+        if (savedId) {
+            state = await fetchUploadState(savedId);
+            if (state && state.size !== file.size) state = null;
+        }
+        if (!state) {
+            const response = await fetch('/api/v1/uploads', {
+                method: 'POST',
+                headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' },
+                body: JSON.stringify({ filename: file.name, size: file.size })
+            });
+            if (!response.ok) {
+                const error = await response.json();
+                throw new Error(error.detail || `Failed to start upload of ${file.name}`);
+            }
+            state = await response.json();
+            localStorage.setItem(resumeKey, state.upload_id);
+        }
+
+        let offset = state.offset;
+        let failures = 0;
+        while (offset < file.size) {
+            try {
+                const response = await fetch(`/api/v1/uploads/${state.upload_id}`, {
+                    method: 'PUT',
+                    headers: {
+                        'Authorization': `Bearer ${token}`,
+                        'Content-Type': 'application/octet-stream',
+                        'Upload-Offset': String(offset)
+                    },
+                    body: file.slice(offset, offset + UPLOAD_CHUNK_SIZE)
+                });
+                if (response.status === 409) {
+                    // The server holds a different offset (e.g. a chunk half-arrived); continue from there
+                    const serverOffset = (await response.json()).detail.offset;
+                    if (serverOffset === offset) throw new Error('Upload busy');
+                    offset = serverOffset;
+                    continue;
+                }
+                if (!response.ok) throw new Error(`Chunk upload failed (${response.status})`);
+                offset = (await response.json()).offset;
+                failures = 0;
+            } catch (error) {
+                if (++failures > MAX_CHUNK_RETRIES) throw error;
+                await new Promise(resolve => setTimeout(resolve, 1000 * 2 ** failures));
+                const current = await fetchUploadState(state.upload_id).catch(() => null);
+                if (current) offset = current.offset;
+            }
+        }
+
+        const response = await fetch(`/api/v1/uploads/${state.upload_id}/finalize`, {
+            method: 'POST',
+            headers: { 'Authorization': `Bearer ${token}`, 'Content-Type': 'application/json' },
+            body: JSON.stringify({ sha256: await sha256Hex(file) })
+        });
+        const result = await response.json();
+        if (response.ok || response.status === 422 || response.status === 404) {
+            // Stored, corrupted (server discarded it) or expired: never resume this id again
+            localStorage.removeItem(resumeKey);
+        }
+        if (!response.ok) {
+            console.error('Upload failed:', result);
+            showError(result.detail?.message || result.detail || `Failed to upload ${file.name}`);
+            return false;
+        }
+        console.log('Upload successful:', result);
+        noteDuplicates(result);
+        return true;
+    } catch (error) {
+        console.error('Error uploading file:', error);
+        showError(`Upload of ${file.name} interrupted; upload it again to resume`);
+        return false;
+    }
+}
+
+// Start of the selected upload-date window (local time), or null for all dates
+function dateFilterStart(filter) {
+    const now = new Date();
+    switch (filter) {
+        case 'today':
+            return new Date(now.getFullYear(), now.getMonth(), now.getDate());
+        case 'last7days': {
+            const sevenDaysAgo = new Date();
+            sevenDaysAgo.setDate(sevenDaysAgo.getDate() - 7);
+            return sevenDaysAgo;
+        }
+        case 'thismonth':
+            return new Date(now.getFullYear(), now.getMonth(), 1);
+        default:
+            return null;
+    }
+}
+
+// Upload times are stored as local time without an offset
+function toLocalIso(date) {
+    const pad = (n) => String(n).padStart(2, '0');
+    return `${date.getFullYear()}-${pad(date.getMonth() + 1)}-${pad(date.getDate())}T` +
+        `${pad(date.getHours())}:${pad(date.getMinutes())}:${pad(date.getSeconds())}`;
+}
+
+// Function to fetch and display documents (filtering and paging happen on the server)
 async function fetchDocuments() {
     if (!await checkAuth()) return;
     try {
-        const response = await fetch('/api/v1/list-docs');
+        const params = new URLSearchParams({ page: currentDocsPage, per_page: docsPerPage });
+        if (currentTypeFilter !== 'all') params.set('type', currentTypeFilter);
+        const since = dateFilterStart(currentDateFilter);
+        if (since) params.set('uploaded_from', toLocalIso(since));
+
+        const response = await fetch(`/api/v1/list-docs?${params.toString()}`);
         if (response.ok) {
             allDocuments = await response.json();
-            applyFilters();
+            docsTotalPages = parseInt(response.headers.get('X-Total-Pages')) || 1;
+            if (currentDocsPage > docsTotalPages && currentDocsPage > 1) {
+                // The last page emptied (e.g. after a delete); step back
+                currentDocsPage = docsTotalPages;
+                return fetchDocuments();
+            }
+            filteredDocuments = allDocuments;
+            renderDocuments(filteredDocuments);
+            updateDocsPagination();
         } else {
             console.error('Failed to fetch documents');
             showError('Failed to load documents');
@@ -241,50 +401,33 @@ async function fetchDocuments() {
 
 // Function to apply filters
 function applyFilters() {
-    filteredDocuments = [...allDocuments];
-    
-    // Apply type filter
-    if (currentTypeFilter !== 'all') {
-        filteredDocuments = filteredDocuments.filter(doc => {
-            const ext = doc.name.split('.').pop().toLowerCase();
-            
-            switch(currentTypeFilter) {
-                case 'pdf':
-                    return ext === 'pdf';
-                case 'images':
-                    return ['jpg', 'jpeg', 'png'].includes(ext);
-                case 'documents':
-                    return ['doc', 'docx', 'txt'].includes(ext);
-                default:
-                    return true;
-            }
-        });
+    currentDocsPage = 1;
+    fetchDocuments();
+}
+
+function updateDocsPagination() {
+    const pageInfo = document.getElementById('docs-page-info');
+    const prevBtn = document.getElementById('docs-prev-page');
+    const nextBtn = document.getElementById('docs-next-page');
+
+    if (pageInfo) pageInfo.textContent = `Page ${currentDocsPage} of ${docsTotalPages}`;
+    if (prevBtn) prevBtn.disabled = currentDocsPage <= 1;
+    if (nextBtn) nextBtn.disabled = currentDocsPage >= docsTotalPages;
+}
+
+document.getElementById('docs-prev-page')?.addEventListener('click', () => {
+    if (currentDocsPage > 1) {
+        currentDocsPage--;
+        fetchDocuments();
     }
-    
-    // Apply date filter
-    if (currentDateFilter !== 'all') {
-        const now = new Date();
-        filteredDocuments = filteredDocuments.filter(doc => {
-            const uploadDate = new Date(doc.uploadedOn);
-            
-            switch(currentDateFilter) {
-                case 'today':
-                    return uploadDate.toDateString() === now.toDateString();
-                case 'last7days':
-                    const sevenDaysAgo = new Date();
-                    sevenDaysAgo.setDate(sevenDaysAgo.getDate() - 7);
-                    return uploadDate >= sevenDaysAgo;
-                case 'thismonth':
-                    return uploadDate.getMonth() === now.getMonth() && 
-                           uploadDate.getFullYear() === now.getFullYear();
-                default:
-                    return true;
-            }
-        });
+});
+
+document.getElementById('docs-next-page')?.addEventListener('click', () => {
+    if (currentDocsPage < docsTotalPages) {
+        currentDocsPage++;
+        fetchDocuments();
     }
-    
-    renderDocuments(filteredDocuments);
-}
+});
 
 // Initialize filter event listeners
 function initFilters() {
@@ -300,7 +443,7 @@ function initFilters() {
     
     if (dateFilter) {
         dateFilter.addEventListener('change', (e) => {
-            currentDateFilter = e.target.value.toLowerCase().replace(' ', '');
+            currentDateFilter = e.target.value.toLowerCase().replace(/\s+/g, '');
             applyFilters();
         });
     }
@@ -462,6 +605,7 @@ document.getElementById('file-upload')?.addEventListener('change', async functio
     if (!files || files.length === 0) return;
     
     showLoading(`Uploading ${files.length} file(s)`);
+    savedDuplicates = [];
     
     try {
         let allSuccess = true;
@@ -476,7 +620,8 @@ document.getElementById('file-upload')?.addEventListener('change', async functio
         }
         
         if (allSuccess) {
-            showSuccess(`${files.length} file(s) uploaded successfully`);
+            showSuccess(`${files.length} file(s) uploaded successfully` +
+                (savedDuplicates.length ? `. Already saved as invoices: ${savedDuplicates.join('; ')}` : ''));
             fetchDocuments();
         }
     } catch (error) {
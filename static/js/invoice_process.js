@@ -16,6 +16,10 @@ let retryCount = 0;
 const MAX_RETRIES = 10;
 const urlParams = new URLSearchParams(window.location.search);
 const previewFilename = urlParams.get('file') || 'invoice.pdf'; // Use uploaded or default
+// Last saved correction (id, version, saved items by correction item id): later saves
+// send only the item changes, tagged with the version they were made against
+let savedCorrection = null;
+const CORRECTION_ITEM_FIELDS = ['description', 'quantity', 'price_per_unit', 'gst', 'amount', 'original_item_id'];
 
 // Invoice Templates
 const invoiceTemplates = {
@@ -2235,6 +2239,14 @@ function initializeApplication() {
     $('#uploadForm').on('submit', handleFormSubmit);
     $('#saveBtn').on('click', handleSaveInvoice);
     $('#addItemBtn').on('click', handleAddItem);
+    // A pending correction can be saved again once something changes
+    const enableResave = () => {
+        if (savedCorrection?.status === 'PENDING_APPROVAL') {
+            $('#saveBtn').html('<i class="bi bi-save me-1"></i> Save Invoice').prop('disabled', false);
+        }
+    };
+    $('#invoiceForm, #itemsTableBody').on('input', enableResave);
+    $(document).on('click', '#addItemBtn, .remove-item-btn', enableResave);
     
     // Initialize template selection
     $('#templateSelect').change(function () {
@@ -2276,6 +2288,22 @@ function initializeApplication() {
     setupPreviewListeners();
 }
 
+// Preview URL for an uploaded file. A `v` (content hash) on the page URL is passed on
+// so the server can mark the response immutable.
+function previewUrl(filename) {
+  const version = new URLSearchParams(window.location.search).get('v');
+  return `/api/v1/get-file?filename=${encodeURIComponent(filename)}` +
+    (version ? `&v=${encodeURIComponent(version)}` : '');
+}
+
+// Page rendered (and cached per content hash) by the server; much lighter than pdf.js
+// rendering the PDF on a canvas for the initial preview
+function pageImageUrl(filename, page = 1, width = 1600) {
+  const version = new URLSearchParams(window.location.search).get('v');
+  return `/api/v1/page-image?filename=${encodeURIComponent(filename)}&page=${page}&width=${width}&format=webp` +
+    (version ? `&v=${encodeURIComponent(version)}` : '');
+}
+
 // Enhanced PDF preview function with high quality
 async function fetchPDFPreview(filename) {
   const pdfViewer = document.getElementById('pdfViewer');
@@ -2287,13 +2315,13 @@ async function fetchPDFPreview(filename) {
       currentPreview = null;
     }
 
-    const response = await fetch(`/api/v1/get-file?filename=${encodeURIComponent(filename)}`);
-    if (!response.ok) throw new Error('Failed to load PDF');
-
-    const blob = await response.blob();
-    const objectUrl = URL.createObjectURL(blob);
-
-    const pdf = await pdfjsLib.getDocument(objectUrl).promise;
+    // Let pdf.js load straight from the server: it uses Range requests to fetch only
+    // what page 1 needs, and the browser cache (ETag/Cache-Control) serves repeat visits
+    const pdf = await pdfjsLib.getDocument({
+      url: previewUrl(filename),
+      disableAutoFetch: true,
+      disableStream: true
+    }).promise;
     const page = await pdf.getPage(1);
 
     // Draw the first page on canvas
@@ -2321,7 +2349,7 @@ async function fetchPDFPreview(filename) {
 }
 
 // Enhanced image preview function with high quality
-async function fetchImagePreview(filename) {
+async function fetchImagePreview(filename, url = previewUrl(filename), onError = null) {
   const previewImg = document.getElementById('previewImg');
   const wrapper = document.getElementById('previewWrapper');
 
@@ -2331,22 +2359,22 @@ async function fetchImagePreview(filename) {
       currentPreview = null;
     }
 
-    const response = await fetch(`/api/v1/get-file?filename=${encodeURIComponent(filename)}`);
-    if (!response.ok) throw new Error('Failed to load image');
-
-    const blob = await response.blob();
-    const objectUrl = URL.createObjectURL(blob);
-
-    previewImg.src = objectUrl;
+    // Load through the HTTP cache rather than copying the file into a blob
+    await new Promise((resolve, reject) => {
+      previewImg.onload = resolve;
+      previewImg.onerror = () => reject(new Error('Failed to load image'));
+      previewImg.src = url;
+    });
     previewImg.style.display = 'block';
     document.getElementById('pdfViewer').style.display = 'none';
 
     currentPreview = new HighQualityPreview(wrapper, previewImg);
     currentPreview.initImagePreview();
 
-    showToast("Image loaded successfully");
+    showToast("Preview loaded successfully");
   } catch (error) {
     console.error("Image preview error:", error);
+    if (onError) return onError();
     showToast("Failed to load image preview", false);
   }
 }
@@ -2371,7 +2399,8 @@ function displayFilePreview(filename) {
     pdfViewer.style.transform = 'none';
 
     if (fileType === 'pdf') {
-        fetchPDFPreview(filename);
+        // Server-rendered page 1 first; pdf.js only if rendering it failed
+        fetchImagePreview(filename, pageImageUrl(filename), () => fetchPDFPreview(filename));
     } else if (['jpg', 'jpeg', 'png', 'gif', 'webp', 'bmp', 'tiff'].includes(fileType)) {
         fetchImagePreview(filename);
     } else {
@@ -2398,7 +2427,7 @@ function handleUrlParameters() {
 }
 
 // File Processing Functions
-function processFile(filename, mode) {
+function processFile(filename, mode, allowDuplicate = false) {
     showGlobalSpinner();
     
     // Disable form during processing
@@ -2408,19 +2437,30 @@ function processFile(filename, mode) {
     formData.append('filename', filename);
     formData.append('mode', mode);
     formData.append('advanced', 'false'); 
+    formData.append('allow_duplicate', String(allowDuplicate));
 
     fetch('/api/v1/upload-invoice', {
         method: 'POST',
         headers: { 'Authorization': `Bearer ${token}` },
         body: formData
     })
-    .then(response => {
+    .then(async response => {
+        if (response.status === 409) {
+            // Already saved: ask before running the extraction again
+            const detail = (await response.json()).detail || {};
+            if (confirm(`${detail.message}\n\nExtract this document again?`)) {
+                setTimeout(() => processFile(filename, mode, true));
+                return null;
+            }
+            throw new Error(detail.message || 'Document already saved');
+        }
         if (!response.ok) {
             throw new Error(response.statusText || 'Server returned an error');
         }
         return response.json();
     })
     .then(data => {
+        if (!data) return;
         showToast("Invoice processed successfully");
         renderExtractedInvoice(data);
         renderInvoicePreview(data);
@@ -2451,6 +2491,7 @@ function handleFormSubmit(e) {
 
 function renderExtractedInvoice(result) {
     lastExtractedData = result;
+    savedCorrection = null;
     const invData = result.invoice_data || {};
     const items = result.items || [];
     
@@ -2881,8 +2922,11 @@ function handleSaveInvoice() {
     updatedInvoice.invoice_data.subtotal = $('#subtotal').val();
     updatedInvoice.invoice_data.tax_amount = $('#taxAmount').val();
     updatedInvoice.styling = styling;
+    // The uploaded document, so the server can recognise it if it is saved again
+    updatedInvoice.invoice_data.source_file = urlParams.get('file') || '';
 
     // Collect items data
+    const itemRows = [];
     $('#itemsTableBody tr').each(function() {
         const row = $(this);
         const item = {};
@@ -2893,7 +2937,9 @@ function handleSaveInvoice() {
             }
         });
         if (Object.keys(item).length > 0) {
+            item.correction_item_id = row.attr('data-correction-item-id') || null;
             updatedInvoice.items.push(item);
+            itemRows.push(row);
         }
         updatedInvoice.items.forEach(item => {
             item.quantity = parseFloat(item.quantity).toFixed(2);
@@ -2907,8 +2953,68 @@ function handleSaveInvoice() {
     // Hide previous error
     $('#errorField').addClass('d-none').text('');
 
+    const sent = { items: updatedInvoice.items, rows: itemRows, full: !savedCorrection };
+    if (savedCorrection) {
+        // Only what changed since the last save, against the version that save returned
+        updatedInvoice.correction_id = savedCorrection.correction_id;
+        updatedInvoice.version = savedCorrection.version;
+        updatedInvoice.changes = diffCorrectionItems(savedCorrection.items, updatedInvoice.items);
+        delete updatedInvoice.items;
+    }
+
     console.log("Data being sent to backend:", updatedInvoice);
+    postCorrection(updatedInvoice, sent);
+}
 
+// {added, changed, removed} between the saved items and the items now in the form
+function diffCorrectionItems(saved, items) {
+    const changes = { added: [], changed: [], removed: [] };
+    const kept = new Set();
+    items.forEach(item => {
+        const { correction_item_id: id, ...values } = item;
+        const before = id && saved.get(id);
+        if (!before) {
+            changes.added.push(values);
+            return;
+        }
+        kept.add(id);
+        const changed = {};
+        CORRECTION_ITEM_FIELDS.forEach(field => {
+            if (values[field] !== before[field]) changed[field] = values[field];
+        });
+        if (Object.keys(changed).length) changes.changed.push({ correction_item_id: Number(id), ...changed });
+    });
+    saved.forEach((_, id) => {
+        if (!kept.has(id)) changes.removed.push(Number(id));
+    });
+    return changes;
+}
+
+// Remember what was saved. A full list gets the id of every row back (item_ids, in the
+// order sent); after a diff, new rows take the added_item_ids in the order they were sent
+function rememberCorrection(response, sent) {
+    const newIds = response.added_item_ids || [];
+    const items = new Map();
+    let next = 0;
+    sent.items.forEach((item, i) => {
+        let id = item.correction_item_id;
+        if (sent.full) {
+            id = String(response.item_ids[i]);
+        } else if (!id || !savedCorrection?.items.has(id)) {
+            id = String(newIds[next++]);
+        }
+        sent.rows[i].attr('data-correction-item-id', id);
+        items.set(id, { ...item, correction_item_id: id });
+    });
+    savedCorrection = {
+        correction_id: response.correction_id,
+        version: response.version,
+        status: response.correction_status,
+        items
+    };
+}
+
+function postCorrection(updatedInvoice, sent) {
     $.ajax({
         url: '/api/v1/invoices/save-correction',
         type: 'POST',
@@ -2916,11 +3022,30 @@ function handleSaveInvoice() {
         contentType: 'application/json',
         data: JSON.stringify(updatedInvoice),
         success: function(response) {
-            showToast("Invoice corrections saved successfully.");
+            rememberCorrection(response, sent);
+            const similar = response.possible_duplicates || [];
+            showToast(similar.length
+                ? `Invoice corrections saved. Items look like ${similar.map(d => `${d.source} #${d.id}`).join(', ')}.`
+                : "Invoice corrections saved successfully.", true, similar.length ? 5000 : 2000);
             $('#saveBtn').html('<i class="fas fa-check-circle"></i> Saved').prop('disabled', true);
             $('#errorField').addClass('d-none').text('');
         },
         error: function(xhr) {
+            const detail = xhr.responseJSON && xhr.responseJSON.detail;
+            if (xhr.status === 409 && detail && detail.duplicate_of) {
+                if (confirm(`${detail.message}\n\nSave this invoice anyway?`)) {
+                    // After this request's complete handler has hidden the spinner
+                    setTimeout(() => {
+                        showDatatableSpinner();
+                        postCorrection({ ...updatedInvoice, allow_duplicate: true }, sent);
+                    });
+                    return;
+                }
+            }
+            if (detail && detail.message) {
+                // 409s carry {message, ...}: a duplicate, or a save against an outdated version
+                xhr.responseJSON.detail = detail.message;
+            }
             let errorMsg = "Failed to save invoice corrections.";
             if (xhr.responseJSON && xhr.responseJSON.detail) {
                 errorMsg = xhr.responseJSON.detail;
@@ -3,9 +3,8 @@
 # import json
 import pdfplumber
 import re
-from paddleocr import PaddleOCR
-import numpy as np
 from decimal import Decimal
+from core import metrics, raster_cache, ocr_cache, template_loader
 
 items = []
 tax_info = {}
@@ -13,7 +12,15 @@ grand_total = {}
 current_item = None
 capture_description = False
 
-ocr = PaddleOCR(use_angle_cls=True, lang='en')
+_ocr = None
+
+def get_ocr():
+    """Create the PaddleOCR engine on first use; loading its models takes seconds."""
+    global _ocr
+    if _ocr is None:
+        from paddleocr import PaddleOCR
+        _ocr = PaddleOCR(use_angle_cls=True, lang='en')
+    return _ocr
 
 def clean_number(value):
     return value.replace(",", "") if isinstance(value, str) else value
@@ -62,9 +69,63 @@ def extract_buyer_address(lines, buyer_name_idx):
             address_lines.append(line)
     return " ".join(address_lines).strip() if address_lines else ""
 
+def _paddle_lines(image):
+    import numpy as np
+    result = get_ocr().ocr(np.array(image))
+    metrics.OCR_PAGES.inc(engine="paddleocr")
+    return [
+        {"text": line[1][0], "confidence": float(line[1][1]), "box": [[float(x), float(y)] for x, y in line[0]]}
+        for block in result if block for line in block
+    ]
+
+def _recognise(image):
+    # Cached per image, so re-extracting the same invoice skips PaddleOCR entirely
+    return ocr_cache.cached_lines(image, "paddleocr", _paddle_lines, angle_cls=True, lang="en")
+
 def ocr_extract_metadata(image, patterns):
-    result = ocr.ocr(np.array(image))
-    text_lines = [(line[1][0], line[1][1]) for block in result for line in block]  # (text, confidence)
+    text_lines = [(line["text"], line["confidence"]) for line in _recognise(image)]  # (text, confidence)
+    return match_fields(text_lines, patterns)
+
+def _stack(crops, gap=24):
+    """Paste crops one below the other on a white sheet; returns the sheet and each crop's (top, bottom)."""
+    from PIL import Image
+    sheet = Image.new("RGB", (max(c.width for c in crops), sum(c.height for c in crops) + gap * (len(crops) - 1)), "white")
+    spans, y = [], 0
+    for crop in crops:
+        sheet.paste(crop.convert("RGB"), (0, y))
+        spans.append((y, y + crop.height))
+        y += crop.height + gap
+    return sheet, spans
+
+def ocr_extract_regions(image, patterns, regions):
+    """
+    OCR only the template regions of the missing fields. All crops of the page are
+    stacked into one image so a single OCR call covers them; each recognised line is
+    matched against the fields of the crop it falls in. Fields without a region are
+    left for the full-page fallback.
+    """
+    groups = {}
+    for field in patterns:
+        box = regions.get(region_keys.get(field))
+        if box:
+            groups.setdefault(box, []).append(field)
+    if not groups:
+        return {}
+
+    width, height = image.size
+    crops = [image.crop((int(x0 * width), int(top * height), int(x1 * width), int(bottom * height)))
+             for x0, top, x1, bottom in groups]
+    sheet, spans = _stack(crops)
+    lines = _recognise(sheet)
+
+    found = {}
+    for fields, (start, end) in zip(groups.values(), spans):
+        region_lines = [(line["text"], line["confidence"]) for line in lines
+                        if start <= sum(y for _, y in line["box"]) / len(line["box"]) < end]
+        found.update(match_fields(region_lines, {f: patterns[f] for f in fields}))
+    return found
+
+def match_fields(text_lines, patterns):
     found = {}
     for field, pattern in patterns.items():
         for txt, conf in text_lines:
@@ -77,6 +138,14 @@ def ocr_extract_metadata(image, patterns):
                 break  # stop at first match
     return found
 
+# fallback_patterns keys -> field names used under ocr_regions in the vendor template
+region_keys = {
+    "Invoice Number": "invoice_number",
+    "Invoice Date": "invoice_date",
+    "Buyer Name": "buyer_name",
+    "Buyer GSTIN": "buyer_gstin"
+}
+
 fallback_patterns = {
     "Invoice Number": r"Invoice\s*No[:\-]?\s*(\S+)",
     "Invoice Date": r"Date[:\-]?\s*([0-9]{1,2}[\/\-\s]?[A-Za-z]{3,9}[\/\-\s]?[0-9]{2,4})",
@@ -128,6 +197,7 @@ def entry(text, path):
         "Subtotal (INR)": ""
     }
 
+    ocr_regions = None  # loaded from the template on the first OCR fallback
     with pdfplumber.open(path) as pdf:
         for page_num, page in enumerate(pdf.pages):
             print(f"\n📄 Page {page_num + 1}")
@@ -187,8 +257,17 @@ def entry(text, path):
             missing_fields = [k for k, v in invoice_metadata.items() if not v and k in fallback_patterns]
             if missing_fields:
                 print(f"[INFO] Running OCR fallback for missing fields: {missing_fields}")
-                page_image = page.to_image(resolution=200).original  # try lower res for speed
-                ocr_results = ocr_extract_metadata(page_image, {k: fallback_patterns[k] for k in missing_fields})
+                # Shared with the page previews; re-extractions of the same document skip the render
+                page_image = raster_cache.page_image(path, page_num + 1, dpi=200, page=page)
+                patterns = {k: fallback_patterns[k] for k in missing_fields}
+                if ocr_regions is None:
+                    ocr_regions = template_loader.ocr_regions(invoice_metadata["Seller Name"])
+                # Header fields are read from their template regions first; only what is
+                # still missing goes through full-page OCR
+                ocr_results = ocr_extract_regions(page_image, patterns, ocr_regions)
+                remaining = {k: p for k, p in patterns.items() if k not in ocr_results}
+                if remaining:
+                    ocr_results.update(ocr_extract_metadata(page_image, remaining))
                 for k, v in ocr_results.items():
                     invoice_metadata[k] = v["value"]
                     invoice_metadata[k + " Confidence"] = v["confidence"]
@@ -1,17 +1,11 @@
 # -*- coding: utf-8 -*-
 import pdfplumber
 import re
-from paddleocr import PaddleOCR
-import numpy as np
 from decimal import Decimal
 from datetime import datetime
 import logging
-import openpyxl
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
-from openpyxl.utils.dataframe import dataframe_to_rows
-import pandas as pd
 import os
+from core.config import DOWNLOAD_DIR
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -19,7 +13,7 @@ logger = logging.getLogger(__name__)
 
 class ZohoInvoiceParser:
     def __init__(self):
-        self.ocr = PaddleOCR(use_angle_cls=True, lang='en')
+        self._ocr = None
         self.items = []
         self.tax_info = {}
         self.grand_total = {}
@@ -127,6 +121,14 @@ class ZohoInvoiceParser:
             'ITC Eligibility': 'Eligible'  # Default
         }
 
+    @property
+    def ocr(self):
+        # PaddleOCR loads its models on construction; only pay for it if OCR is actually used
+        if self._ocr is None:
+            from paddleocr import PaddleOCR
+            self._ocr = PaddleOCR(use_angle_cls=True, lang='en')
+        return self._ocr
+
     def clean_number(self, value):
         """Clean numeric values by removing commas and handling decimals"""
         if isinstance(value, str):
@@ -453,10 +455,13 @@ class ZohoInvoiceParser:
 
     def export_to_excel(self, zoho_data, excel_filename=None):
         """Export the mapped data to Excel format compatible with Zoho Books"""
+        from openpyxl import Workbook
+        from openpyxl.styles import Font, Alignment, PatternFill
         try:
             if not excel_filename:
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                excel_filename = f"zoho_invoice_export_{timestamp}.xlsx"
+                # Under DOWNLOAD_DIR (not the working directory) so the retention service can expire it
+                excel_filename = os.path.join(DOWNLOAD_DIR, f"zoho_invoice_export_{timestamp}.xlsx")
             
             # Create a new workbook
             wb = Workbook()
@@ -2,9 +2,6 @@ import re
 import sys
 import io
 from decimal import Decimal, InvalidOperation
-import pandas as pd
-import openpyxl
-from openpyxl.styles import Font, PatternFill
 from datetime import datetime
 import pdfplumber
 
@@ -309,6 +306,8 @@ class EnhancedZohoInvoiceParser:
 
     def create_excel_export(self, zoho_data, output_filename):
         """Create single-sheet Excel file in Zoho Books import format"""
+        import openpyxl
+        from openpyxl.styles import Font, PatternFill
         try:
             # All Zoho columns in correct order
             zoho_columns = [